@@ -1,6 +1,23 @@
 #!/usr/bin/env python3
-import Jetson.GPIO as GPIO
 import time
+import os
+import sys
+
+# PWM engine lives with the rover code
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "rover"))
+from pwm_engine import PWMEngine, FakeGPIO
+
+if os.environ.get("RS_REPLAY") or os.environ.get("FAKE_GPIO"):
+    # Replaying a recording (see frame_source.py): never drive the real motors
+    print("[Motor] 🧪 Replay mode, using FakeGPIO")
+    GPIO = FakeGPIO()
+else:
+    try:
+        import Jetson.GPIO as GPIO
+    except (ImportError, RuntimeError) as e:
+        # Off the Jetson: record pin changes instead of driving hardware
+        print(f"[Motor] ⚠️ Jetson.GPIO unavailable ({e}), using FakeGPIO")
+        GPIO = FakeGPIO()
 
 # === Pin Definitions ===
 IN1 = 4    # Grigio -> Pin 7 (GPIO4)
@@ -17,33 +34,26 @@ for pin in [IN1, IN2, IN3, IN4, ENA, ENB]:
     GPIO.setup(pin, GPIO.OUT)
     GPIO.output(pin, GPIO.LOW)
 
-# === Software PWM Functions ===
-def dual_software_pwm(pin_a, duty_a, pin_b, duty_b, frequency, duration):
-    period = 1.0 / frequency
-    on_time_a = period * (duty_a / 100.0)
-    on_time_b = period * (duty_b / 100.0)
-    off_time = period - max(on_time_a, on_time_b)
-    end_time = time.time() + duration
-
-    while time.time() < end_time:
-        if duty_a > 0:
-            GPIO.output(pin_a, GPIO.HIGH)
-        if duty_b > 0:
-            GPIO.output(pin_b, GPIO.HIGH)
-
-        time.sleep(min(on_time_a, on_time_b))
-
-        if on_time_a <= on_time_b:
-            GPIO.output(pin_a, GPIO.LOW)
-            time.sleep(on_time_b - on_time_a)
-            GPIO.output(pin_b, GPIO.LOW)
-        else:
-            GPIO.output(pin_b, GPIO.LOW)
-            time.sleep(on_time_a - on_time_b)
-            GPIO.output(pin_a, GPIO.LOW)
-
-        if off_time > 0:
-            time.sleep(off_time)
+# === PWM Engine ===
+# ENA/ENB are hardware PWM pins on the Nano; the engine falls back to a timer thread otherwise
+PWM_FREQUENCY = 100
+pwm = PWMEngine(GPIO, (ENA, ENB), frequency=PWM_FREQUENCY)
+print(f"[Motor] PWM modes: {pwm.modes()}")
+
+def dual_pwm(duty_a, duty_b, duration, abort=None):
+    # Duty in percent; abort (threading.Event) lets a newer command cut the move short
+    pwm.set_duties({ENA: duty_a, ENB: duty_b})
+    if abort is not None:
+        abort.wait(duration)
+    else:
+        time.sleep(duration)
+
+def set_speeds(speed_left, speed_right):
+    # Change duty while moving, without restarting the PWM
+    pwm.set_duties({ENA: speed_left, ENB: speed_right})
+
+def pwm_stats():
+    return pwm.stats()
 
 # === Direction Functions ===
 def set_motor_direction_forward():
@@ -71,28 +81,30 @@ def set_motor_direction_turn_left():
     GPIO.output(IN4, GPIO.HIGH)
 
 def stop_all():
-    for pin in [IN1, IN2, IN3, IN4, ENA, ENB]:
+    pwm.stop_all()
+    for pin in [IN1, IN2, IN3, IN4]:
         GPIO.output(pin, GPIO.LOW)
 
 # === High-Level Movement Function ===
-def step_move(direction_fn, speed_left, speed_right, duration=0.1, frequency=100):
+def step_move(direction_fn, speed_left, speed_right, duration=0.1, abort=None):
     direction_fn()
-    dual_software_pwm(ENA, speed_left, ENB, speed_right, frequency, duration)
+    dual_pwm(speed_left, speed_right, duration, abort)
     stop_all()
 
 # === Exported Movement Functions ===
-def move_forward_step(speed_left=70, speed_right=70, duration=0.1):
-    step_move(set_motor_direction_forward, speed_left, speed_right, duration)
+def move_forward_step(speed_left=70, speed_right=70, duration=0.1, abort=None):
+    step_move(set_motor_direction_forward, speed_left, speed_right, duration, abort=abort)
 
-def move_backward_step(speed_left=70, speed_right=70, duration=0.1):
-    step_move(set_motor_direction_backward, speed_left, speed_right, duration)
+def move_backward_step(speed_left=70, speed_right=70, duration=0.1, abort=None):
+    step_move(set_motor_direction_backward, speed_left, speed_right, duration, abort=abort)
 
-def turn_right_step(speed_left=70, speed_right=70, duration=0.1):
-    step_move(set_motor_direction_turn_right, speed_left, speed_right, duration)
+def turn_right_step(speed_left=70, speed_right=70, duration=0.1, abort=None):
+    step_move(set_motor_direction_turn_right, speed_left, speed_right, duration, abort=abort)
 
-def turn_left_step(speed_left=70, speed_right=70, duration=0.1):
-    step_move(set_motor_direction_turn_left, speed_left, speed_right, duration)
+def turn_left_step(speed_left=70, speed_right=70, duration=0.1, abort=None):
+    step_move(set_motor_direction_turn_left, speed_left, speed_right, duration, abort=abort)
 
 def cleanup():
     stop_all()
+    pwm.close()
     GPIO.cleanup()
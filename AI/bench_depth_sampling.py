@@ -0,0 +1,100 @@
+"""
+Microbenchmark: per-pixel get_distance() loops vs depth_sampling.
+
+Runs without a camera on a synthetic 640x480 z16 frame. FakeDepthFrame mimics
+the pyrealsense2 depth_frame calls the old helpers used, so the loop timings
+are a lower bound (the real binding call is slower than a Python method).
+
+    python bench_depth_sampling.py [detections ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from depth_sampling import depth_array, window_depths
+
+class FakeDepthFrame:
+    """Stand-in for rs.depth_frame backed by a uint16 array"""
+
+    def __init__(self, data, units=0.001):
+        self.data = data
+        self.units = units
+
+    def get_width(self):
+        return self.data.shape[1]
+
+    def get_height(self):
+        return self.data.shape[0]
+
+    def get_distance(self, x, y):
+        return float(self.data[y, x]) * self.units
+
+    def get_data(self):
+        return self.data
+
+    def get_units(self):
+        return self.units
+
+def legacy_average_depth(depth_frame, cx, cy, k=7, offsets=None):
+    """The get_average_depth loop from full2.py / Final_PW/main.py"""
+    if offsets is None:
+        offsets = range(-k//2, k//2 + 1)
+    values = []
+    for dx in offsets:
+        for dy in offsets:
+            x, y = cx + dx, cy + dy
+            if 0 <= x < depth_frame.get_width() and 0 <= y < depth_frame.get_height():
+                d = depth_frame.get_distance(x, y)
+                if 0 < d < 5:
+                    values.append(d)
+    if not values:
+        return 0
+    median = np.median(values)
+    filtered = [v for v in values if abs(v - median) < 0.3]
+    return np.mean(filtered) if filtered else median
+
+def synthetic_frame(width=640, height=480, seed=0):
+    """Floor gradient with noise, dropouts (0) and far outliers"""
+    rng = np.random.default_rng(seed)
+    rows = np.linspace(4000, 600, height)[:, None]
+    data = rows + rng.normal(0, 40, (height, width))
+    data[rng.random((height, width)) < 0.05] = 0
+    data[rng.random((height, width)) < 0.02] = 9000
+    return np.clip(data, 0, 65535).astype(np.uint16)
+
+def best_of(fn, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    counts = [int(a) for a in sys.argv[1:]] or [1, 5, 20, 50]
+    frame = FakeDepthFrame(synthetic_frame())
+    rng = np.random.default_rng(1)
+    k = 7
+    symmetric = range(-(k // 2), k // 2 + 1)
+
+    print(f"{'detections':>10} {'loop ms':>9} {'numpy ms':>9} {'speedup':>8} {'max diff m':>11}")
+    for n in counts:
+        # Include centers on the border so clipping is exercised
+        centers = np.column_stack((rng.integers(-2, frame.get_width() + 2, n),
+                                   rng.integers(-2, frame.get_height() + 2, n)))
+
+        def loop():
+            return [legacy_average_depth(frame, int(cx), int(cy), k, symmetric) for cx, cy in centers]
+
+        def vectorized():
+            depth_image, depth_units = depth_array(frame)
+            return window_depths(depth_image, centers, k=k, units=depth_units, max_depth=5.0, tolerance=0.3)
+
+        diff = np.max(np.abs(np.asarray(loop(), dtype=float) - vectorized()))
+        loop_time, numpy_time = best_of(loop), best_of(vectorized)
+        print(f"{n:>10} {loop_time * 1e3:>9.3f} {numpy_time * 1e3:>9.3f} "
+              f"{loop_time / numpy_time:>7.1f}x {diff:>11.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: the Node-based astar from full.py vs planner.GridPlanner
+(4- and 8-connected) and IncrementalPlanner repairing after small changes.
+
+    python bench_planner.py [size ...]
+"""
+import heapq
+import sys
+import time
+
+import numpy as np
+
+from planner import GridPlanner, IncrementalPlanner, cost_from_occupancy
+
+# === The original planner from full.py ===
+class Node:
+    def __init__(self, x, y, cost=0, heuristic=0, parent=None):
+        self.x = x
+        self.y = y
+        self.cost = cost
+        self.heuristic = heuristic
+        self.parent = parent
+    def __lt__(self, other):
+        return (self.cost + self.heuristic) < (other.cost + other.heuristic)
+
+def astar(grid, start, goal):
+    open_set = []
+    heapq.heappush(open_set, Node(*start, 0, heuristic(start, goal)))
+    visited = set()
+    while open_set:
+        current = heapq.heappop(open_set)
+        if (current.x, current.y) == goal:
+            return reconstruct_path(current)
+        visited.add((current.x, current.y))
+        for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
+            nx, ny = current.x + dx, current.y + dy
+            if 0 <= nx < len(grid[0]) and 0 <= ny < len(grid):
+                if grid[ny][nx] == 1 or (nx, ny) in visited:
+                    continue
+                neighbor = Node(nx, ny, current.cost + 1, heuristic((nx, ny), goal), current)
+                heapq.heappush(open_set, neighbor)
+    return []
+
+def heuristic(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+def reconstruct_path(node):
+    path = []
+    while node:
+        path.append((node.x, node.y))
+        node = node.parent
+    return path[::-1]
+
+def random_grid(size, density, rng):
+    grid = (rng.random((size, size)) < density).astype(np.uint8)
+    grid[size // 2, size // 2] = 0
+    grid[0, size - 1] = 0
+    return grid
+
+def timed(fn, repeat=5):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [20, 40, 80]
+    rng = np.random.default_rng(0)
+    print(f"{'size':>5} {'legacy 4c':>12} {'A* 4c':>12} {'A* 8c':>12} {'LPA* repair':>12} {'cells changed':>14}")
+    for size in sizes:
+        grid = random_grid(size, 0.25, rng)
+        start, goal = (size // 2, size // 2), (size - 1, 0)
+        legacy_time, legacy_path = timed(lambda: astar(grid.tolist(), start, goal), repeat=1 if size > 40 else 3)
+
+        cost = cost_from_occupancy(grid)
+        four = GridPlanner(cost, connectivity=4)
+        eight = GridPlanner(cost, connectivity=8)
+        four_time, four_path = timed(lambda: four.plan(start, goal))
+        eight_time, _ = timed(lambda: eight.plan(start, goal))
+        assert len(four_path) == len(legacy_path), "4-connected A* must match the legacy path length"
+
+        # Incremental: solve once, then flip a few random cells and repair
+        incremental = IncrementalPlanner(cost, start, connectivity=8)
+        incremental.plan(goal)
+        repairs, changed = [], 0
+        for _ in range(10):
+            grid2 = grid.copy()
+            cells = rng.integers(0, size, (3, 2))
+            grid2[cells[:, 0], cells[:, 1]] ^= 1
+            grid2[start[1], start[0]] = grid2[goal[1], goal[0]] = 0
+            cost2 = cost_from_occupancy(grid2)
+            started = time.perf_counter()
+            incremental.plan(goal, cost2)
+            repairs.append(time.perf_counter() - started)
+            changed += int(np.count_nonzero(grid2 != grid))
+            eight.set_cost(cost2)
+            reference = eight.path_cost(goal) if eight.plan(start, goal) else float("inf")
+            assert reference == incremental.path_cost() or abs(incremental.path_cost() - reference) < 1e-9
+            grid = grid2
+
+        print(f"{size:>5} {legacy_time * 1e3:>10.2f}ms {four_time * 1e3:>10.2f}ms {eight_time * 1e3:>10.2f}ms "
+              f"{np.median(repairs) * 1e3:>10.2f}ms {changed / 10:>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Point-wise color <-> depth mapping with cached intrinsics and extrinsics.
+
+align.process() reprojects the whole depth image into the color camera on
+every frame, but the loops only read depth at a few detection centres.
+PointMapper keeps depth unaligned and maps just those pixels:
+
+  * a color pixel seen at depth z lies on a short segment in the depth
+    image (z between min_depth and max_depth); that segment is sampled for
+    every pixel at once,
+  * each sample is deprojected with its measured depth, moved into the
+    color camera and projected back; the sample landing closest to the
+    original color pixel is the match (the SDK's
+    rs2_project_color_pixel_to_depth_pixel, vectorized over pixels),
+  * the robust window depth around the match is deprojected into a 3D
+    point in the color camera frame (metres, x right, y down, z forward).
+
+Lens distortion is ignored: the D435 depth stream has none and its color
+stream reports zero coefficients.
+"""
+import numpy as np
+
+from depth_sampling import window_depths
+
+class Intrinsics:
+    """Pinhole model: fx, fy, ppx, ppy in pixels for a width x height stream"""
+
+    def __init__(self, width, height, fx, fy, ppx, ppy):
+        self.width, self.height = width, height
+        self.fx, self.fy, self.ppx, self.ppy = fx, fy, ppx, ppy
+
+    @classmethod
+    def from_rs(cls, intrinsics):
+        return cls(intrinsics.width, intrinsics.height, intrinsics.fx, intrinsics.fy,
+                   intrinsics.ppx, intrinsics.ppy)
+
+    def deproject(self, pixels, depth):
+        """(..., 2) pixels and (...) depths in metres -> (..., 3) points"""
+        pixels = np.asarray(pixels, dtype=np.float64)
+        depth = np.asarray(depth, dtype=np.float64)
+        x = (pixels[..., 0] - self.ppx) / self.fx * depth
+        y = (pixels[..., 1] - self.ppy) / self.fy * depth
+        return np.stack((x, y, depth), axis=-1)
+
+    def project(self, points):
+        """(..., 3) points -> (..., 2) pixels"""
+        points = np.asarray(points, dtype=np.float64)
+        z = np.where(points[..., 2] > 0, points[..., 2], np.nan)
+        return np.stack((points[..., 0] / z * self.fx + self.ppx,
+                         points[..., 1] / z * self.fy + self.ppy), axis=-1)
+
+class Extrinsics:
+    """Rigid transform between two camera frames: p_to = R @ p_from + t"""
+
+    def __init__(self, rotation, translation):
+        self.R = np.asarray(rotation, dtype=np.float64).reshape(3, 3)
+        self.t = np.asarray(translation, dtype=np.float64).reshape(3)
+
+    @classmethod
+    def from_rs(cls, extrinsics):
+        # librealsense stores the rotation column-major
+        return cls(np.asarray(extrinsics.rotation).reshape(3, 3).T, extrinsics.translation)
+
+    def apply(self, points):
+        return np.asarray(points, dtype=np.float64) @ self.R.T + self.t
+
+    def inverse(self):
+        return Extrinsics(self.R.T, -self.R.T @ self.t)
+
+class PointMapper:
+    """Maps color pixels into the unaligned depth image and out to 3D points"""
+
+    def __init__(self, depth_intrinsics, color_intrinsics, depth_to_color, depth_units=0.001,
+                 min_depth=0.1, max_depth=5.0, max_samples=128):
+        self.depth_intrinsics = depth_intrinsics
+        self.color_intrinsics = color_intrinsics
+        self.depth_to_color = depth_to_color
+        self.color_to_depth = depth_to_color.inverse()
+        self.depth_units = depth_units
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.max_samples = max_samples
+
+    @classmethod
+    def from_profile(cls, profile, **kwargs):
+        """Read intrinsics, extrinsics and depth units once from a started pyrealsense2 profile"""
+        import pyrealsense2 as rs
+        depth_stream = profile.get_stream(rs.stream.depth).as_video_stream_profile()
+        color_stream = profile.get_stream(rs.stream.color).as_video_stream_profile()
+        units = profile.get_device().first_depth_sensor().get_depth_scale()
+        return cls(Intrinsics.from_rs(depth_stream.get_intrinsics()),
+                   Intrinsics.from_rs(color_stream.get_intrinsics()),
+                   Extrinsics.from_rs(depth_stream.get_extrinsics_to(color_stream)),
+                   depth_units=units, **kwargs)
+
+    @classmethod
+    def from_pipeline(cls, pipeline, **kwargs):
+        """PointMapper for a live or bag pipeline; None for sources that are already aligned"""
+        if not hasattr(pipeline, "get_active_profile"):
+            return None
+        return cls.from_profile(pipeline.get_active_profile(), **kwargs)
+
+    def color_to_depth_pixels(self, depth, color_pixels):
+        """
+        Depth-image pixel (N, 2) int matching each color pixel, or -1 where no
+        sample along its search segment had a valid depth.
+        """
+        color_pixels = np.asarray(color_pixels, dtype=np.float64).reshape(-1, 2)
+        n = len(color_pixels)
+        if n == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+        di, ci = self.depth_intrinsics, self.color_intrinsics
+
+        # Segment in the depth image that the color pixel can map to
+        ends = np.stack([self.color_to_depth.apply(ci.deproject(color_pixels, np.full(n, z)))
+                         for z in (self.min_depth, self.max_depth)], axis=1)
+        ends = di.project(ends)                                             # (N, 2 ends, 2)
+        length = np.nanmax(np.linalg.norm(ends[:, 1] - ends[:, 0], axis=-1), initial=0.0)
+        samples = int(min(max(np.ceil(length) + 1, 2), self.max_samples))
+        steps = np.linspace(0.0, 1.0, samples)[None, :, None]
+        candidates = np.rint(ends[:, :1] + steps * (ends[:, 1:] - ends[:, :1]))  # (N, S, 2)
+
+        x, y = candidates[..., 0], candidates[..., 1]
+        inside = (x >= 0) & (x < di.width) & (y >= 0) & (y < di.height)
+        xi = np.where(inside, x, 0).astype(np.int64)
+        yi = np.where(inside, y, 0).astype(np.int64)
+        z = depth[yi, xi] * self.depth_units
+        valid = inside & (z >= self.min_depth) & (z <= self.max_depth)
+
+        # Reproject every sample into the color image and keep the closest
+        back = ci.project(self.depth_to_color.apply(di.deproject(candidates, z)))
+        error = np.sum((back - color_pixels[:, None, :]) ** 2, axis=-1)
+        error = np.where(valid & np.isfinite(error), error, np.inf)
+        best = np.argmin(error, axis=1)
+        found = np.isfinite(error[np.arange(n), best])
+        result = np.stack((xi[np.arange(n), best], yi[np.arange(n), best]), axis=-1)
+        result[~found] = -1
+        return result
+
+    def locate(self, depth, color_pixels, k=7, tolerance=0.3):
+        """
+        3D points (N, 3) in the color camera frame for color pixels, using the
+        robust k x k window depth around each matched depth pixel (zeros where
+        there is no valid depth), plus the matched depth pixels.
+        """
+        depth_pixels = self.color_to_depth_pixels(depth, color_pixels)
+        found = depth_pixels[:, 0] >= 0
+        distances = window_depths(depth, np.where(found[:, None], depth_pixels, 0), k=k,
+                                  units=self.depth_units, min_depth=self.min_depth,
+                                  max_depth=self.max_depth, tolerance=tolerance)
+        distances = np.where(found, distances, 0.0)
+        points = self.depth_to_color.apply(self.depth_intrinsics.deproject(depth_pixels, distances))
+        points[distances <= 0] = 0.0
+        return points, depth_pixels
+
+if __name__ == "__main__":
+    # Accuracy and cost on a synthetic D435-like 424x240 pair: the 3D point found for
+    # each color pixel must project back onto that pixel
+    import time
+
+    depth_intr = Intrinsics(424, 240, 213.0, 213.0, 212.5, 119.5)
+    color_intr = Intrinsics(424, 240, 307.0, 307.0, 211.0, 121.0)
+    depth_to_color = Extrinsics(np.eye(3), [0.015, 0.0003, 0.0002])
+    mapper = PointMapper(depth_intr, color_intr, depth_to_color)
+
+    # Wall at 2.5 m with a box at 0.8 m
+    depth = np.full((240, 424), 2500, dtype=np.uint16)
+    depth[80:170, 150:260] = 800
+
+    centers = np.array([(212, 120), (60, 40), (380, 200), (290, 120)])
+    points, depth_pixels = mapper.locate(depth, centers, tolerance=None)
+    reprojected = color_intr.project(points)
+    for center, pixel, point, back in zip(centers, depth_pixels, points, reprojected):
+        print(f"color {tuple(center.tolist())} -> depth {tuple(pixel.tolist())}: point ({point[0]:+.3f}, {point[1]:+.3f}, "
+              f"{point[2]:.3f}) m, reprojection error {np.linalg.norm(back - center):.2f} px")
+
+    for count in (1, 10, 100):
+        pixels = np.random.default_rng(0).integers((0, 0), (424, 240), (count, 2))
+        times = []
+        for _ in range(200):
+            started = time.perf_counter()
+            mapper.locate(depth, pixels)
+            times.append(time.perf_counter() - started)
+        print(f"locate {count:>3} pixels: {np.median(times) * 1000:.3f} ms")
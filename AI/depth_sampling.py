@@ -0,0 +1,84 @@
+"""
+Vectorized depth sampling for detections.
+
+Takes the RealSense depth frame once as a NumPy array (raw z16 values times
+the depth units) and computes a robust distance for every detection in one
+set of array operations, instead of calling depth_frame.get_distance() per
+pixel from Python.
+"""
+import numpy as np
+
+def depth_array(depth_frame):
+    """Zero-copy view of the z16 depth image and the metres-per-unit scale"""
+    return np.asanyarray(depth_frame.get_data()), depth_frame.get_units()
+
+def _robust_mean(values, valid, tolerance):
+    """
+    Per-row mean of the valid samples, keeping only those within `tolerance`
+    of the row median (all valid samples when tolerance is None).
+    Rows with no valid sample give 0; rows where the filter drops
+    everything fall back to the median.
+    """
+    count = valid.sum(axis=1)
+    total = np.where(valid, values, 0.0).sum(axis=1)
+    if tolerance is None:
+        return np.where(count > 0, total / np.maximum(count, 1), 0.0)
+
+    # Median of the valid samples: invalid ones sort to the end as +inf
+    ordered = np.sort(np.where(valid, values, np.inf), axis=1)
+    low = np.take_along_axis(ordered, np.maximum(count - 1, 0)[:, None] // 2, axis=1)[:, 0]
+    high = np.take_along_axis(ordered, np.minimum(count // 2, values.shape[1] - 1)[:, None], axis=1)[:, 0]
+    median = np.where(count > 0, (low + high) / 2, 0.0)
+
+    close = valid & (np.abs(values - median[:, None]) < tolerance)
+    kept = close.sum(axis=1)
+    mean = np.where(close, values, 0.0).sum(axis=1) / np.maximum(kept, 1)
+    return np.where(kept > 0, mean, median)
+
+def _gather(depth, xs, ys, units, min_depth, max_depth):
+    """Depth in metres at integer pixel grids, with a mask of usable samples"""
+    height, width = depth.shape
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    values = depth[np.clip(ys, 0, height - 1), np.clip(xs, 0, width - 1)] * units
+    valid = inside & (values > min_depth) & (values < max_depth)
+    rows = len(values)
+    return values.reshape(rows, -1), valid.reshape(rows, -1)
+
+def window_depths(depth, centers, k=7, units=0.001, min_depth=0.0, max_depth=5.0, tolerance=0.3):
+    """
+    Robust depth (metres) in a k x k window around each (cx, cy).
+    Returns an array with one distance per center, 0 where nothing valid was seen.
+    """
+    centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+    if len(centers) == 0:
+        return np.zeros(0)
+    offsets = np.arange(k) - k // 2
+    xs = centers[:, 0, None, None] + offsets[None, None, :]
+    ys = centers[:, 1, None, None] + offsets[None, :, None]
+    values, valid = _gather(depth, xs, ys, units, min_depth, max_depth)
+    return _robust_mean(values, valid, tolerance)
+
+def box_depths(depth, boxes, samples=9, shrink=0.2, units=0.001, min_depth=0.0, max_depth=5.0, tolerance=0.3):
+    """
+    Robust depth (metres) inside each (x1, y1, x2, y2) box, from a samples x samples
+    grid over the box shrunk by `shrink` of its size (to stay off the background).
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros(0)
+    x1, y1, x2, y2 = boxes.T
+    margin_x = (x2 - x1) * shrink / 2
+    margin_y = (y2 - y1) * shrink / 2
+    steps = np.linspace(0.0, 1.0, samples)
+    xs = np.rint(x1[:, None] + margin_x[:, None] + steps[None, :] * (x2 - x1 - 2 * margin_x)[:, None]).astype(np.int64)
+    ys = np.rint(y1[:, None] + margin_y[:, None] + steps[None, :] * (y2 - y1 - 2 * margin_y)[:, None]).astype(np.int64)
+    values, valid = _gather(depth, xs[:, None, :], ys[:, :, None], units, min_depth, max_depth)
+    return _robust_mean(values, valid, tolerance)
+
+def detection_centers(detections):
+    """Integer box centers of YOLO detections"""
+    centers = []
+    for det in detections:
+        x1, y1, x2, y2 = map(int, det['box'])
+        centers.append(((x1 + x2) // 2, (y1 + y2) // 2))
+    return centers
@@ -0,0 +1,125 @@
+"""
+Deadline-based frame pacing for the sender loops.
+
+time.sleep(1 / fps) after the work makes every frame take work + period,
+so the loop never reaches fps and still sleeps when it is already late.
+FramePacer schedules frame k at start + k * period instead: wait() sleeps
+only for what is left until the current deadline, and does not sleep at all
+when the loop is behind.
+
+When late, the default is to catch up: the next deadlines stay where they
+were, so a few back-to-back frames bring the average back to fps. With
+drop_late=True, whole periods that were missed are skipped instead, which
+keeps frames fresh at the cost of rate (the caller can grab and discard the
+camera frames it skipped). Either way, a loop more than max_lag periods
+behind is resynchronised rather than bursting.
+"""
+import time
+
+class FramePacer:
+    """Absolute-deadline pacing with lateness and achieved-rate reporting"""
+
+    def __init__(self, fps=30, drop_late=False, max_lag=3, name="Pacer", report_interval=5.0):
+        self.period = 1.0 / fps
+        self.fps = fps
+        self.drop_late = drop_late
+        self.max_lag = max_lag
+        self.name = name
+        self.report_interval = report_interval
+        self.deadline = None
+        self.skipped = 0                # periods skipped by the last wait() (drop_late)
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = time.perf_counter()
+        self.frames = 0
+        self.late = 0
+        self.lateness = 0.0
+        self.max_lateness = 0.0
+        self.dropped = 0
+        self.resyncs = 0
+
+    def wait(self):
+        """
+        Call once per frame, after the work. Sleeps until this frame's
+        deadline if there is time left; returns how late the frame was (s).
+        """
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now
+        lateness = now - self.deadline
+        self.skipped = 0
+
+        if lateness <= 0:
+            time.sleep(-lateness)
+            lateness = 0.0
+        else:
+            self.late += 1
+            self.lateness += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+            behind = int(lateness / self.period)
+            if self.drop_late and behind:
+                # Skip the slots that already passed instead of catching up on them
+                self.skipped = behind
+                self.dropped += behind
+                self.deadline += behind * self.period
+            elif behind > self.max_lag:
+                self.resyncs += 1
+                self.deadline = now
+
+        self.deadline += self.period
+        self.frames += 1
+        self.report()
+        return lateness
+
+    def stats(self, reset=True):
+        elapsed = max(time.perf_counter() - self.window_start, 1e-9)
+        result = {
+            "fps": self.frames / elapsed,
+            "target_fps": self.fps,
+            "late": self.late,
+            "frames": self.frames,
+            "mean_late_ms": self.lateness / self.late * 1000 if self.late else 0.0,
+            "max_late_ms": self.max_lateness * 1000,
+            "dropped": self.dropped,
+            "resyncs": self.resyncs
+        }
+        if reset:
+            self._reset_window()
+        return result
+
+    def report(self):
+        """Print achieved rate and lateness once per report_interval"""
+        if time.perf_counter() - self.window_start < self.report_interval:
+            return
+        s = self.stats()
+        print(f"[{self.name}] {s['fps']:.1f} FPS (target {s['target_fps']}) | late {s['late']}/{s['frames']}, "
+              f"mean {s['mean_late_ms']:.1f} ms, max {s['max_late_ms']:.1f} ms | "
+              f"dropped {s['dropped']}, resyncs {s['resyncs']}")
+
+if __name__ == "__main__":
+    # Achieved rate with 15-45 ms of work per frame (often over budget): sleep(1/30) vs the pacer
+    import random
+
+    random.seed(0)
+    frames = 90
+
+    def work():
+        time.sleep(random.uniform(0.015, 0.045))
+
+    started = time.perf_counter()
+    for _ in range(frames):
+        work()
+        time.sleep(1 / 30)
+    print(f"{'sleep(1/30)':>20}: {frames / (time.perf_counter() - started):5.1f} FPS")
+
+    for label, drop in (("FramePacer", False), ("FramePacer drop", True)):
+        pacer = FramePacer(30, drop_late=drop, report_interval=1e9)
+        started = time.perf_counter()
+        for _ in range(frames):
+            work()
+            pacer.wait()
+        elapsed = time.perf_counter() - started
+        s = pacer.stats()
+        print(f"{label:>20}: {frames / elapsed:5.1f} FPS, late {s['late']}/{frames}, "
+              f"max {s['max_late_ms']:.1f} ms, dropped {s['dropped']}")
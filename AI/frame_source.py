@@ -0,0 +1,230 @@
+"""
+Camera frame sources: the live RealSense, or a recording played back.
+
+open_pipeline() returns a (pipeline, align) pair with the pyrealsense2
+interface the scripts already use (wait_for_frames, align.process,
+get_depth_frame / get_color_frame, get_data / get_units, stop), so the
+capture code runs unchanged against either one:
+
+    RS_REPLAY unset           live camera
+    RS_REPLAY=capture.bag     RealSense recording, handled like the live stream
+    RS_REPLAY=capture.npz     NumPy capture (already aligned, no SDK needed)
+    RS_REPLAY_FAST=1          play as fast as the pipeline reads, not at recorded speed
+
+When the recording ends, wait_for_frames() raises EndOfReplay.
+motor_control switches to FakeGPIO whenever RS_REPLAY is set.
+
+Record an NPZ capture from the live camera (aligned color + depth):
+
+    python frame_source.py record capture.npz 300
+    python frame_source.py play capture.npz [--fast]
+"""
+import os
+import time
+
+import numpy as np
+
+REPLAY_ENV = "RS_REPLAY"
+FAST_ENV = "RS_REPLAY_FAST"
+
+class EndOfReplay(StopIteration):
+    """The recording has no more frames"""
+
+def replay_path():
+    return os.environ.get(REPLAY_ENV) or None
+
+class ArrayFrame:
+    """Stand-in for a pyrealsense2 frame backed by a NumPy array"""
+
+    def __init__(self, data, units=None, timestamp_ms=0.0, number=0):
+        self.data = data
+        self.units = units
+        self.timestamp_ms = timestamp_ms
+        self.number = number
+
+    def get_data(self):
+        return self.data
+
+    def get_units(self):
+        return self.units
+
+    def get_timestamp(self):
+        return self.timestamp_ms
+
+    def get_frame_number(self):
+        return self.number
+
+    def __bool__(self):
+        return self.data is not None
+
+class ArrayFrameSet:
+    def __init__(self, color, depth):
+        self.color = color
+        self.depth = depth
+
+    def get_color_frame(self):
+        return self.color
+
+    def get_depth_frame(self):
+        return self.depth
+
+class PassthroughAlign:
+    """NPZ captures are recorded after alignment, so process() is a no-op"""
+
+    def process(self, frames):
+        return frames
+
+class NpzPipeline:
+    """
+    Plays back an NPZ capture with arrays color (N, H, W, 3) uint8,
+    depth (N, H, W) uint16, timestamps (N,) seconds and depth_units.
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        capture = np.load(path)
+        self.color = capture["color"]
+        self.depth = capture["depth"]
+        self.timestamps = capture["timestamps"] if "timestamps" in capture else np.arange(len(self.color)) / 30.0
+        self.depth_units = float(capture["depth_units"]) if "depth_units" in capture else 0.001
+        self.realtime = realtime
+        self.loop = loop
+        self.index = 0
+        self.started = None
+        print(f"[Replay] {path}: {len(self.color)} frames "
+              f"{self.color.shape[2]}x{self.color.shape[1]}, {'recorded speed' if realtime else 'as fast as possible'}")
+
+    def start(self, config=None):
+        self.index = 0
+        self.started = time.perf_counter()
+
+    def wait_for_frames(self, timeout_ms=5000):
+        if self.started is None:
+            self.start()
+        if self.index >= len(self.color):
+            if not self.loop:
+                raise EndOfReplay(f"replay finished after {self.index} frames")
+            self.index = 0
+            self.started = time.perf_counter()
+        i = self.index
+        self.index += 1
+        if self.realtime:
+            delay = self.started + (self.timestamps[i] - self.timestamps[0]) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        stamp = float(self.timestamps[i]) * 1000
+        return ArrayFrameSet(ArrayFrame(self.color[i], None, stamp, i),
+                             ArrayFrame(self.depth[i], self.depth_units, stamp, i))
+
+    def stop(self):
+        self.started = None
+
+class BagPipeline:
+    """pyrealsense2 pipeline reading a .bag file, raising EndOfReplay when playback stops"""
+
+    def __init__(self, path, realtime=True):
+        import pyrealsense2 as rs
+        self.rs = rs
+        self.pipeline = rs.pipeline()
+        config = rs.config()
+        config.enable_device_from_file(path, repeat_playback=False)
+        self.profile = self.pipeline.start(config)
+        self.playback = self.profile.get_device().as_playback()
+        self.playback.set_real_time(realtime)
+        print(f"[Replay] {path}: {'recorded speed' if realtime else 'as fast as possible'}")
+
+    def get_active_profile(self):
+        return self.profile
+
+    def wait_for_frames(self, timeout_ms=5000):
+        try:
+            return self.pipeline.wait_for_frames(timeout_ms)
+        except RuntimeError:
+            if self.playback.current_status() == self.rs.playback_status.stopped:
+                raise EndOfReplay("bag playback finished")
+            raise
+
+    def stop(self):
+        self.pipeline.stop()
+
+def apply_presets(profile, visual_preset=2.0, color_auto_exposure=True):
+    """Depth visual preset and color auto exposure; only meaningful on the live camera"""
+    import pyrealsense2 as rs
+    depth_sensor = profile.get_device().first_depth_sensor()
+    if depth_sensor.supports(rs.option.visual_preset):
+        try:
+            depth_sensor.set_option(rs.option.visual_preset, visual_preset)
+        except Exception as e:
+            print(f"[!] Depth Preset Error: {e}")
+
+    sensors = profile.get_device().query_sensors()
+    if color_auto_exposure and len(sensors) > 1 and sensors[1].supports(rs.option.enable_auto_exposure):
+        sensors[1].set_option(rs.option.enable_auto_exposure, 1)
+
+def open_pipeline(width=424, height=240, fps=30, configure=None):
+    """
+    (pipeline, align) for the live camera, or for the recording named by RS_REPLAY.
+    configure(profile) runs only on the live camera (sensor options).
+    """
+    path = replay_path()
+    realtime = not os.environ.get(FAST_ENV)
+    if path and path.endswith(".npz"):
+        return NpzPipeline(path, realtime), PassthroughAlign()
+
+    import pyrealsense2 as rs
+    if path:
+        return BagPipeline(path, realtime), rs.align(rs.stream.color)
+
+    pipeline = rs.pipeline()
+    config = rs.config()
+    config.enable_stream(rs.stream.depth, width, height, rs.format.z16, fps)
+    config.enable_stream(rs.stream.color, width, height, rs.format.bgr8, fps)
+    profile = pipeline.start(config)
+    if configure is not None:
+        configure(profile)
+    return pipeline, rs.align(rs.stream.color)
+
+def record_npz(path, count, width=424, height=240, fps=30):
+    """Capture count aligned color + depth frames from the live camera into an NPZ file"""
+    pipeline, align = open_pipeline(width, height, fps)
+    color, depth, stamps, units = [], [], [], 0.001
+    try:
+        while len(color) < count:
+            aligned = align.process(pipeline.wait_for_frames())
+            depth_frame, color_frame = aligned.get_depth_frame(), aligned.get_color_frame()
+            if not depth_frame or not color_frame:
+                continue
+            color.append(np.array(color_frame.get_data()))
+            depth.append(np.array(depth_frame.get_data()))
+            stamps.append(color_frame.get_timestamp() / 1000)
+            units = depth_frame.get_units()
+    finally:
+        pipeline.stop()
+    # Uncompressed so playback is not limited by decompression
+    np.savez(path, color=np.stack(color), depth=np.stack(depth),
+             timestamps=np.array(stamps), depth_units=units)
+    print(f"[Replay] 💾 Saved {len(color)} frames to {path}")
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "record":
+        record_npz(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 300)
+    elif len(sys.argv) >= 3 and sys.argv[1] == "play":
+        os.environ[REPLAY_ENV] = sys.argv[2]
+        if "--fast" in sys.argv:
+            os.environ[FAST_ENV] = "1"
+        pipeline, align = open_pipeline()
+        frames, started = 0, time.perf_counter()
+        try:
+            while True:
+                aligned = align.process(pipeline.wait_for_frames())
+                np.asanyarray(aligned.get_depth_frame().get_data())
+                frames += 1
+        except EndOfReplay:
+            pass
+        finally:
+            pipeline.stop()
+        elapsed = time.perf_counter() - started
+        print(f"[Replay] {frames} frames in {elapsed:.2f} s ({frames / max(elapsed, 1e-9):.1f} FPS)")
+    else:
+        print(__doc__)
@@ -1,10 +1,13 @@
 # YOLO + RealSense + Custom A* Navigation without external libraries
 import cv2
 import numpy as np
-import pyrealsense2 as rs
 import time
 from yoloDet import YoloTRT
-import heapq
+from depth_sampling import depth_array, window_depths
+from frame_source import open_pipeline, EndOfReplay
+from occupancy import occupancy_grid
+from planner import IncrementalPlanner
+from costmap import Costmap
 
 # Load YOLO-TensorRT model
 model = YoloTRT(
@@ -14,73 +17,16 @@ model = YoloTRT(
     yolo_ver="v5"
 )
 
-# Depth estimation
-def get_center_depth(depth_frame, cx, cy, k=3):
-    values = []
-    for dx in range(-k//2, k//2 + 1):
-        for dy in range(-k//2, k//2 + 1):
-            x, y = cx + dx, cy + dy
-            if 0 <= x < depth_frame.get_width() and 0 <= y < depth_frame.get_height():
-                d = depth_frame.get_distance(x, y)
-                if 0 < d < 5:
-                    values.append(d)
-    if not values:
-        return 0
-    median = np.median(values)
-    filtered = [v for v in values if abs(v - median) < 0.1]
-    return np.mean(filtered) if filtered else median
+# Path planning: LPA* from the robot's cell, repaired frame to frame as the grid changes
+planner = None
 
-# Custom A* pathfinding
-class Node:
-    def __init__(self, x, y, cost=0, heuristic=0, parent=None):
-        self.x = x
-        self.y = y
-        self.cost = cost
-        self.heuristic = heuristic
-        self.parent = parent
-    def __lt__(self, other):
-        return (self.cost + self.heuristic) < (other.cost + other.heuristic)
-
-def astar(grid, start, goal):
-    open_set = []
-    heapq.heappush(open_set, Node(*start, 0, heuristic(start, goal)))
-    visited = set()
-    while open_set:
-        current = heapq.heappop(open_set)
-        if (current.x, current.y) == goal:
-            return reconstruct_path(current)
-        visited.add((current.x, current.y))
-        for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-            nx, ny = current.x + dx, current.y + dy
-            if 0 <= nx < len(grid[0]) and 0 <= ny < len(grid):
-                if grid[ny][nx] == 1 or (nx, ny) in visited:
-                    continue
-                neighbor = Node(nx, ny, current.cost + 1, heuristic((nx, ny), goal), current)
-                heapq.heappush(open_set, neighbor)
-    return []
-
-def heuristic(a, b):
-    return abs(a[0] - b[0]) + abs(a[1] - b[1])
-
-def reconstruct_path(node):
-    path = []
-    while node:
-        path.append((node.x, node.y))
-        node = node.parent
-    return path[::-1]
-
-def build_occupancy_grid(depth_frame, grid_size=20):
-    grid = [[0 for _ in range(grid_size)] for _ in range(grid_size)]
-    width = depth_frame.get_width()
-    height = depth_frame.get_height()
-    for i in range(grid_size):
-        for j in range(grid_size):
-            x = int(width * (i / grid_size))
-            y = int(height * (j / grid_size))
-            d = depth_frame.get_distance(x, y)
-            if 0 < d < 0.3:
-                grid[j][i] = 1
-    return grid
+# Costmap: obstacles inflated by the rover's half-width (WHEEL_BASE_MM in rover/final2.py)
+WHEEL_BASE_MM = 150.0
+SAFETY_MARGIN_M = 0.05
+CELL_SIZE_M = 0.1           # one of 20 columns across the ~87 deg depth FOV at about 1 m
+costmap = Costmap(cell_size=CELL_SIZE_M,
+                  robot_radius=WHEEL_BASE_MM / 2000 + SAFETY_MARGIN_M,
+                  inflation_radius=0.4)
 
 def map_object_to_grid(cx, cy, depth, frame_width, frame_height, grid_size=20):
     fx = (cx - frame_width // 2) / frame_width
@@ -92,14 +38,7 @@ def map_object_to_grid(cx, cy, depth, frame_width, frame_height, grid_size=20):
     return min(max(gx, 0), grid_size - 1), min(max(gy, 0), grid_size - 1)
 
 # RealSense init
-pipeline = rs.pipeline()
-config = rs.config()
-config.enable_stream(rs.stream.depth, 424, 240, rs.format.z16, 30)
-config.enable_stream(rs.stream.color, 424, 240, rs.format.bgr8, 30)
-profile = pipeline.start(config)
-
-# Align depth to color stream
-align = rs.align(rs.stream.color)
+pipeline, align = open_pipeline(424, 240, 30)
 
 # Detection loop
 try:
@@ -118,15 +57,21 @@ try:
             det = detections[0]
             x1, y1, x2, y2 = map(int, det['box'])
             cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
-            depth = get_center_depth(depth_frame, cx, cy)
+            depth_image, depth_units = depth_array(depth_frame)
+            depth = window_depths(depth_image, [(cx, cy)], k=3, units=depth_units,
+                                  max_depth=5.0, tolerance=0.1)[0]
             frame_h, frame_w = frame.shape[:2]
 
             if depth > 0:
-                grid_map = build_occupancy_grid(depth_frame)
+                # uint8 [row][col] grid, 1 where anything in the cell is nearer than 0.3 m
+                grid_map = occupancy_grid(depth_image, (20, 20), units=depth_units, obstacle_depth=0.3)
                 gx, gy = map_object_to_grid(cx, cy, depth, frame_w, frame_h)
                 start = (len(grid_map[0])//2, len(grid_map)//2)
                 goal = (gx, gy)
-                path = astar(grid_map, start, goal)
+                cost_map = costmap.update(grid_map)
+                if planner is None:
+                    planner = IncrementalPlanner(cost_map, start, connectivity=8)
+                path = planner.plan(goal, cost_map)
 
                 for i in range(len(path)-1):
                     x1, y1 = path[i]
@@ -144,6 +89,9 @@ try:
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
+except EndOfReplay as e:
+    print(f"[Replay] ⏹ {e}")
+
 finally:
     pipeline.stop()
     cv2.destroyAllWindows()
@@ -1,21 +1,33 @@
 import sys
 import cv2
 import numpy as np
-import pyrealsense2 as rs
 import socket
-import struct
 import time
 import json
 import threading
 import ast
+import os
 from yoloDet import YoloTRT
+# motor_control (and its FakeGPIO stub for replay) lives in Final_PW
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Final_PW"))
 from motor_control import move_forward_step, turn_left_step, turn_right_step, stop_all, cleanup
+from depth_sampling import depth_array, window_depths, detection_centers
+from frame_source import open_pipeline, apply_presets
+from deprojection import PointMapper
+from pipeline_stages import Pipeline
+from udp_stream import FrameSender
+from stage_timing import StageTimer
+from tracking import BoxTracker, DetectionScheduler
 
 # === UDP Streaming Setup ===
 UDP_IP = '10.65.102.37'       # Replace with viewer/server IP
 UDP_PORT = 5005
 MAX_DGRAM = 65000
 udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# Rolling per-stage timings, sent to the server with every status message
+timings = StageTimer(window=300, frame_budget=1 / 30)
+# Frames go out at native capture size; the viewer scales them for display
+streamer = FrameSender(udp_sock, (UDP_IP, UDP_PORT), max_dgram=MAX_DGRAM, timer=timings)
 
 # === TCP Control Setup ===
 TCP_IP = '172.20.10.5'        # Replace with Web Server IP
@@ -23,6 +35,10 @@ TCP_PORT = 5555
 CLIENT_NAME = "RobotArm"
 RECONNECT_DELAY = 5
 
+# Motor step durations (s) per detection
+TURN_STEP = 0.1
+FORWARD_STEP = 0.1
+
 # Movement flag (shared between threads)
 should_move = threading.Event()  # Starts off as False
 
@@ -35,43 +51,10 @@ model = YoloTRT(
 )
 
 # === RealSense Setup ===
-pipeline = rs.pipeline()
-config = rs.config()
-config.enable_stream(rs.stream.depth, 424, 240, rs.format.z16, 30)
-config.enable_stream(rs.stream.color, 424, 240, rs.format.bgr8, 30)
-profile = pipeline.start(config)
-
-# Set RealSense depth visual preset
-depth_sensor = profile.get_device().first_depth_sensor()
-if depth_sensor.supports(rs.option.visual_preset):
-    try:
-        depth_sensor.set_option(rs.option.visual_preset, 2.0)
-    except Exception as e:
-        print(f"[!] Depth Preset Error: {e}")
-
-# Enable auto exposure for color stream
-sensors = profile.get_device().query_sensors()
-if len(sensors) > 1 and sensors[1].supports(rs.option.enable_auto_exposure):
-    sensors[1].set_option(rs.option.enable_auto_exposure, 1)
-
-# Align depth with color frame
-align = rs.align(rs.stream.color)
-
-# === Helper: Get average depth around point (cx, cy) ===
-def get_average_depth(depth_frame, cx, cy, k=7):
-    values = []
-    for dx in range(-k//2, k//2 + 1):
-        for dy in range(-k//2, k//2 + 1):
-            x, y = cx + dx, cy + dy
-            if 0 <= x < depth_frame.get_width() and 0 <= y < depth_frame.get_height():
-                d = depth_frame.get_distance(x, y)
-                if 0 < d < 5:
-                    values.append(d)
-    if not values:
-        return 0
-    median = np.median(values)
-    filtered = [v for v in values if abs(v - median) < 0.3]
-    return np.mean(filtered) if filtered else median
+# Live camera with the depth preset and color auto exposure, or the recording in RS_REPLAY
+pipeline, align = open_pipeline(424, 240, 30, configure=apply_presets)
+# Depth stays unaligned: only detection centres are mapped into it (None for pre-aligned NPZ replays)
+mapper = PointMapper.from_pipeline(pipeline, max_depth=5.0)
 
 # === TCP Client Thread ===
 def start_tcp_client():
@@ -120,10 +103,12 @@ def start_tcp_client():
                 message = {
                     "type": "status",
                     "msg": "Arm ready",
-                    "position": [10, 20, 30]
+                    "position": [10, 20, 30],
+                    "timing": timings.snapshot()
                 }
                 sock.send(json.dumps(message).encode('utf-8'))
                 print("[RobotArm -> Server] ✅ Sent status update")
+                print(timings.report_line(message["timing"]))
                 time.sleep(5)
             except Exception as e:
                 print(f"[RobotArm] ❌ Sending failed: {e}")
@@ -155,86 +140,139 @@ def start_tcp_client():
 # === Start TCP in background ===
 threading.Thread(target=start_tcp_client, daemon=True).start()
 
-# === Main Processing Loop ===
-frame_num = 0
-last_fps_time = time.time()
-frames_sent = 0
-
-try:
-    while True:
-        # Get RealSense frames
-        frames = pipeline.wait_for_frames()
-        aligned_frames = align.process(frames)
-        depth_frame = aligned_frames.get_depth_frame()
-        color_frame = aligned_frames.get_color_frame()
-
-        if not depth_frame or not color_frame:
-            continue
-
-        frame = np.asanyarray(color_frame.get_data())
-        detections, t = model.Inference(frame)
-
-        h, w, _ = frame.shape
-        center_x = w // 2
-
-        for det in detections:
-            x1, y1, x2, y2 = map(int, det['box'])
-            cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
-            distance = get_average_depth(depth_frame, cx, cy)
-
-            # Draw bounding box and info
-            label = f"{det['class']} {det['conf']:.2f}"
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(frame, label, (x1, y1 - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            cv2.putText(frame, f"{distance:.2f} m", (cx, cy),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-
-            # Movement logic (only if TCP command is ON)
-            offset = cx - center_x
-            threshold = w // 10
-
-            if should_move.is_set():
-                if 0.4 < distance < 2.0:
-                    if offset < -threshold:
-                        turn_left_step(20, 50, 0.1)
-                    elif offset > threshold:
-                        turn_right_step(20, 50, 0.1)
-                    else:
-                        move_forward_step(20, 50, 0.1)
+# === Pipeline Stages ===
+# capture -> inference and capture -> stream, each in its own thread.
+# Queues only hold the newest frame, so streaming keeps camera rate
+# while YOLO, depth sampling and motor commands run at their own rate.
+stages = Pipeline(report_interval=5.0)
+inference_queue = stages.queue()
+stream_queue = stages.queue()
+
+# Latest inference result, drawn by the stream stage on every frame
+latest_overlay = {"detections": [], "distances": [], "infer_time": None}
+
+# YOLO runs every N frames (N adapts to its cost); tracked boxes fill the frames in between
+tracker = BoxTracker()
+scheduler = DetectionScheduler(frame_interval=1 / 30)
+
+def capture_stage():
+    # Get RealSense frames
+    waited = time.perf_counter()
+    frames = pipeline.wait_for_frames()
+    aligned = time.perf_counter()
+    aligned_frames = align.process(frames) if mapper is None else frames
+    timings.record("capture_wait", aligned - waited)
+    timings.record("align", time.perf_counter() - aligned)
+    depth_frame = aligned_frames.get_depth_frame()
+    color_frame = aligned_frames.get_color_frame()
+
+    if not depth_frame or not color_frame:
+        return None
+
+    # Copy out of the RealSense frame pool so the SDK can recycle its buffers
+    depth_image, depth_units = depth_array(depth_frame)
+    return {
+        "color": np.array(color_frame.get_data()),
+        "depth": depth_image.copy(),
+        "depth_units": depth_units,
+        "time": time.perf_counter()
+    }
+
+def inference_stage(packet):
+    global latest_overlay
+    frame = packet["color"]
+    t = latest_overlay["infer_time"]
+    if scheduler.should_detect(tracker):
+        with timings.measure("inference"):
+            detections, t = model.Inference(frame)
+        drift = tracker.update(detections, packet["time"])
+        scheduler.record(True, t, drift)
+    else:
+        with timings.measure("track"):
+            detections = tracker.predict(packet["time"])
+        scheduler.record(False)
+    scheduler.report()
+
+    # Robust distance for every detection in one pass over the depth image
+    with timings.measure("depth"):
+        centers = detection_centers(detections)
+        if mapper is not None:
+            points, _ = mapper.locate(packet["depth"], centers, k=7, tolerance=0.3)
+            distances = points[:, 2]
+        else:
+            distances = window_depths(packet["depth"], centers, k=7,
+                                      units=packet["depth_units"], max_depth=5.0, tolerance=0.3)
+    latest_overlay = {"detections": detections, "distances": distances, "infer_time": t}
+
+    h, w, _ = frame.shape
+    center_x = w // 2
+
+    commanded = time.perf_counter()
+    for det, distance in zip(detections, distances):
+        x1, y1, x2, y2 = map(int, det['box'])
+        cx = (x1 + x2) // 2
+
+        # Movement logic (only if TCP command is ON)
+        offset = cx - center_x
+        threshold = w // 10
+
+        if should_move.is_set():
+            if 0.4 < distance < 2.0:
+                if offset < -threshold:
+                    turn_left_step(20, 50, TURN_STEP)
+                elif offset > threshold:
+                    turn_right_step(20, 50, TURN_STEP)
                 else:
-                    stop_all()
+                    move_forward_step(20, 50, FORWARD_STEP)
             else:
                 stop_all()
-
-            break  # Process only first detected object
-
-        # Add FPS info
-        cv2.putText(frame, f"FPS: {1/t:.2f}", (10, 30),
+        else:
+            stop_all()
+
+        break  # Process only first detected object
+    if detections:
+        timings.record("motor", time.perf_counter() - commanded)
+
+def stream_stage(packet):
+    # Draw on a copy: the inference stage may still be reading this frame
+    drawn = time.perf_counter()
+    frame = packet["color"].copy()
+    overlay = latest_overlay
+
+    for det, distance in zip(overlay["detections"], overlay["distances"]):
+        x1, y1, x2, y2 = map(int, det['box'])
+        cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+
+        # Draw bounding box and info
+        label = f"{det['class']} {det['conf']:.2f}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, label, (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        cv2.putText(frame, f"{distance:.2f} m", (cx, cy),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        break  # Only the first object drives the robot
+
+    # Add inference FPS info
+    if overlay["infer_time"]:
+        cv2.putText(frame, f"FPS: {1/overlay['infer_time']:.2f}", (10, 30),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
 
-        # Send image over UDP in chunks
-        resized = cv2.resize(frame, (640, 480))
-        _, encoded_img = cv2.imencode('.jpg', resized, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-        img_data = encoded_img.tobytes()
-        chunks = [img_data[i:i + MAX_DGRAM - 8] for i in range(0, len(img_data), MAX_DGRAM - 8)]
-        for chunk in chunks:
-            header = struct.pack('>II', frame_num, len(chunks))
-            udp_sock.sendto(header + chunk, (UDP_IP, UDP_PORT))
+    timings.record("draw", time.perf_counter() - drawn)
 
-        frame_num += 1
-        frames_sent += 1
+    # Send image over UDP in chunks (records encode and send)
+    streamer.send(frame)
+    timings.record("capture_to_send", time.perf_counter() - packet["time"])
 
-        now = time.time()
-        if now - last_fps_time >= 5.0:
-            fps = frames_sent / (now - last_fps_time)
-            print(f"[UDP] FPS: {fps:.2f}")
-            frames_sent = 0
-            last_fps_time = now
+stages.add_stage("capture", capture_stage, outputs=(inference_queue, stream_queue))
+stages.add_stage("inference", inference_stage, inbox=inference_queue)
+stages.add_stage("stream", stream_stage, inbox=stream_queue)
 
-        time.sleep(1 / 30)
+# === Main Thread: run the stages and report throughput ===
+try:
+    stages.run_forever()
 
 finally:
+    stages.stop()
     pipeline.stop()
     cleanup()
     udp_sock.close()
@@ -0,0 +1,109 @@
+"""
+Asynchronous motor command executor.
+
+The vision loop submits commands and returns immediately; a single motor
+thread runs them. Only the newest command is kept: a different command or
+a stop arriving mid-move sets the abort event the step functions poll, so
+the running move ends within one PWM period. Repeating the command that
+is already running does not interrupt it, it simply runs again next.
+"""
+import threading
+import time
+
+class MotorExecutor(threading.Thread):
+    """Latest-command-wins motor thread around blocking step functions"""
+
+    def __init__(self, actions, stop_fn):
+        """actions: {name: fn(*args, abort=Event)}; stop_fn: stops every motor"""
+        super().__init__(name="motor-executor", daemon=True)
+        self.actions = actions
+        self.stop_fn = stop_fn
+        self.condition = threading.Condition()
+        self.preempt = threading.Event()
+        self.pending = None
+        self.current = None
+        self.last = None
+        self.running = True
+        self.stats = {"submitted": 0, "executed": 0, "preempted": 0, "superseded": 0}
+
+    def submit(self, action, *args):
+        """Queue a command, replacing any command not yet started"""
+        if action != "stop" and action not in self.actions:
+            raise ValueError(f"unknown motor action: {action}")
+        command = (action,) + args
+        with self.condition:
+            # Already stopped and idle: nothing to do
+            if command == self.last == ("stop",) and self.current is None and self.pending is None:
+                return
+            self.stats["submitted"] += 1
+            if self.pending is not None:
+                self.stats["superseded"] += 1
+            self.pending = command
+            if self.current is not None and command != self.current:
+                self.preempt.set()
+            self.condition.notify()
+
+    def stop(self):
+        """Abort the running move and stop the motors"""
+        self.submit("stop")
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None or not self.running)
+                if not self.running:
+                    return
+                command, self.pending = self.pending, None
+                self.current = command
+                self.preempt.clear()
+
+            try:
+                if command[0] == "stop":
+                    self.stop_fn()
+                else:
+                    self.actions[command[0]](*command[1:], abort=self.preempt)
+            except Exception as e:
+                print(f"[Motor] ❌ Command {command} failed: {e}")
+                self.stop_fn()
+
+            with self.condition:
+                if self.preempt.is_set():
+                    self.stats["preempted"] += 1
+                self.stats["executed"] += 1
+                self.current = None
+                self.last = command
+
+    def shutdown(self, timeout=1.0):
+        """Abort whatever is running, stop the thread and the motors"""
+        with self.condition:
+            self.running = False
+            self.preempt.set()
+            self.condition.notify()
+        if self.is_alive():
+            self.join(timeout)
+        self.stop_fn()
+        print(f"[Motor] Executor stopped: {self.stats}")
+
+if __name__ == "__main__":
+    # Off-device check of the preemption latency with a fake PWM step
+    def fake_step(speed_left, speed_right, duration, abort=None):
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end and not abort.is_set():
+            time.sleep(0.01)
+
+    executor = MotorExecutor({"forward": fake_step, "left": fake_step}, lambda: None)
+    executor.start()
+    latencies = []
+    for _ in range(20):
+        executor.submit("forward", 20, 50, 0.6)
+        time.sleep(0.05)
+        started = time.perf_counter()
+        executor.submit("left", 20, 50, 0.4)
+        while executor.current is None or executor.current[0] != "left":
+            time.sleep(0.0005)
+        latencies.append(time.perf_counter() - started)
+    executor.stop()
+    executor.shutdown()
+    latencies.sort()
+    print(f"preemption latency: median {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"max {latencies[-1] * 1000:.1f} ms")
@@ -0,0 +1,79 @@
+"""
+Occupancy grid from the whole depth image.
+
+Every pixel is reduced into its grid cell with block min-pooling
+(np.minimum.reduceat over rows, then columns), so an obstacle anywhere in
+a cell marks it, not just one sampled pixel. The work stays in the raw
+z16 units; the thresholds are converted once instead of the image.
+"""
+import numpy as np
+
+NO_DATA = np.iinfo(np.uint16).max
+
+def cell_edges(length, cells):
+    """Start index of each of `cells` near-equal blocks over `length` pixels"""
+    return (np.arange(cells) * length) // cells
+
+def _pool_rows(image, rows):
+    """Column-wise minimum over each block of rows (contiguous, so much faster than reduceat on axis 0)"""
+    height = image.shape[0]
+    if height % rows == 0:
+        return image.reshape(rows, height // rows, -1).min(axis=1)
+    edges = np.append(cell_edges(height, rows), height)
+    return np.stack([image[start:end].min(axis=0) for start, end in zip(edges[:-1], edges[1:])])
+
+def min_pool(depth, grid_shape, min_raw=0):
+    """
+    Per-cell minimum of a z16 depth image (rows, cols) -> uint16.
+    Pixels at or below min_raw (0 = no data) are ignored; empty cells read NO_DATA.
+    """
+    rows, cols = grid_shape
+    height, width = depth.shape
+    # Shift so invalid pixels wrap around to the top of the uint16 range and never win the min
+    shift = np.uint16(min_raw + 1)
+    shifted = np.subtract(depth, shift, dtype=np.uint16)
+    pooled = np.minimum.reduceat(_pool_rows(shifted, rows), cell_edges(width, cols), axis=1)
+    return np.where(pooled > NO_DATA - shift, NO_DATA, pooled + shift).astype(np.uint16)
+
+def occupancy_grid(depth, grid_shape=(20, 20), units=0.001, obstacle_depth=0.3, min_depth=0.0):
+    """
+    uint8 grid (rows, cols): 1 where the nearest valid depth in the cell is
+    closer than obstacle_depth metres, 0 otherwise.
+    min_depth drops returns nearer than the sensor's minimum range as noise.
+    """
+    nearest = min_pool(depth, grid_shape, int(min_depth / units))
+    return (nearest < obstacle_depth / units).astype(np.uint8)
+
+def nearest_depth_grid(depth, grid_shape=(20, 20), units=0.001, min_depth=0.0):
+    """Per-cell nearest depth in metres (float32), inf where the cell has no data"""
+    nearest = min_pool(depth, grid_shape, int(min_depth / units))
+    return np.where(nearest == NO_DATA, np.inf, nearest * np.float32(units)).astype(np.float32)
+
+if __name__ == "__main__":
+    # Timing at the RealSense 424x240 resolution vs the old one-pixel-per-cell loop
+    import time
+
+    rng = np.random.default_rng(0)
+    # Floor getting closer towards the bottom, dropouts, and one box 25 cm away
+    depth = (np.linspace(3000, 450, 240)[:, None] + rng.normal(0, 30, (240, 424))).astype(np.uint16)
+    depth[rng.random(depth.shape) < 0.05] = 0
+    depth[150:190, 200:230] = 250
+
+    def legacy(depth, grid_size=20, units=0.001):
+        grid = [[0 for _ in range(grid_size)] for _ in range(grid_size)]
+        height, width = depth.shape
+        for i in range(grid_size):
+            for j in range(grid_size):
+                d = depth[int(height * (j / grid_size)), int(width * (i / grid_size))] * units
+                if 0 < d < 0.3:
+                    grid[j][i] = 1
+        return grid
+
+    for label, fn in (("occupancy_grid", lambda: occupancy_grid(depth)), ("legacy loop", lambda: legacy(depth))):
+        times = []
+        for _ in range(500):
+            started = time.perf_counter()
+            grid = fn()
+            times.append(time.perf_counter() - started)
+        print(f"{label:>15}: median {np.median(times) * 1e6:7.1f} us, "
+              f"{int(np.sum(grid))} of 400 cells occupied")
@@ -0,0 +1,136 @@
+"""
+Threaded capture / inference / streaming pipeline.
+
+Each stage runs in its own thread and hands work to the next through a
+LatestQueue, which keeps only the newest items: a slow consumer skips
+stale frames instead of holding up the producer, so streaming can run
+at camera rate while inference runs at whatever rate it manages.
+"""
+import threading
+import time
+from collections import deque
+
+class LatestQueue:
+    """Bounded queue that keeps the newest items; put() never blocks"""
+
+    def __init__(self, maxsize=1):
+        self.items = deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Oldest queued item, or None if nothing arrived within timeout"""
+        with self.condition:
+            if not self.items and not self.condition.wait_for(lambda: self.items, timeout):
+                return None
+            return self.items.popleft()
+
+class PipelineStage(threading.Thread):
+    """Runs work(item) for every item from inbox (or work() in a loop for a source stage)"""
+
+    def __init__(self, name, work, inbox=None, outputs=(), stop_event=None):
+        super().__init__(name=name, daemon=True)
+        self.work = work
+        self.inbox = inbox
+        self.outputs = outputs
+        self.stop_event = stop_event or threading.Event()
+        self.processed = 0
+        self.busy = 0.0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.inbox is not None:
+                item = self.inbox.get(timeout=0.5)
+                if item is None:
+                    continue
+            started = time.perf_counter()
+            try:
+                result = self.work(item) if self.inbox is not None else self.work()
+            except StopIteration as e:
+                # A finite source (e.g. a replayed recording) ran out: stop the whole pipeline
+                print(f"[Pipeline] ⏹ {self.name} stage finished: {e}")
+                self.stop_event.set()
+                break
+            except Exception as e:
+                self.errors += 1
+                print(f"[Pipeline] ❌ {self.name} stage error: {e}")
+                self.stop_event.wait(0.1)
+                continue
+            with self.lock:
+                self.processed += 1
+                self.busy += time.perf_counter() - started
+            if result is not None:
+                for queue in self.outputs:
+                    queue.put(result)
+
+    def take_stats(self):
+        """(processed, busy seconds, input drops) since the last call"""
+        with self.lock:
+            processed, busy = self.processed, self.busy
+            self.processed, self.busy = 0, 0.0
+        dropped = 0
+        if self.inbox is not None:
+            dropped, self.inbox.dropped = self.inbox.dropped, 0
+        return processed, busy, dropped
+
+class Pipeline:
+    """Owns the stages and queues, and reports per-stage throughput"""
+
+    def __init__(self, report_interval=5.0):
+        self.report_interval = report_interval
+        self.stop_event = threading.Event()
+        self.stages = []
+        self.last_report = time.perf_counter()
+
+    def queue(self, maxsize=1):
+        return LatestQueue(maxsize)
+
+    def add_stage(self, name, work, inbox=None, outputs=()):
+        stage = PipelineStage(name, work, inbox, outputs, self.stop_event)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        self.last_report = time.perf_counter()
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        for stage in self.stages:
+            if stage.is_alive():
+                stage.join(timeout)
+
+    def report(self):
+        """Per-stage rate, mean time per item, utilization and dropped inputs since the last report"""
+        now = time.perf_counter()
+        elapsed = max(now - self.last_report, 1e-9)
+        self.last_report = now
+        stats = {}
+        for stage in self.stages:
+            processed, busy, dropped = stage.take_stats()
+            stats[stage.name] = {
+                "fps": processed / elapsed,
+                "ms_per_item": busy * 1000 / processed if processed else 0.0,
+                "utilization": busy / elapsed,
+                "dropped": dropped
+            }
+        return stats
+
+    def run_forever(self):
+        """Start the stages and print throughput until interrupted"""
+        self.start()
+        while not self.stop_event.wait(self.report_interval):
+            stats = self.report()
+            print("[Pipeline] " + " | ".join(
+                f"{name} {s['fps']:.1f} fps {s['ms_per_item']:.1f} ms ({s['utilization']:.0%} busy, {s['dropped']} dropped)"
+                for name, s in stats.items()))
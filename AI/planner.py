@@ -0,0 +1,289 @@
+"""
+Grid path planning on NumPy cost grids.
+
+The cost grid is padded with one ring of blocked cells and flattened, so a
+neighbour is just index + offset with no bounds checks. Search state
+(g-scores, parents, closed flags) lives in arrays allocated once per grid
+size and reused: each search bumps a stamp instead of clearing them. The
+heap holds (f, g, flat_index) tuples.
+
+Costs are the price of entering a cell (>= 1); np.inf marks it blocked.
+Moves are 4- or 8-connected (diagonals cost sqrt(2) x and may not cut
+blocked corners).
+
+GridPlanner runs plain A*. IncrementalPlanner runs LPA*: it keeps its
+search between calls and, when only a few cells change, repairs the
+previous solution instead of replanning from scratch.
+"""
+import heapq
+import math
+
+import numpy as np
+
+INF = math.inf
+SQRT2 = math.sqrt(2.0)
+
+def cost_from_occupancy(grid, free_cost=1.0):
+    """Cost grid from a 0/1 occupancy grid: occupied cells are blocked"""
+    grid = np.asarray(grid)
+    return np.where(grid != 0, np.inf, free_cost).astype(np.float64)
+
+class _PaddedGrid:
+    """Flat, inf-padded copy of a cost grid plus the move table for it"""
+
+    def __init__(self, cost, connectivity=8):
+        if connectivity not in (4, 8):
+            raise ValueError("connectivity must be 4 or 8")
+        cost = np.asarray(cost, dtype=np.float64)
+        self.rows, self.cols = cost.shape
+        self.width = self.cols + 2
+        padded = np.full((self.rows + 2, self.cols + 2), np.inf)
+        padded[1:-1, 1:-1] = cost
+        self.cost = padded.ravel().tolist()
+        finite = cost[np.isfinite(cost)]
+        self.min_cost = float(finite.min()) if finite.size else 1.0
+        self.connectivity = connectivity
+
+        w = self.width
+        # (offset, step length, corner cells that must be free for a diagonal)
+        self.moves = [(-1, 1.0, None), (1, 1.0, None), (-w, 1.0, None), (w, 1.0, None)]
+        if connectivity == 8:
+            for dy in (-1, 1):
+                for dx in (-1, 1):
+                    self.moves.append((dy * w + dx, SQRT2, (dx, dy * w)))
+
+    def index(self, point):
+        x, y = point
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            raise ValueError(f"{point} is outside the {self.cols}x{self.rows} grid")
+        return (y + 1) * self.width + (x + 1)
+
+    def point(self, index):
+        y, x = divmod(index, self.width)
+        return (x - 1, y - 1)
+
+    def heuristic(self, u, goal):
+        uy, ux = divmod(u, self.width)
+        gy, gx = divmod(goal, self.width)
+        dx, dy = abs(ux - gx), abs(uy - gy)
+        if self.connectivity == 4:
+            return self.min_cost * (dx + dy)
+        return self.min_cost * (max(dx, dy) + (SQRT2 - 1.0) * min(dx, dy))
+
+    def edge(self, u, offset, step, corner):
+        """Cost of moving from u by offset, inf if blocked"""
+        v = u + offset
+        cv = self.cost[v]
+        if cv == INF:
+            return INF
+        if corner is not None and (self.cost[u + corner[0]] == INF or self.cost[u + corner[1]] == INF):
+            return INF
+        return step * cv
+
+class GridPlanner:
+    """A* with preallocated, reusable search arrays"""
+
+    def __init__(self, cost, connectivity=8):
+        self.grid = _PaddedGrid(cost, connectivity)
+        size = len(self.grid.cost)
+        self.g = [INF] * size
+        self.parent = [-1] * size
+        self.seen = [0] * size
+        self.closed = [0] * size
+        self.search_id = 0
+        self.expanded = 0
+
+    def set_cost(self, cost):
+        """Swap in a new cost grid of the same shape, keeping the search arrays"""
+        connectivity = self.grid.connectivity
+        grid = _PaddedGrid(cost, connectivity)
+        if (grid.rows, grid.cols) != (self.grid.rows, self.grid.cols):
+            raise ValueError("cost grid changed shape; create a new planner")
+        self.grid = grid
+
+    def plan(self, start, goal):
+        """Cheapest path as a list of (x, y) cells from start to goal, [] if unreachable"""
+        grid = self.grid
+        cost, moves = grid.cost, grid.moves
+        s, t = grid.index(start), grid.index(goal)
+        if cost[s] == INF or cost[t] == INF:
+            return []
+
+        self.search_id += 1
+        sid = self.search_id
+        g, parent, seen, closed = self.g, self.parent, self.seen, self.closed
+        g[s], parent[s], seen[s] = 0.0, -1, sid
+        heap = [(grid.heuristic(s, t), 0.0, s)]
+        expanded = 0
+
+        while heap:
+            _, gu, u = heapq.heappop(heap)
+            if closed[u] == sid:
+                continue
+            closed[u] = sid
+            expanded += 1
+            if u == t:
+                self.expanded = expanded
+                return self._path(t)
+            for offset, step, corner in moves:
+                v = u + offset
+                cv = cost[v]
+                if cv == INF or closed[v] == sid:
+                    continue
+                if corner is not None and (cost[u + corner[0]] == INF or cost[u + corner[1]] == INF):
+                    continue
+                ng = gu + step * cv
+                if seen[v] != sid or ng < g[v]:
+                    seen[v], g[v], parent[v] = sid, ng, u
+                    heapq.heappush(heap, (ng + grid.heuristic(v, t), ng, v))
+
+        self.expanded = expanded
+        return []
+
+    def _path(self, t):
+        path = []
+        node = t
+        while node != -1:
+            path.append(self.grid.point(node))
+            node = self.parent[node]
+        return path[::-1]
+
+    def path_cost(self, goal):
+        """g-score of goal from the last successful search"""
+        return self.g[self.grid.index(goal)]
+
+class IncrementalPlanner:
+    """
+    LPA* from a fixed start cell. g/rhs values do not depend on the goal, so
+    a new goal only re-keys the queue; changed cells only touch their
+    neighbourhood. Falls back to a fresh search if the grid changes shape.
+    """
+
+    def __init__(self, cost, start, connectivity=8):
+        self.connectivity = connectivity
+        self.start = start
+        self.goal = None
+        self.expanded = 0
+        self._reset(cost)
+
+    def _reset(self, cost):
+        self.cost_grid = np.array(cost, dtype=np.float64)
+        self.grid = _PaddedGrid(self.cost_grid, self.connectivity)
+        size = len(self.grid.cost)
+        self.g = [INF] * size
+        self.rhs = [INF] * size
+        self.s = self.grid.index(self.start)
+        self.rhs[self.s] = 0.0
+        self.heap = []
+        self.goal_index = None
+
+    def _key(self, u):
+        m = min(self.g[u], self.rhs[u])
+        return (m + self.grid.heuristic(u, self.goal_index), m)
+
+    def _update_vertex(self, u):
+        grid = self.grid
+        if u != self.s:
+            best = INF
+            if grid.cost[u] != INF:
+                # Predecessor p reaches u by the reverse of the move u -> p
+                for offset, step, corner in grid.moves:
+                    p = u + offset
+                    gp = self.g[p]
+                    if gp == INF:
+                        continue
+                    c = grid.edge(p, -offset, step, None if corner is None else (-corner[0], -corner[1]))
+                    if gp + c < best:
+                        best = gp + c
+            self.rhs[u] = best
+        if self.g[u] != self.rhs[u]:
+            heapq.heappush(self.heap, (self._key(u), u))
+
+    def _compute(self):
+        g, rhs, heap, grid = self.g, self.rhs, self.heap, self.grid
+        t = self.goal_index
+        expanded = 0
+        while heap and (heap[0][0] < self._key(t) or rhs[t] != g[t]):
+            key, u = heapq.heappop(heap)
+            if g[u] == rhs[u]:
+                continue                        # stale entry
+            current = self._key(u)
+            if key < current:
+                heapq.heappush(heap, (current, u))
+                continue
+            expanded += 1
+            if g[u] > rhs[u]:
+                g[u] = rhs[u]
+            else:
+                g[u] = INF
+                self._update_vertex(u)
+            for offset, _, _ in grid.moves:
+                v = u + offset
+                if grid.cost[v] != INF:
+                    self._update_vertex(v)
+        self.expanded = expanded
+
+    def update_cost(self, cost):
+        """Apply a new cost grid; returns the number of cells that changed"""
+        cost = np.asarray(cost, dtype=np.float64)
+        if cost.shape != self.cost_grid.shape:
+            self._reset(cost)
+            return cost.size
+        changed = np.argwhere(cost != self.cost_grid)
+        if len(changed) == 0:
+            return 0
+        self.cost_grid = cost.copy()
+        grid = self.grid
+        touched = set()
+        for y, x in changed:
+            u = grid.index((int(x), int(y)))
+            grid.cost[u] = float(cost[y, x])
+            touched.add(u)
+            for offset, _, _ in grid.moves:
+                touched.add(u + offset)
+        if self.goal_index is not None:
+            for u in touched:
+                if 0 <= u < len(grid.cost):
+                    self._update_vertex(u)
+        return len(changed)
+
+    def plan(self, goal, cost=None):
+        """Path from the fixed start to goal, repairing the previous search"""
+        if cost is not None:
+            self.update_cost(cost)
+        t = self.grid.index(goal)
+        if self.goal_index != t:
+            self.goal = goal
+            self.goal_index = t
+            # Priorities depend on the goal through the heuristic: re-key the queue
+            self.heap = [(self._key(u), u) for _, u in self.heap if self.g[u] != self.rhs[u]]
+            heapq.heapify(self.heap)
+            if not self.heap and self.g[self.s] != self.rhs[self.s]:
+                heapq.heappush(self.heap, (self._key(self.s), self.s))
+        self._compute()
+        return self._path()
+
+    def _path(self):
+        grid = self.grid
+        t = self.goal_index
+        if self.g[t] == INF:
+            return []
+        path = [t]
+        u = t
+        while u != self.s:
+            best, best_p = INF, None
+            for offset, step, corner in grid.moves:
+                p = u + offset
+                if self.g[p] == INF:
+                    continue
+                c = grid.edge(p, -offset, step, None if corner is None else (-corner[0], -corner[1]))
+                if self.g[p] + c < best:
+                    best, best_p = self.g[p] + c, p
+            if best_p is None or len(path) > len(grid.cost):
+                return []
+            u = best_p
+            path.append(u)
+        return [grid.point(u) for u in reversed(path)]
+
+    def path_cost(self):
+        return self.g[self.goal_index]
@@ -0,0 +1,244 @@
+"""
+Black-cylinder / white-square-with-hole detector for Computer_vision.py.
+
+Built to run every frame rather than on a 0.5 s timer:
+  * it searches a region of interest around the last target first and only
+    falls back to the full frame when that misses;
+  * the cylinder keeps priority over the square, as in the old loop: while
+    a square is tracked, the cylinder stage still scans the full frame with
+    what is left of the budget (deferred at most one frame when it does not fit);
+  * contour area, perimeter and bounding box come from one vectorized pass
+    over all contour points (shoelace + reduceat), so the Python loop only
+    touches the few contours that pass the area filter;
+  * the hole search for a square runs on its bounding box, not the frame;
+  * each stage's cost is tracked, and a stage that would not fit in what is
+    left of the per-frame budget is deferred to the next frame.
+"""
+import time
+
+import cv2
+import numpy as np
+
+def contour_stats(contours):
+    """
+    Area, closed perimeter and bounding box (x, y, w, h) of every contour in
+    one pass; matches cv2.contourArea / arcLength(closed) / boundingRect.
+    """
+    n = len(contours)
+    if n == 0:
+        return np.zeros(0), np.zeros(0), np.zeros((0, 4), dtype=np.int64)
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.int64, count=n)
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.float64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    # Each point's successor, wrapping to the first point of its own contour
+    successor = np.arange(len(points)) + 1
+    successor[starts + lengths - 1] = starts
+    nxt = points[successor]
+
+    cross = points[:, 0] * nxt[:, 1] - nxt[:, 0] * points[:, 1]
+    areas = np.abs(np.add.reduceat(cross, starts)) / 2
+    perimeters = np.add.reduceat(np.hypot(*(nxt - points).T), starts)
+
+    low = np.minimum.reduceat(points, starts, axis=0)
+    high = np.maximum.reduceat(points, starts, axis=0)
+    boxes = np.hstack((low, high - low + 1)).astype(np.int64)
+    return areas, perimeters, boxes
+
+def circularity(areas, perimeters):
+    return np.where(perimeters > 0, 4 * np.pi * areas / np.maximum(perimeters, 1e-9) ** 2, 0.0)
+
+class ShapeDetector:
+    """ROI-first, time-budgeted search for the cylinder and square targets"""
+
+    STAGES = ("cylinder", "square")
+
+    def __init__(self, budget_ms=12.0, roi_margin=0.6, min_roi=48,
+                 dark_threshold=50, light_threshold=200, hole_threshold=60,
+                 min_cylinder_area=300, min_square_area=1000, max_hole_area=500,
+                 report_interval=5.0):
+        self.budget = budget_ms / 1000
+        self.roi_margin = roi_margin
+        self.min_roi = min_roi
+        self.dark_threshold = dark_threshold
+        self.light_threshold = light_threshold
+        self.hole_threshold = hole_threshold
+        self.min_cylinder_area = min_cylinder_area
+        self.min_square_area = min_square_area
+        self.max_hole_area = max_hole_area
+        self.report_interval = report_interval
+
+        self.last = None                # last target, for the ROI
+        self.stage_cost = {}            # EMA seconds per stage over the full frame
+        self.deferred = []              # stages skipped for budget, run first next frame
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = time.perf_counter()
+        self.frames = 0
+        self.found = 0
+        self.roi_hits = 0
+        self.skipped = 0
+        self.over_budget = 0
+        self.stage_time = {stage: 0.0 for stage in self.STAGES}
+        self.stage_runs = {stage: 0 for stage in self.STAGES}
+        self.frame_time = 0.0
+
+    # === Stages: each returns a target dict in the searched image's coordinates, or None ===
+    def _cylinder(self, image):
+        _, dark = cv2.threshold(image, self.dark_threshold, 255, cv2.THRESH_BINARY_INV)
+        contours, _ = cv2.findContours(dark, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        areas, perimeters, boxes = contour_stats(contours)
+        circ = circularity(areas, perimeters)
+        hits = np.flatnonzero((areas > self.min_cylinder_area) & (circ > 0.7) & (circ < 1.3))
+        if len(hits) == 0:
+            return None
+        return {"kind": "cylinder", "box": tuple(int(v) for v in boxes[hits[0]])}
+
+    def _square(self, image):
+        _, light = cv2.threshold(image, self.light_threshold, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(light, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        areas, perimeters, boxes = contour_stats(contours)
+        for i in np.flatnonzero(areas > self.min_square_area):
+            cnt = contours[i]
+            approx = cv2.approxPolyDP(cnt, 0.04 * perimeters[i], True)
+            if len(approx) != 4:
+                continue
+            x, y, w, h = (int(v) for v in boxes[i])
+            if self._has_hole(image[y:y + h, x:x + w], cnt - np.array([x, y], dtype=np.int32)):
+                return {"kind": "square", "box": (x, y, w, h)}
+        return None
+
+    def _has_hole(self, patch, contour):
+        """Dark, round blob inside the square's outline, searched within its bounding box"""
+        mask = np.zeros(patch.shape, dtype=np.uint8)
+        cv2.drawContours(mask, [contour], -1, 255, -1)
+        holes = ((patch < self.hole_threshold) & (mask > 0)).astype(np.uint8) * 255
+        contours, _ = cv2.findContours(holes, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        areas, perimeters, _ = contour_stats(contours)
+        circ = circularity(areas, perimeters)
+        return bool(np.any((areas < self.max_hole_area) & (circ > 0.7) & (circ < 1.3)))
+
+    # === Search ===
+    def _roi(self, shape):
+        x, y, w, h = self.last["box"]
+        height, width = shape[:2]
+        mx = max(int(w * self.roi_margin), (self.min_roi - w) // 2, 0)
+        my = max(int(h * self.roi_margin), (self.min_roi - h) // 2, 0)
+        return max(x - mx, 0), max(y - my, 0), min(x + w + mx, width), min(y + h + my, height)
+
+    def _run(self, stage, image, offset, full_frame):
+        started = time.perf_counter()
+        target = self._cylinder(image) if stage == "cylinder" else self._square(image)
+        elapsed = time.perf_counter() - started
+        self.stage_time[stage] += elapsed
+        self.stage_runs[stage] += 1
+        if full_frame:
+            previous = self.stage_cost.get(stage)
+            self.stage_cost[stage] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+        if target is not None:
+            x, y, w, h = target["box"]
+            target["box"] = (x + offset[0], y + offset[1], w, h)
+            target["center"] = (x + offset[0] + w // 2, y + offset[1] + h // 2)
+        return target
+
+    def detect(self, blurred):
+        """
+        Find one target in a blurred grayscale frame.
+        Returns {"kind", "box": (x, y, w, h), "center": (cx, cy)} or None.
+        """
+        started = time.perf_counter()
+        self.frames += 1
+        target = None
+
+        if self.last is not None:
+            x0, y0, x1, y1 = self._roi(blurred.shape)
+            kind = self.last["kind"]
+            target = self._run(kind, blurred[y0:y1, x0:x1], (x0, y0), False)
+            if target is not None:
+                self.roi_hits += 1
+                # Stages ranked above the tracked one still get a full-frame look
+                for stage in self.STAGES[:self.STAGES.index(kind)]:
+                    spent = time.perf_counter() - started
+                    if stage not in self.deferred and spent + self.stage_cost.get(stage, 0.0) > self.budget:
+                        self.deferred.append(stage)
+                        self.skipped += 1
+                        continue
+                    if stage in self.deferred:
+                        self.deferred.remove(stage)
+                    better = self._run(stage, blurred, (0, 0), True)
+                    if better is not None:
+                        target = better
+                        break
+
+        if target is None:
+            # Full-frame fallback: deferred stages first, skipping what no longer fits the budget
+            order = self.deferred + [s for s in self.STAGES if s not in self.deferred]
+            self.deferred = []
+            ran = False
+            for stage in order:
+                spent = time.perf_counter() - started
+                if ran and spent + self.stage_cost.get(stage, 0.0) > self.budget:
+                    self.deferred.append(stage)
+                    self.skipped += 1
+                    continue
+                target = self._run(stage, blurred, (0, 0), True)
+                ran = True
+                if target is not None:
+                    break
+
+        self.last = target
+        elapsed = time.perf_counter() - started
+        self.frame_time += elapsed
+        if elapsed > self.budget:
+            self.over_budget += 1
+        if target is not None:
+            self.found += 1
+        self.report()
+        return target
+
+    def report(self):
+        """Print detection rate, ROI hit share and per-stage cost once per report_interval"""
+        elapsed = time.perf_counter() - self.window_start
+        if elapsed < self.report_interval or not self.frames:
+            return
+        stages = ", ".join(f"{s} {self.stage_time[s] / self.stage_runs[s] * 1000:.1f} ms"
+                           for s in self.STAGES if self.stage_runs[s])
+        print(f"[Shapes] {self.frames / elapsed:.1f} FPS | found {self.found}/{self.frames} "
+              f"(ROI {self.roi_hits}) | frame {self.frame_time / self.frames * 1000:.1f} ms "
+              f"of {self.budget * 1000:.0f} ms, over {self.over_budget}, deferred {self.skipped} | {stages}")
+        self._reset_window()
+
+if __name__ == "__main__":
+    # Per-frame cost: old full-frame loops vs ROI tracking, on a synthetic 424x240 scene
+    rng = np.random.default_rng(0)
+
+    def scene(step):
+        frame = np.full((240, 424), 120, dtype=np.uint8)
+        frame = cv2.add(frame, rng.integers(0, 30, frame.shape, dtype=np.uint8))
+        cx = 100 + (step * 3) % 220
+        cv2.circle(frame, (cx, 120), 30, 20, -1)
+        cv2.rectangle(frame, (330, 30), (400, 100), 230, -1)
+        cv2.circle(frame, (365, 65), 10, 20, -1)
+        return cv2.GaussianBlur(frame, (5, 5), 0)
+
+    def legacy(blurred):
+        _, dark = cv2.threshold(blurred, 50, 255, cv2.THRESH_BINARY_INV)
+        contours, _ = cv2.findContours(dark, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for cnt in contours:
+            area = cv2.contourArea(cnt)
+            perimeter = cv2.arcLength(cnt, True)
+            if perimeter and area > 300 and 0.7 < 4 * np.pi * area / perimeter ** 2 < 1.3:
+                return cv2.boundingRect(cnt)
+        return None
+
+    frames = [scene(step) for step in range(300)]
+    detector = ShapeDetector(report_interval=1e9)
+    for label, fn in (("legacy full frame", legacy), ("ShapeDetector", detector.detect)):
+        times = []
+        for blurred in frames:
+            started = time.perf_counter()
+            fn(blurred)
+            times.append(time.perf_counter() - started)
+        print(f"{label:>18}: median {np.median(times) * 1000:.2f} ms, p95 {np.percentile(times, 95) * 1000:.2f} ms")
+    print(f"ROI hits: {detector.roi_hits}/{detector.frames}")
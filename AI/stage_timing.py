@@ -0,0 +1,84 @@
+"""
+Per-stage timing for the Jetson vision loop.
+
+Each stage (capture wait, align, inference, depth sampling, drawing, encode,
+send, motor command, ...) records how long it took; StageTimer keeps the
+last `window` samples per stage and turns them into rolling percentiles on
+demand. Recording is a deque append under a lock, so it is cheap enough to
+leave on in every thread; the percentiles are only computed when a report
+is built, e.g. for the TCP status message every few seconds.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+class StageTimer:
+    """Rolling per-stage timings shared by the pipeline threads"""
+
+    def __init__(self, window=300, frame_budget=1 / 30, percentiles=(50, 95, 99)):
+        self.window = window
+        self.frame_budget = frame_budget
+        self.percentiles = percentiles
+        self.samples = {}           # {stage: deque of seconds}, in first-recorded order
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    @contextmanager
+    def measure(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def snapshot(self):
+        """JSON-ready {"budget_ms", "stages": {stage: {"n", "p50_ms", ..., "max_ms"}}}"""
+        with self.lock:
+            copies = {stage: np.fromiter(samples, dtype=np.float64) for stage, samples in self.samples.items()}
+        stages = {}
+        for stage, values in copies.items():
+            if len(values) == 0:
+                continue
+            points = np.percentile(values, self.percentiles) * 1000
+            entry = {"n": int(len(values))}
+            entry.update({f"p{p}_ms": round(float(v), 2) for p, v in zip(self.percentiles, points)})
+            entry["max_ms"] = round(float(values.max() * 1000), 2)
+            stages[stage] = entry
+        return {"budget_ms": round(self.frame_budget * 1000, 2), "window": self.window, "stages": stages}
+
+    def report_line(self, snapshot=None):
+        """One-line summary: median / p95 per stage against the frame budget"""
+        snapshot = snapshot or self.snapshot()
+        parts = [f"{stage} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}" for stage, s in snapshot["stages"].items()
+                 if "p50_ms" in s and "p95_ms" in s]
+        return f"[Timing] p50/p95 ms (budget {snapshot['budget_ms']:.1f}): " + " | ".join(parts)
+
+if __name__ == "__main__":
+    # Overhead of recording one sample, and the cost of building a snapshot
+    timer = StageTimer()
+    n = 100000
+    started = time.perf_counter()
+    for i in range(n):
+        timer.record("stage", 0.001)
+    per_record = (time.perf_counter() - started) / n
+    started = time.perf_counter()
+    for _ in range(n // 10):
+        with timer.measure("measured"):
+            pass
+    per_measure = (time.perf_counter() - started) / (n // 10)
+    for stage in ("capture_wait", "align", "inference", "depth", "draw", "encode", "send", "motor"):
+        timer.record(stage, 0.002)
+    started = time.perf_counter()
+    snapshot = timer.snapshot()
+    print(f"record {per_record * 1e6:.2f} us | measure {per_measure * 1e6:.2f} us | "
+          f"snapshot of {len(snapshot['stages'])} stages {(time.perf_counter() - started) * 1e3:.2f} ms")
+    print(timer.report_line(snapshot))
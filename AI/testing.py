@@ -3,19 +3,26 @@ import cv2
 import numpy as np
 import pyrealsense2 as rs
 import socket
-import struct
 import time
 import json
 import threading
 import ast
+import os
 from yoloDet import YoloTRT
+# motor_control (and its FakeGPIO stub for replay) lives in Final_PW
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Final_PW"))
 from motor_control import move_forward_step, turn_left_step, turn_right_step, stop_all, cleanup
+from depth_sampling import depth_array, window_depths, detection_centers
+from udp_stream import FrameSender
+from frame_pacer import FramePacer
 
 # === UDP Streaming Setup ===
 UDP_IP = '192.168.43.114'
 UDP_PORT = 5005
 MAX_DGRAM = 65000
 udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# Frames go out at native capture size; the viewer scales them for display
+streamer = FrameSender(udp_sock, (UDP_IP, UDP_PORT), max_dgram=MAX_DGRAM)
 
 # === TCP Control Setup ===
 TCP_IP = '192.168.43.114'
@@ -42,15 +49,6 @@ profile = pipeline.start(config)
 # Align depth with color frame
 align = rs.align(rs.stream.color)
 
-# === Helper: Get average depth around point (cx, cy) ===
-def get_average_depth(depth_frame, cx, cy, k=5):
-    values = [depth_frame.get_distance(cx + dx, cy + dy)
-              for dx in range(-k//2, k//2 + 1)
-              for dy in range(-k//2, k//2 + 1)
-              if 0 <= cx + dx < depth_frame.get_width() and 0 <= cy + dy < depth_frame.get_height()]
-    values = [v for v in values if 0 < v < 5]
-    return np.mean(values) if values else 0
-
 # === TCP Receive Thread Only ===
 def start_tcp_receiver():
     def receive_commands(sock):
@@ -102,9 +100,8 @@ def start_tcp_receiver():
 threading.Thread(target=start_tcp_receiver, daemon=True).start()
 
 # === Main Loop ===
-frame_num = 0
-last_fps_time = time.time()
-frames_sent = 0
+# Deadline pacing: no sleep at all when YOLO already took the whole frame
+pacer = FramePacer(30, name="Loop")
 
 try:
     while True:
@@ -121,10 +118,13 @@ try:
         h, w, _ = frame.shape
         center_x = w // 2
 
-        for det in detections:
+        depth_image, depth_units = depth_array(depth_frame)
+        distances = window_depths(depth_image, detection_centers(detections), k=5,
+                                  units=depth_units, max_depth=5.0, tolerance=None)
+
+        for det, distance in zip(detections, distances):
             x1, y1, x2, y2 = map(int, det['box'])
             cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
-            distance = get_average_depth(depth_frame, cx, cy)
 
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
             label = f"{det['class']} {det['conf']:.2f}"
@@ -145,25 +145,9 @@ try:
                 stop_all()
             break
 
-        resized = cv2.resize(frame, (640, 480))
-        _, encoded_img = cv2.imencode('.jpg', resized, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-        img_data = encoded_img.tobytes()
-        chunks = [img_data[i:i + MAX_DGRAM - 8] for i in range(0, len(img_data), MAX_DGRAM - 8)]
-        for chunk in chunks:
-            header = struct.pack('>II', frame_num, len(chunks))
-            udp_sock.sendto(header + chunk, (UDP_IP, UDP_PORT))
-
-        frame_num += 1
-        frames_sent += 1
-
-        now = time.time()
-        if now - last_fps_time >= 5:
-            fps = frames_sent / (now - last_fps_time)
-            print(f"[UDP] FPS: {fps:.2f}")
-            frames_sent = 0
-            last_fps_time = now
-
-        time.sleep(1 / 30)
+        streamer.send(frame)
+
+        pacer.wait()
 
 finally:
     pipeline.stop()
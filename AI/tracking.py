@@ -0,0 +1,233 @@
+"""
+Detect-every-N tracking for the YOLO follow loop.
+
+BoxTracker carries YOLO boxes across the frames where detection is skipped:
+each track is a constant-velocity Kalman filter over the box centre and size,
+and new detections are associated to tracks by IoU. DetectionScheduler picks
+the frames that run the detector: every N frames, or sooner when nothing is
+tracked or confidence is low. N grows with the measured inference cost and
+shrinks when the tracked boxes drift away from what the next detection finds.
+"""
+import math
+import time
+
+import numpy as np
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU of (N, 4) and (M, 4) x1, y1, x2, y2 boxes"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+def _to_state(box):
+    x1, y1, x2, y2 = box
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+class KalmanBoxTrack:
+    """Constant-velocity Kalman filter over [cx, cy, w, h, vx, vy] (pixels, pixels/s)"""
+
+    H = np.hstack((np.eye(4), np.zeros((4, 2))))
+
+    def __init__(self, track_id, detection, timestamp, pos_noise=100.0, vel_noise=2000.0, meas_noise=16.0):
+        self.track_id = track_id
+        self.label = detection['class']
+        self.conf = detection['conf']
+        self.x = np.concatenate((_to_state(detection['box']), np.zeros(2)))
+        self.P = np.diag([meas_noise] * 4 + [1e4, 1e4])
+        self.R = np.eye(4) * meas_noise
+        self.pos_noise = pos_noise
+        self.vel_noise = vel_noise
+        self.timestamp = timestamp
+        self.misses = 0
+
+    def predict(self, timestamp):
+        dt = max(timestamp - self.timestamp, 0.0)
+        self.timestamp = timestamp
+        if dt == 0:
+            return
+        F = np.eye(6)
+        F[0, 4] = F[1, 5] = dt
+        Q = np.diag([self.pos_noise * dt] * 4 + [self.vel_noise * dt] * 2)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+
+    def update(self, detection):
+        z = _to_state(detection['box'])
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self.H @ self.x)
+        self.P = (np.eye(6) - K @ self.H) @ self.P
+        self.conf = detection['conf']
+        self.misses = 0
+
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        w, h = max(w, 1.0), max(h, 1.0)
+        return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+
+    def detection(self):
+        return {'box': self.box(), 'class': self.label, 'conf': self.conf,
+                'track_id': self.track_id, 'tracked': True}
+
+class BoxTracker:
+    """IoU association plus per-track Kalman prediction"""
+
+    def __init__(self, iou_threshold=0.3, max_misses=1):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self.next_id = 0
+
+    def predict(self, timestamp):
+        """Advance every track to timestamp; returns the predicted detections, most confident first"""
+        for track in self.tracks:
+            track.predict(timestamp)
+        return self.detections()
+
+    def update(self, detections, timestamp):
+        """
+        Correct the tracks with a fresh detection result.
+        Returns the IoU between each matched track's prediction and its detection,
+        i.e. how far tracking had drifted since the previous detection.
+        """
+        self.predict(timestamp)
+        predicted = [track.box() for track in self.tracks]
+        ious = iou_matrix(predicted, [det['box'] for det in detections])
+        for i, track in enumerate(self.tracks):
+            for j, det in enumerate(detections):
+                if det['class'] != track.label:
+                    ious[i, j] = 0.0
+
+        drift = []
+        matched_tracks, matched_dets = set(), set()
+        # Greedy assignment, best overlap first (a handful of boxes: no need for Hungarian)
+        for flat in np.argsort(ious, axis=None)[::-1]:
+            i, j = divmod(int(flat), ious.shape[1])
+            if ious[i, j] < self.iou_threshold:
+                break
+            if i in matched_tracks or j in matched_dets:
+                continue
+            matched_tracks.add(i)
+            matched_dets.add(j)
+            drift.append(float(ious[i, j]))
+            self.tracks[i].update(detections[j])
+
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        for j, det in enumerate(detections):
+            if j not in matched_dets:
+                self.tracks.append(KalmanBoxTrack(self.next_id, det, timestamp))
+                self.next_id += 1
+        return drift
+
+    def detections(self):
+        return [t.detection() for t in sorted(self.tracks, key=lambda t: -t.conf)]
+
+class DetectionScheduler:
+    """Chooses which frames run the detector and logs the rate / accuracy tradeoff"""
+
+    def __init__(self, frame_interval=1 / 30, inference_share=0.5, max_interval=6,
+                 low_conf=0.6, min_iou=0.5, good_iou=0.75, report_interval=5.0):
+        self.frame_interval = frame_interval
+        self.inference_share = inference_share
+        self.max_interval = max_interval
+        self.low_conf = low_conf
+        self.min_iou = min_iou
+        self.good_iou = good_iou
+        self.report_interval = report_interval
+
+        self.infer_time = None          # EMA of inference seconds
+        self.accuracy_cap = max_interval
+        self.interval = 1
+        self.since_detection = 0
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = time.perf_counter()
+        self.frames = 0
+        self.detections = 0
+        self.drift = []
+
+    def should_detect(self, tracker):
+        """Detect when the interval is up, nothing is tracked, or confidence has dropped"""
+        if self.since_detection >= self.interval or not tracker.tracks:
+            return True
+        return max(t.conf for t in tracker.tracks) < self.low_conf
+
+    def record(self, detected, infer_time=None, drift=None):
+        """Account for one processed frame; adapts N after each detection"""
+        self.frames += 1
+        if not detected:
+            self.since_detection += 1
+            return
+        self.detections += 1
+        self.since_detection = 1
+        self.infer_time = infer_time if self.infer_time is None else 0.8 * self.infer_time + 0.2 * infer_time
+
+        # Accuracy: shrink the cap quickly when tracks drifted, grow it back slowly
+        if drift:
+            self.drift.extend(drift)
+            worst = min(drift)
+            if worst < self.min_iou:
+                self.accuracy_cap = max(1, self.accuracy_cap // 2)
+            elif worst > self.good_iou:
+                self.accuracy_cap = min(self.max_interval, self.accuracy_cap + 1)
+
+        # Cost: run the detector often enough to spend at most inference_share of frame time on it
+        by_cost = math.ceil(self.infer_time / (self.inference_share * self.frame_interval))
+        self.interval = max(1, min(by_cost, self.accuracy_cap))
+
+    def report(self):
+        """Print loop rate, detection ratio, N and drift once per report_interval"""
+        elapsed = time.perf_counter() - self.window_start
+        if elapsed < self.report_interval:
+            return None
+        stats = {
+            "loop_hz": self.frames / elapsed,
+            "detect_hz": self.detections / elapsed,
+            "interval": self.interval,
+            "infer_ms": (self.infer_time or 0.0) * 1000,
+            "mean_iou": float(np.mean(self.drift)) if self.drift else None
+        }
+        iou = f"{stats['mean_iou']:.2f}" if stats["mean_iou"] is not None else "n/a"
+        print(f"[Tracker] loop {stats['loop_hz']:.1f} Hz | detect {stats['detect_hz']:.1f} Hz "
+              f"(every {stats['interval']} frames, {stats['infer_ms']:.0f} ms) | track/detect IoU {iou}")
+        self._reset_window()
+        return stats
+
+if __name__ == "__main__":
+    # Accuracy of tracked boxes vs detecting every N frames on a synthetic target
+    rng = np.random.default_rng(0)
+    dt = 1 / 30
+
+    def ground_truth(step):
+        t = step * dt
+        cx = 212 + 120 * math.sin(0.8 * t)
+        cy = 120 + 40 * math.sin(1.3 * t)
+        w, h = 60 + 10 * math.sin(0.5 * t), 90
+        return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+
+    print(f"{'N':>3} {'detect %':>9} {'mean IoU':>9} {'min IoU':>8}")
+    for n in (1, 2, 3, 4, 6, 8, 12):
+        tracker = BoxTracker()
+        ious = []
+        for step in range(600):
+            truth = ground_truth(step)
+            if step % n == 0:
+                noisy = list(np.asarray(truth) + rng.normal(0, 2, 4))
+                tracker.update([{'box': noisy, 'class': 'target', 'conf': 0.9}], step * dt)
+            else:
+                tracker.predict(step * dt)
+            if tracker.tracks:
+                ious.append(iou_matrix([tracker.tracks[0].box()], [truth])[0, 0])
+        print(f"{n:>3} {100 / n:>8.0f}% {np.mean(ious):>9.3f} {np.min(ious):>8.3f}")
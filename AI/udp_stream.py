@@ -0,0 +1,130 @@
+"""
+UDP JPEG streaming from the Jetson to the server.
+
+Frames are encoded at their native capture resolution and sent with a v2
+chunk header carrying the real width and height, so the server can forward
+the JPEG untouched and the viewer scales it only when drawing. Set
+output_size to upscale before encoding as the old loops did.
+
+v2 chunk header (16 bytes, big-endian):
+    magic b'FR', version 2, flags, frame_num (u32), chunk_idx (u16),
+    total_chunks (u16), width (u16), height (u16)
+"""
+import struct
+import time
+
+import cv2
+
+HEADER_V2 = struct.Struct(">2sBBIHHHH")
+MAGIC = b"FR"
+VERSION = 2
+
+def pack_chunks(jpeg, frame_num, width, height, max_dgram=65000):
+    """Split one encoded frame into datagrams with v2 headers"""
+    payload = max_dgram - HEADER_V2.size
+    total = max(1, -(-len(jpeg) // payload))
+    return [HEADER_V2.pack(MAGIC, VERSION, 0, frame_num & 0xFFFFFFFF, idx, total, width, height)
+            + jpeg[idx * payload:(idx + 1) * payload] for idx in range(total)]
+
+class FrameSender:
+    """Encodes frames, sends them in v2 chunks and reports size and encode time"""
+
+    def __init__(self, sock, address, quality=70, max_dgram=65000, output_size=None,
+                 compare_size=(640, 480), compare_every=0, report_interval=5.0, timer=None):
+        self.sock = sock
+        self.address = address
+        self.params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        self.max_dgram = max_dgram
+        self.output_size = output_size
+        # Every compare_every frames, also time the old upscale+encode to measure the savings
+        self.compare_size = compare_size
+        self.compare_every = compare_every
+        self.report_interval = report_interval
+        # Optional stage_timing.StageTimer: records "encode" and "send" per frame
+        self.timer = timer
+        self.frame_num = 0
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = time.time()
+        self.frames = 0
+        self.bytes = 0
+        self.encode_time = 0.0
+        self.compared = 0
+        self.compare_bytes_saved = 0
+        self.compare_time_saved = 0.0
+
+    def encode(self, frame):
+        if self.output_size is not None and (frame.shape[1], frame.shape[0]) != tuple(self.output_size):
+            frame = cv2.resize(frame, tuple(self.output_size))
+        ok, encoded = cv2.imencode('.jpg', frame, self.params)
+        if not ok:
+            raise ValueError("JPEG encode failed")
+        return encoded.tobytes(), frame.shape[1], frame.shape[0]
+
+    def send(self, frame):
+        """Encode and send one BGR frame; returns the encoded size in bytes"""
+        started = time.perf_counter()
+        jpeg, width, height = self.encode(frame)
+        elapsed = time.perf_counter() - started
+
+        sent = time.perf_counter()
+        for datagram in pack_chunks(jpeg, self.frame_num, width, height, self.max_dgram):
+            self.sock.sendto(datagram, self.address)
+        if self.timer is not None:
+            self.timer.record("encode", elapsed)
+            self.timer.record("send", time.perf_counter() - sent)
+
+        self.frame_num += 1
+        self.frames += 1
+        self.bytes += len(jpeg)
+        self.encode_time += elapsed
+        if self.compare_every and self.frame_num % self.compare_every == 0:
+            self._compare(frame, len(jpeg), elapsed)
+        self.report(width, height)
+        return len(jpeg)
+
+    def _compare(self, frame, size, elapsed):
+        started = time.perf_counter()
+        _, legacy = cv2.imencode('.jpg', cv2.resize(frame, self.compare_size), self.params)
+        self.compared += 1
+        self.compare_bytes_saved += len(legacy) - size
+        self.compare_time_saved += time.perf_counter() - started - elapsed
+
+    def report(self, width, height):
+        now = time.time()
+        if now - self.window_start < self.report_interval or not self.frames:
+            return
+        line = (f"[UDP] FPS: {self.frames / (now - self.window_start):.2f} | {width}x{height} "
+                f"{self.bytes / self.frames / 1024:.1f} KB/frame, encode {self.encode_time / self.frames * 1000:.1f} ms")
+        if self.compared:
+            line += (f" | vs {self.compare_size[0]}x{self.compare_size[1]}: "
+                     f"-{self.compare_bytes_saved / self.compared / 1024:.1f} KB, "
+                     f"-{self.compare_time_saved / self.compared * 1000:.1f} ms per frame")
+        print(line)
+        self._reset_window()
+
+if __name__ == "__main__":
+    # Encode cost and size at native 424x240 vs the old 640x480 upscale
+    import sys
+    import numpy as np
+
+    if len(sys.argv) > 1:
+        frame = cv2.imread(sys.argv[1])
+        frame = cv2.resize(frame, (424, 240))
+    else:
+        rng = np.random.default_rng(0)
+        frame = np.dstack([np.tile(np.linspace(0, 255, 424), (240, 1))] * 3).astype(np.uint8)
+        frame = cv2.add(frame, rng.integers(0, 40, frame.shape, dtype=np.uint8))
+        cv2.rectangle(frame, (150, 60), (260, 200), (0, 255, 0), 2)
+
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
+    for label, size in (("native 424x240", None), ("upscaled 640x480", (640, 480))):
+        times = []
+        for _ in range(200):
+            started = time.perf_counter()
+            image = frame if size is None else cv2.resize(frame, size)
+            _, jpeg = cv2.imencode('.jpg', image, params)
+            times.append(time.perf_counter() - started)
+        print(f"{label:>17}: {len(jpeg) / 1024:6.1f} KB, {np.median(times) * 1000:.2f} ms "
+              f"({len(pack_chunks(jpeg.tobytes(), 0, image.shape[1], image.shape[0]))} datagrams)")
@@ -0,0 +1,100 @@
+"""
+Requests-per-second benchmark for the HTTP API.
+
+Compares the previous single-threaded HTTP/1.0 server against the threaded
+HTTP/1.1 keep-alive server, with several pollers hitting /api/sensor and
+/api/matrix while one client keeps asking for a week of raw history.
+
+Usage: python bench_http_api.py [seconds] [pollers]
+"""
+import sys
+import time
+import random
+import tempfile
+import threading
+import socketserver
+import http.client
+
+from data_handler import DataHandler
+from http_api import APIHTTPServer, DataAPIHandler
+
+class LegacyHTTPServer(APIHTTPServer):
+    """Handles one connection at a time, like the plain HTTPServer"""
+    def process_request(self, request, client_address):
+        socketserver.TCPServer.process_request(self, request, client_address)
+
+class LegacyHandler(DataAPIHandler):
+    protocol_version = "HTTP/1.0"
+
+def seed_history(data_handler, days=7, per_hour=100):
+    """Fill history files with a week of samples"""
+    now = time.time()
+    entries = []
+    for i in range(days * 24 * per_hour):
+        ts = now - i * 3600 / per_hour
+        value = random.randint(0, 1000)
+        entries.append(("sensor", {
+            "sensor_value": value,
+            "threshold": 500,
+            "state": 1 if value > 500 else 0,
+            "timestamp": ts,
+            "last_update": ""
+        }))
+    data_handler._save_to_history(data_handler._group_history(entries))
+
+def run_client(port, paths, stop_at, counts, index):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    done = 0
+    while time.time() < stop_at:
+        for path in paths:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+                conn.close()
+            done += 1
+    conn.close()
+    counts[index] = done
+
+def bench(server_class, handler_class, data_handler, seconds, pollers):
+    handler = lambda *args, **kwargs: handler_class(data_handler, *args, **kwargs)
+    server = server_class(("127.0.0.1", 0), handler)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stop_at = time.time() + seconds
+    counts = [0] * (pollers + 1)
+    threads = [threading.Thread(target=run_client,
+                                args=(port, ["/api/sensor", "/api/matrix"], stop_at, counts, i))
+               for i in range(pollers)]
+    threads.append(threading.Thread(target=run_client,
+                                    args=(port, ["/api/sensor/history?hours=168"], stop_at, counts, pollers)))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    server.shutdown()
+    server.server_close()
+    return sum(counts[:pollers]) / seconds, counts[pollers] / seconds
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pollers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        data_handler = DataHandler(data_dir)
+        seed_history(data_handler)
+
+        results = [
+            ("before: HTTPServer, HTTP/1.0", bench(LegacyHTTPServer, LegacyHandler, data_handler, seconds, pollers)),
+            ("after: APIHTTPServer, HTTP/1.1 keep-alive", bench(APIHTTPServer, DataAPIHandler, data_handler, seconds, pollers)),
+        ]
+        data_handler.stop()
+
+    print(f"\n=== HTTP API benchmark ({pollers} pollers + 1 history client, {seconds:.0f}s) ===")
+    for name, (poll_rps, history_rps) in results:
+        print(f"{name:45s} polls: {poll_rps:8.1f} req/s   history: {history_rps:6.2f} req/s")
+
+if __name__ == "__main__":
+    main()
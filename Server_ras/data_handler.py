@@ -1,29 +1,137 @@
 import json
 import os
 import time
+import atexit
+import math
+import base64
 from datetime import datetime, timedelta
 import threading
 from pathlib import Path
+from rollups import SensorRollups, pick_resolution
+from event_stream import EventBroker
+from metrics import MetricsRegistry
+from sensor_buffer import SensorRingBuffer, summarize
+from matrix_store import MatrixStore, pack_matrix, unpack_matrix, to_list
+from retention import RetentionManager
+import numpy as np
+
+def _number(value, name):
+    """Validate a finite int/float field"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+def _parse_history(text, name):
+    """
+    Entries of an hourly history file (a JSON array). A file cut short by a
+    crash during an in-place append keeps every complete entry.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    decoder = json.JSONDecoder()
+    records = []
+    idx = text.find("[") + 1
+    while True:
+        while idx < len(text) and (text[idx].isspace() or text[idx] == ","):
+            idx += 1
+        if idx >= len(text) or text[idx] == "]":
+            break
+        try:
+            record, idx = decoder.raw_decode(text, idx)
+        except ValueError:
+            break
+        records.append(record)
+    print(f"[DataHandler] ⚠️ {name} was cut short, recovered {len(records)} entries")
+    return records
+
+def _check_matrix(matrix):
+    """Raise ValueError unless matrix is a non-empty rectangular list of finite numbers"""
+    if not isinstance(matrix, list) or not matrix or not all(isinstance(row, list) for row in matrix):
+        raise ValueError("matrix must be a list of rows")
+    if len({len(row) for row in matrix}) != 1:
+        raise ValueError("matrix rows must have the same length")
+    for row in matrix:
+        for cell in row:
+            _number(cell, "matrix cell")
 
 class DataHandler:
-    def __init__(self, data_dir="data"):
+    def __init__(self, data_dir="data", flush_interval=1.0, metrics=None, buffer_hours=6, buffer_capacity=131072,
+                 raw_days=7, compacted_days=90):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         
         # File paths
         self.sensor_file = self.data_dir / "sensor_data.json"
-        self.matrix_file = self.data_dir / "matrix_data.json"
+        self.matrix_file = self.data_dir / "matrix_data.bin"             # Packed snapshot
+        self.legacy_matrix_file = self.data_dir / "matrix_data.json"
         self.history_dir = self.data_dir / "history"
         self.history_dir.mkdir(exist_ok=True)
+        self.rollups_file = self.data_dir / "sensor_rollups.json"
+        self.state_files = {
+            "sensor": self.sensor_file,
+            "matrix": self.matrix_file
+        }
         
         # Thread safety
-        self.lock = threading.Lock()
+        self.lock = threading.Lock()          # Disk I/O
+        self.state_lock = threading.Lock()    # In-memory state
+        
+        # In-memory current state (source of truth for reads)
+        self.current = {}
+        self.current_json = {}                # (body bytes, etag, last_modified), rebuilt on update
+        self.versions = {}                    # Per-key data version, bumped on every update
+        self.boot_id = format(int(time.time()), "x")
+        self.events = EventBroker()           # Push updates to SSE streams
+        self.listeners = []                   # callback(key, data) after each state change
+        self.matrix_store = MatrixStore()     # Matrix version counter and recent snapshots
+        
+        # Write-behind persistence
+        self.flush_interval = flush_interval
+        self.dirty = set()
+        self.pending_history = []             # [(data_type, data)]
+        self.flushing = {}                    # {history_file: [(data_type, data)]} being written
+        self.flush_lock = threading.Lock()    # One flush at a time, snapshot to write
+        self.history_tails = {}               # {history_file: newest timestamp written by this process}
+        self.stop_event = threading.Event()
+        
+        # Downsampled sensor history (1m / 10m / 1h)
+        self.rollups = SensorRollups()
+        self.rollups_persist_interval = 60
+        self.rollups_persisted_at = time.time()
+        
+        # Recent raw sensor samples kept in memory for range queries and aggregates
+        self.buffer_hours = buffer_hours
+        self.recent = SensorRingBuffer(buffer_capacity, covered_since=time.time())
+        
+        # Metrics (own registry when used standalone)
+        self.metrics = metrics or MetricsRegistry()
+        self.updates = self.metrics.counter("data_updates_total", "State updates received", labels=("key",))
+        self.flush_time = self.metrics.histogram("data_flush_seconds", "Duration of write-behind flushes")
+        self.write_errors = self.metrics.counter("data_write_errors_total", "Failed state/history file writes")
+        self.history_written = self.metrics.counter("data_history_entries_written_total", "Entries appended to history files")
+        self.metrics.gauge("data_pending_history", "History entries waiting for the next flush",
+                           function=lambda: len(self.pending_history))
+        
+        # Batch uploads from devices that buffered readings offline
+        self.max_batch_size = 5000
+        # Oldest accepted reading age; an hour short of raw retention so a batch
+        # never lands in an hour file the retention pass has already compacted
+        self.max_backfill = raw_days * 24 * 3600 - 3600
+        self.batches = self.metrics.counter("data_batches_total", "Batch uploads, by outcome", labels=("result",))
         
         # Initialize files if they don't exist
         self._init_files()
+        self._load_current_state()
+        self._load_rollups()
+        self._load_recent_samples()
+        self.retention = RetentionManager(self, raw_days=raw_days, compacted_days=compacted_days)
         
-        # Start cleanup task
-        self._start_cleanup_task()
+        # Start background tasks
+        self._start_flush_task()
+        self.retention.start()
+        atexit.register(self.stop)
     
     def _init_files(self):
         """Initialize data files with default structure"""
@@ -44,20 +152,104 @@ class DataHandler:
         if not self.sensor_file.exists():
             self._write_json_file(self.sensor_file, default_sensor)
         
+        if not self.matrix_file.exists() and not self.legacy_matrix_file.exists():
+            self._write_state_file("matrix", default_matrix)
+    
+    def _load_current_state(self):
+        """Load persisted current state into memory"""
+        for key, filepath in self.state_files.items():
+            data = self._read_matrix_file() if key == "matrix" else self._read_json_file(filepath)
+            if data is not None:
+                if key == "matrix":
+                    data["version"] = self.matrix_store.update(data["matrix"], data.get("version", 0))
+                self._set_current(key, data)
+    
+    def _read_matrix_file(self):
+        """Load the packed matrix snapshot, or the JSON file written by older versions"""
         if not self.matrix_file.exists():
-            self._write_json_file(self.matrix_file, default_matrix)
+            return self._read_json_file(self.legacy_matrix_file)
+        with self.lock:
+            try:
+                cells, version, timestamp = unpack_matrix(self.matrix_file.read_bytes())
+            except Exception as e:
+                print(f"[DataHandler] ❌ Error reading {self.matrix_file}: {e}")
+                return None
+        return self._matrix_state(cells, version, timestamp)
+    
+    def _matrix_state(self, cells, version, timestamp):
+        return {
+            "matrix": to_list(cells),
+            "version": version,
+            "timestamp": timestamp,
+            "last_update": datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        }
+    
+    def _load_rollups(self):
+        """Load persisted rollups, or rebuild them from raw history"""
+        data = self._read_json_file(self.rollups_file)
+        if data is not None:
+            self.rollups.restore(data)
+            return
+        
+        for history_file in sorted(self.history_dir.glob("sensor_*.json")):
+            for entry in self.read_history_records(history_file):
+                self.rollups.add(entry["timestamp"], entry["sensor_value"], entry["state"])
+        print(f"[DataHandler] Rebuilt sensor rollups from history")
+    
+    def _load_recent_samples(self):
+        """Seed the in-memory sample buffer with the last buffer_hours of raw history"""
+        since = time.time() - self.buffer_hours * 3600
+        entries = list(self.iter_history("sensor", since))
+        for entry in reversed(entries):
+            self.recent.append(entry["timestamp"], entry["sensor_value"],
+                               entry.get("threshold", 500), entry.get("state", 0))
+        # Disk history is all there is for that window, so the buffer answers for it too
+        if self.recent.size < self.recent.capacity:
+            self.recent.covered_since = since
+    
+    def _set_current(self, key, data):
+        """Replace in-memory state and its cached response bytes"""
+        with self.state_lock:
+            self.current[key] = data
+            self.current_json[key] = self._build_response(key, data)
+    
+    def _build_response(self, key, data):
+        """Serialize state once per version; caller holds state_lock"""
+        version = self.versions.get(key, 0) + 1
+        self.versions[key] = version
+        etag = f'"{key}-{self.boot_id}-{version}"'
+        return (json.dumps(data).encode(), etag, data.get("timestamp", time.time()))
     
     def _write_json_file(self, filepath, data):
         """Thread-safe JSON file writing"""
         with self.lock:
             try:
-                with open(filepath, 'w') as f:
+                tmp_path = filepath.with_suffix(filepath.suffix + ".tmp")
+                with open(tmp_path, 'w') as f:
                     json.dump(data, f, indent=2)
+                os.replace(tmp_path, filepath)
                 return True
             except Exception as e:
+                self.write_errors.inc()
                 print(f"[DataHandler] ❌ Error writing {filepath}: {e}")
                 return False
     
+    def _write_state_file(self, key, data):
+        """Persist one current-state entry; the matrix is stored packed"""
+        if key != "matrix":
+            return self._write_json_file(self.state_files[key], data)
+        with self.lock:
+            try:
+                blob = pack_matrix(data["matrix"], data.get("version", 0), data["timestamp"])
+                tmp_path = self.matrix_file.with_suffix(".bin.tmp")
+                tmp_path.write_bytes(blob)
+                os.replace(tmp_path, self.matrix_file)
+                return True
+            except Exception as e:
+                self.write_errors.inc()
+                print(f"[DataHandler] ❌ Error writing {self.matrix_file}: {e}")
+                return False
+    
     def _read_json_file(self, filepath):
         """Thread-safe JSON file reading"""
         with self.lock:
@@ -82,100 +274,416 @@ class DataHandler:
             "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        # Save current data
-        success = self._write_json_file(self.sensor_file, data)
-        
-        # Save to history
-        if success:
-            self._save_to_history("sensor", data)
-            print(f"[DataHandler] ✅ Sensor data saved: {sensor_value} (state: {state})")
-        
-        return success
+        self._commit("sensor", data)
+        self.rollups.add(data["timestamp"], sensor_value, state)
+        self.recent.append(data["timestamp"], sensor_value, threshold, state)
+        print(f"[DataHandler] ✅ Sensor data saved: {sensor_value} (state: {state})")
+        return True
     
     def save_matrix_data(self, matrix):
         """Save matrix data from ESP32"""
+        try:
+            _check_matrix(matrix)
+            version = self.matrix_store.update(matrix)
+        except (ValueError, TypeError) as e:
+            print(f"[DataHandler] ❌ Invalid matrix: {e}")
+            return False
+        
         data = {
             "matrix": matrix,
+            "version": version,
             "timestamp": time.time(),
             "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        success = self._write_json_file(self.matrix_file, data)
+        self._commit("matrix", data)
+        print(f"[DataHandler] ✅ Matrix data saved")
+        return True
         
-        if success:
-            self._save_to_history("matrix", data)
-            print(f"[DataHandler] ✅ Matrix data saved")
+    def ingest_batch(self, data_type, readings, sent_at=None, time_unit="s"):
+        """
+        Validate and store many timestamped readings at once.
+        Every reading is checked before anything is stored, so one bad reading
+        rejects the whole batch (ValueError). When sent_at is given, reading
+        timestamps are on the device clock (e.g. millis()) and are shifted
+        onto server time. Returns the number of readings stored.
+        """
+        try:
+            entries = self._validate_batch(data_type, readings, sent_at, time_unit)
+        except ValueError:
+            self.batches.labels("rejected").inc()
+            raise
         
-        return success
+        # One critical section: readers and the flusher see all of the batch or none of it
+        with self.state_lock:
+            self.pending_history.extend((data_type, data) for data in entries)
+            newest = entries[-1]
+            current = self.current.get(data_type)
+            replaced = current is None or newest["timestamp"] >= current.get("timestamp", 0)
+            if replaced:
+                if data_type == "matrix":
+                    newest["version"] = self.matrix_store.update(newest["matrix"])
+                self.current[data_type] = newest
+                self.current_json[data_type] = response = self._build_response(data_type, newest)
+                self.dirty.add(data_type)
+                self.events.publish(data_type, response[0])
+        if replaced:
+            self._notify(data_type, newest)
     
-    def _save_to_history(self, data_type, data):
-        """Save historical data with timestamp"""
+        if data_type == "sensor":
+            timestamps = [d["timestamp"] for d in entries]
+            values = [d["sensor_value"] for d in entries]
+            states = [d["state"] for d in entries]
+            self.rollups.add_batch(timestamps, values, states)
+            self.recent.extend(timestamps, values, [d["threshold"] for d in entries], states)
+        
+        # Uploaders drop their buffer on success, so write through instead of waiting for the flusher
+        self.flush()
+        self.updates.labels(data_type).inc(len(entries))
+        self.batches.labels("accepted").inc()
+        print(f"[DataHandler] ✅ Batch of {len(entries)} {data_type} readings saved")
+        return len(entries)
+    
+    def _validate_batch(self, data_type, readings, sent_at, time_unit):
+        """Turn raw batch readings into history entries sorted by time"""
+        if data_type not in self.state_files:
+            raise ValueError(f"unknown data_type {data_type!r}")
+        if not isinstance(readings, list) or not readings:
+            raise ValueError("readings must be a non-empty list")
+        if len(readings) > self.max_batch_size:
+            raise ValueError(f"batch too large ({len(readings)} > {self.max_batch_size})")
+        scale = {"s": 1.0, "ms": 0.001}.get(time_unit)
+        if scale is None:
+            raise ValueError(f"time_unit must be 's' or 'ms', got {time_unit!r}")
+        
+        now = time.time()
+        offset = 0.0 if sent_at is None else now - _number(sent_at, "sent_at") * scale
+        entries = []
+        for i, reading in enumerate(readings):
+            try:
+                if not isinstance(reading, dict):
+                    raise ValueError("reading must be an object")
+                timestamp = _number(reading.get("timestamp"), "timestamp") * scale + offset
+                if timestamp > now + 60 or timestamp < now - self.max_backfill:
+                    raise ValueError("timestamp outside the accepted window")
+                if data_type == "sensor":
+                    entries.append(self._sensor_entry(reading, timestamp))
+                else:
+                    entries.append(self._matrix_entry(reading, timestamp))
+            except ValueError as e:
+                raise ValueError(f"reading {i}: {e}")
+        
+        entries.sort(key=lambda data: data["timestamp"])
+        return entries
+    
+    def _sensor_entry(self, reading, timestamp):
+        sensor_value = _number(reading.get("sensor_value"), "sensor_value")
+        threshold = _number(reading.get("threshold", 500), "threshold")
+        return {
+            "sensor_value": sensor_value,
+            "threshold": threshold,
+            "state": 1 if sensor_value > threshold else 0,
+            "timestamp": timestamp,
+            "last_update": datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        }
+    
+    def _matrix_entry(self, reading, timestamp):
+        matrix = reading.get("matrix")
+        _check_matrix(matrix)
+        return {
+            "matrix": matrix,
+            "timestamp": timestamp,
+            "last_update": datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        }
+    
+    def _commit(self, key, data):
+        """Update in-memory state, notify streams and queue it for the background flusher"""
+        with self.state_lock:
+            self.current[key] = data
+            self.current_json[key] = response = self._build_response(key, data)
+            self.dirty.add(key)
+            self.pending_history.append((key, data))
+            self.events.publish(key, response[0])
+        self.updates.labels(key).inc()
+        self._notify(key, data)
+    
+    def add_listener(self, callback):
+        """Call callback(key, data) whenever the current state changes"""
+        self.listeners.append(callback)
+    
+    def _notify(self, key, data):
+        for callback in self.listeners:
+            try:
+                callback(key, data)
+            except Exception as e:
+                print(f"[DataHandler] ❌ Listener error: {e}")
+    
+    def flush(self, force=False):
+        """Persist dirty current state and pending history entries to disk"""
+        # Serialized so an older snapshot can never land on disk after a newer one
+        with self.flush_lock, self.flush_time.time():
+            self._flush(force)
+    
+    def _flush(self, force):
+        with self.state_lock:
+            # Readers find these in memory until each file is replaced
+            flushing = self._group_history(self.pending_history)
+            dirty = {key: self.current[key] for key in self.dirty}
+            self.dirty.clear()
+            self.pending_history = []
+            self.flushing = flushing
+        
+        for key, data in dirty.items():
+            try:
+                written = self._write_state_file(key, data)
+            except Exception as e:
+                written = False
+                self.write_errors.inc()
+                print(f"[DataHandler] ❌ Error writing {key} state: {e}")
+            if not written:
+                with self.state_lock:
+                    self.dirty.add(key)   # Retry on next flush
+        
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H")
-            history_file = self.history_dir / f"{data_type}_{timestamp}.json"
-            
-            # Read existing history or create new
-            history_data = []
-            if history_file.exists():
-                with open(history_file, 'r') as f:
-                    history_data = json.load(f)
+            if flushing:
+                self._save_to_history(flushing)
+        finally:
+            # Whatever was not written goes back in front of newer entries for the next flush
+            with self.state_lock:
+                self._requeue_history(list(self.flushing))
+        
+        # Rollups are larger and only need to survive restarts, so persist them less often
+        now = time.time()
+        if self.rollups.dirty and (force or now - self.rollups_persisted_at >= self.rollups_persist_interval):
+            self.rollups_persisted_at = now
+            self._write_json_file(self.rollups_file, self.rollups.snapshot())
+    
+    def stop(self):
+        """Stop the flusher and write out anything still pending"""
+        self.stop_event.set()
+        self.flush(force=True)
+    
+    def _start_flush_task(self):
+        """Start background write-behind flusher"""
+        def flush_loop():
+            while not self.stop_event.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"[DataHandler] ❌ Flush error: {e}")
+        
+        flush_thread = threading.Thread(target=flush_loop, daemon=True)
+        flush_thread.start()
+    
+    def _history_file(self, data_type, timestamp):
+        hour = datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H")
+        return self.history_dir / f"{data_type}_{hour}.json"
+    
+    def _group_history(self, entries):
+        """{history_file: [(data_type, data)]} for (data_type, data) entries"""
+        grouped = {}
+        for data_type, data in entries:
+            grouped.setdefault(self._history_file(data_type, data["timestamp"]), []).append((data_type, data))
+        return grouped
             
-            # Add new entry
-            history_data.append(data)
+    def _save_to_history(self, grouped):
+        """Append grouped (data_type, data) entries to their hourly history files"""
+        for history_file, group in list(grouped.items()):
+            try:
+                new_entries = [self._history_record(data_type, data) for data_type, data in group]
+                new_entries.sort(key=lambda x: x.get('timestamp', 0))
+                with self.lock:
+                    tail = self.history_tails.get(history_file)
+                    if tail is not None and new_entries[0].get('timestamp', 0) >= tail and history_file.exists():
+                        # Usual case: newer than everything in the file, so append in place
+                        self._append_history(history_file, new_entries)
+                        newest = new_entries[-1].get('timestamp', 0)
+                    else:
+                        # First write this run, or a batch backfilling inside the hour: merge in time order
+                        history_data = self._load_history(history_file)
+                        history_data.extend(new_entries)
+                        history_data.sort(key=lambda x: x.get('timestamp', 0))
             
-            # Keep only last 100 entries per hour
-            if len(history_data) > 100:
-                history_data = history_data[-100:]
+                        # No per-hour cap: every acknowledged reading is kept, retention bounds the size
             
-            # Save history
-            with open(history_file, 'w') as f:
-                json.dump(history_data, f, indent=2)
+                        # Save history (replace atomically so a batch never leaves a half-written file)
+                        tmp_path = history_file.with_suffix(".json.tmp")
+                        with open(tmp_path, 'w') as f:
+                            json.dump(history_data, f, indent=2)
+                        os.replace(tmp_path, history_file)
+                        newest = history_data[-1].get('timestamp', 0)
+                    if len(self.history_tails) > 64:
+                        self.history_tails.clear()
+                    self.history_tails[history_file] = newest
+                    with self.state_lock:
+                        self.flushing.pop(history_file, None)
+                self.history_written.inc(len(new_entries))
                 
-        except Exception as e:
-            print(f"[DataHandler] ❌ Error saving history: {e}")
+            except Exception as e:
+                self.history_tails.pop(history_file, None)   # Next write re-reads and repairs the file
+                with self.state_lock:
+                    self._requeue_history([history_file])
+                self.write_errors.inc()
+                print(f"[DataHandler] ❌ Error saving history: {e}")
+    
+    def _append_history(self, history_file, new_entries):
+        """Write entries over the closing bracket of a history file; caller holds self.lock"""
+        with open(history_file, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            start = max(size - 64, 0)
+            f.seek(start)
+            end = f.read().rfind(b"]")
+            if end < 0:
+                raise ValueError(f"{history_file} has no closing bracket")
+            # Same layout json.dump(indent=2) gives entries inside the array
+            body = json.dumps(new_entries, indent=2)[2:-2]
+            f.seek(start + end)
+            f.write((",\n" + body + "\n]").encode())
+            f.truncate()
+    
+    def _load_history(self, history_file):
+        """Entries of one hourly file, [] if there is none; caller holds self.lock"""
+        if not history_file.exists():
+            return []
+        with open(history_file, 'r') as f:
+            return _parse_history(f.read(), history_file.name)
+    
+    def read_history_records(self, history_file):
+        """Raw records of one hourly history file"""
+        with self.lock:
+            try:
+                return self._load_history(history_file)
+            except Exception as e:
+                print(f"[DataHandler] ❌ Error reading {history_file}: {e}")
+                return []
+    
+    def _requeue_history(self, history_files):
+        """Move unwritten flushing entries back to the front of pending_history; caller holds state_lock"""
+        requeued = []
+        for history_file in history_files:
+            requeued.extend(self.flushing.pop(history_file, ()))
+        self.pending_history[:0] = requeued
+    
+    def _history_record(self, data_type, data):
+        """Matrix history entries keep the packed snapshot instead of nested lists"""
+        if data_type != "matrix":
+            return data
+        blob = pack_matrix(data["matrix"], data.get("version", 0), data["timestamp"])
+        record = {
+            "packed": base64.b64encode(blob).decode("ascii"),
+            "timestamp": data["timestamp"],
+            "last_update": data.get("last_update")
+        }
+        if "version" not in data:
+            # Batch readings other than the newest never became current; don't pass off 0 as their version
+            record["unversioned"] = True
+        return record
+    
+    def _history_entry(self, record):
+        """Inverse of _history_record; older plain entries pass through"""
+        if "packed" not in record:
+            return record
+        cells, version, timestamp = unpack_matrix(base64.b64decode(record["packed"]))
+        entry = self._matrix_state(cells, version, timestamp)
+        entry["last_update"] = record.get("last_update", entry["last_update"])
+        if record.get("unversioned"):
+            del entry["version"]
+        return entry
     
     def get_sensor_data(self):
         """Get current sensor data"""
-        return self._read_json_file(self.sensor_file)
+        return self.current.get("sensor")
     
     def get_matrix_data(self):
         """Get current matrix data"""
-        return self._read_json_file(self.matrix_file)
+        return self.current.get("matrix")
     
-    def get_sensor_history(self, hours=24):
-        """Get sensor history for specified hours"""
-        history = []
-        now = datetime.now()
+    def get_matrix_delta(self, version):
+        """Changed cells since a matrix version (or a full snapshot if it is unknown)"""
+        return self.matrix_store.delta_since(version)
         
-        for i in range(hours):
-            timestamp = (now - timedelta(hours=i)).strftime("%Y%m%d_%H")
-            history_file = self.history_dir / f"sensor_{timestamp}.json"
+    def get_matrix_packed(self):
+        """Current matrix as a packed snapshot"""
+        data = self.current.get("matrix")
+        if data is None:
+            return None
+        return pack_matrix(data["matrix"], data.get("version", 0), data["timestamp"])
             
-            if history_file.exists():
-                data = self._read_json_file(history_file)
-                if data:
-                    history.extend(data)
+    def get_current_response(self, key):
+        """Get cached (body, etag, last_modified) of the current state (lock-free)"""
+        return self.current_json.get(key)
         
-        return sorted(history, key=lambda x: x.get('timestamp', 0), reverse=True)
+    def get_sensor_history(self, hours=24, resolution=None, max_points=300):
+        """Get sensor history for specified hours, raw or from the cheapest rollup level"""
+        return list(self.query_history("sensor", time.time() - hours * 3600,
+                                       resolution=resolution, max_points=max_points))
     
-    def _start_cleanup_task(self):
-        """Start background task to clean old files"""
-        def cleanup_old_files():
-            while True:
-                try:
-                    # Clean files older than 7 days
-                    cutoff = datetime.now() - timedelta(days=7)
-                    
-                    for file in self.history_dir.glob("*.json"):
-                        if file.stat().st_mtime < cutoff.timestamp():
-                            file.unlink()
-                            print(f"[DataHandler] 🗑️ Cleaned old file: {file.name}")
-                
-                except Exception as e:
-                    print(f"[DataHandler] ❌ Cleanup error: {e}")
-                
-                # Sleep for 1 hour
-                time.sleep(3600)
+    def query_history(self, data_type, since, until=None, before=None, resolution=None, max_points=300):
+        """Iterate history newest first, from sensor rollups when a resolution is requested"""
+        until = time.time() if until is None else until
+        width = None
+        if data_type == "sensor":
+            width = pick_resolution((until - since) / 3600, resolution, max_points)
+        
+        if width is None:
+            if data_type == "sensor" and self.recent.covers(since):
+                return self.recent.entries(since, until, before)
+            return self.iter_history(data_type, since, until, before)
+        
+        entries = self.rollups.query(width, since, until)
+        return iter([e for e in entries if before is None or e["timestamp"] < before])
+    
+    def get_sensor_stats(self, since, until=None, percentiles=(50, 90, 99)):
+        """Aggregate raw sensor samples in [since, until], from memory when possible"""
+        if self.recent.covers(since):
+            return self.recent.stats(since, until, percentiles)
+        
+        entries = list(self.iter_history("sensor", since, until))[::-1]
+        timestamps = np.array([e["timestamp"] for e in entries], dtype=np.float64)
+        values = np.array([e["sensor_value"] for e in entries], dtype=np.float64)
+        thresholds = np.array([e.get("threshold", 500) for e in entries], dtype=np.float64)
+        return summarize(timestamps, values, thresholds, percentiles)
+    
+    def iter_history(self, data_type, since, until=None, before=None):
+        """
+        Yield raw history entries newest first, one hourly file at a time.
+        since/until are inclusive bounds, before is an exclusive upper bound
+        used as a pagination cursor. Entries not flushed yet are merged in
+        from memory, so reads never write to disk.
+        """
+        until = time.time() if until is None else until
+        if before is not None:
+            until = min(until, before)
         
-        cleanup_thread = threading.Thread(target=cleanup_old_files, daemon=True)
-        cleanup_thread.start()
+        hour = datetime.fromtimestamp(until).replace(minute=0, second=0, microsecond=0)
+        first_hour = datetime.fromtimestamp(max(since, 0)).replace(minute=0, second=0, microsecond=0)
+        
+        while hour >= first_hour:
+            history_file = self.history_dir / f"{data_type}_{hour.strftime('%Y%m%d_%H')}.json"
+            hour -= timedelta(hours=1)
+            entries = self._read_history_file(data_type, history_file)
+            if not entries:
+                continue
+            entries.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
+            for entry in entries:
+                timestamp = entry.get('timestamp', 0)
+                if timestamp > until or (before is not None and timestamp >= before):
+                    continue
+                if timestamp < since:
+                    return
+                yield self._history_entry(entry)
+    
+    def _read_history_file(self, data_type, history_file):
+        """Records of one hourly file plus the entries still on their way to it"""
+        with self.lock:
+            records = []
+            try:
+                records = self._load_history(history_file)
+            except Exception as e:
+                print(f"[DataHandler] ❌ Error reading {history_file}: {e}")
+            # Under the disk lock a flushed entry is either in the file or in memory, never both
+            with self.state_lock:
+                unflushed = [data for key, data in self.pending_history
+                             if key == data_type and self._history_file(key, data["timestamp"]) == history_file]
+                unflushed += [data for _, data in self.flushing.get(history_file, ())]
+        return records + [self._history_record(data_type, data) for data in unflushed]
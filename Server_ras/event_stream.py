@@ -0,0 +1,48 @@
+import time
+import threading
+from collections import deque
+
+class EventBroker:
+    """Fan-out of data updates to Server-Sent Events subscribers"""
+
+    def __init__(self, backlog=256):
+        self.events = deque(maxlen=backlog)   # (id, topic, payload bytes)
+        self.last_id = 0
+        self.boot_id = format(int(time.time()), "x")
+        self.condition = threading.Condition()
+
+    def publish(self, topic, payload):
+        """Record an update and wake every waiting stream"""
+        with self.condition:
+            self.last_id += 1
+            self.events.append((self.last_id, topic, payload))
+            self.condition.notify_all()
+
+    def format_id(self, event_id):
+        return f"{self.boot_id}-{event_id}"
+
+    def parse_id(self, last_event_id):
+        """
+        Map a Last-Event-ID header back to a local event id.
+        Returns None when the id is missing or from a previous server run.
+        """
+        if not last_event_id:
+            return None
+        boot_id, _, event_id = last_event_id.partition("-")
+        if boot_id != self.boot_id or not event_id.isdigit():
+            return None
+        event_id = int(event_id)
+        return event_id if event_id <= self.last_id else None
+
+    def wait_for_events(self, after_id, topics, timeout):
+        """
+        Block until there are events newer than after_id (or timeout).
+        Returns (events, newest_id, gap); gap is True when some events
+        after after_id already fell out of the backlog.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.last_id > after_id, timeout)
+            oldest_id = self.events[0][0] if self.events else self.last_id + 1
+            gap = oldest_id > after_id + 1
+            events = [event for event in self.events if event[0] > after_id and event[1] in topics]
+            return events, self.last_id, gap
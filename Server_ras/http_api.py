@@ -1,16 +1,136 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import json
+import math
 import threading
 import time
+import zlib
 from urllib.parse import urlparse, parse_qs
+from email.utils import formatdate, parsedate_to_datetime
 import os
+from metrics import MetricsRegistry
+
+# Paths reported individually in request metrics; anything else is counted as "other"
+ROUTES = ('/api/sensor', '/api/matrix', '/api/matrix/packed', '/api/sensor/history', '/api/matrix/history',
+          '/api/sensor/stats', '/api/status', '/api/stream', '/api/ingest/batch', '/metrics')
+
+class APIHTTPServer(ThreadingHTTPServer):
+    """Thread-per-connection HTTP server with a cap on concurrent requests"""
+    daemon_threads = True
+    
+    def __init__(self, server_address, handler_class, max_concurrent=16, max_streams=32, metrics=None):
+        self.request_slots = threading.BoundedSemaphore(max_concurrent)
+        self.stream_slots = threading.BoundedSemaphore(max_streams)   # Long-lived SSE connections
+        self.stats_lock = threading.Lock()
+        self.conditional_hits = 0      # 304 answers
+        self.conditional_misses = 0    # Full bodies sent on conditional endpoints
+        
+        self.metrics = metrics or MetricsRegistry()
+        self.requests = self.metrics.counter("http_requests_total", "HTTP requests by route and status", labels=("path", "code"))
+        self.request_time = self.metrics.histogram("http_request_seconds", "HTTP request latency by route", labels=("path",))
+        self.busy_rejections = self.metrics.counter("http_busy_rejections_total", "Requests answered 503 for lack of a request slot")
+        self.conditional = self.metrics.counter("http_conditional_total", "Conditional GET outcomes", labels=("result",))
+        self.open_streams = self.metrics.gauge("http_open_streams", "Open Server-Sent Events streams")
+        super().__init__(server_address, handler_class)
+    
+    def count_conditional(self, hit):
+        """Track 304 hits vs full responses"""
+        with self.stats_lock:
+            if hit:
+                self.conditional_hits += 1
+            else:
+                self.conditional_misses += 1
+        self.conditional.labels("not_modified" if hit else "full").inc()
+    
+    def observe_request(self, path, code, seconds):
+        """Record one finished request"""
+        route = path if path in ROUTES else "other"
+        self.requests.labels(route, code).inc()
+        self.request_time.labels(route).observe(seconds)
+
+class ChunkedResponseWriter:
+    """Buffers, optionally gzips, and writes a response body as HTTP chunks"""
+    
+    def __init__(self, wfile, compress=False, chunked=True, chunk_size=16384):
+        self.wfile = wfile
+        self.chunked = chunked
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.buffered = 0
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None   # wbits=31 -> gzip
+    
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.chunk_size:
+            self._flush_buffer()
+    
+    def close(self):
+        self._flush_buffer(final=True)
+        if self.chunked:
+            self.wfile.write(b"0\r\n\r\n")
+    
+    def _flush_buffer(self, final=False):
+        data = b"".join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        if self.compressor:
+            data = self.compressor.compress(data)
+            if final:
+                data += self.compressor.flush()
+        if not data:
+            return
+        if self.chunked:
+            self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+        else:
+            self.wfile.write(data)
 
 class DataAPIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between polls; every response sets Content-Length
+    protocol_version = "HTTP/1.1"
+    timeout = 30              # Close idle keep-alive connections
+    slot_timeout = 5          # Max wait for a free request slot before answering 503
+    stream_heartbeat = 15     # Seconds between SSE keep-alive comments
+    max_page_size = 10000     # Upper bound for ?limit= on history queries
+    max_body_bytes = 4 * 1024 * 1024   # Largest accepted POST body
+    disable_nagle_algorithm = True   # Headers and body go out as separate writes on a kept-alive socket
+    
     def __init__(self, data_handler, *args, **kwargs):
         self.data_handler = data_handler
         super().__init__(*args, **kwargs)
     
     def do_GET(self):
+        """Handle GET requests within the concurrent request limit"""
+        path = urlparse(self.path).path
+        if path == '/api/stream':
+            # Streams stay open indefinitely, so they have their own limit
+            self._handle_stream()
+            return
+        
+        self._run_limited(path, self._handle_get)
+    
+    def do_POST(self):
+        """Handle POST requests within the concurrent request limit"""
+        self._run_limited(urlparse(self.path).path, self._handle_post)
+    
+    def _run_limited(self, path, handler):
+        """Run a request handler once a request slot is free"""
+        started = time.perf_counter()
+        if not self.server.request_slots.acquire(timeout=self.slot_timeout):
+            self.server.busy_rejections.inc()
+            self.close_connection = True   # Any request body is left unread
+            self._send_error_response(503, "Server busy")
+        else:
+            try:
+                handler()
+            finally:
+                self.server.request_slots.release()
+        self.server.observe_request(path, getattr(self, 'status_code', 0), time.perf_counter() - started)
+    
+    def send_response(self, code, message=None):
+        self.status_code = code   # Kept for request metrics
+        super().send_response(code, message)
+    
+    def _handle_get(self):
         """Handle GET requests for data"""
         print(f"[HTTP API] GET request: {self.path}")
         parsed_path = urlparse(self.path)
@@ -20,20 +140,38 @@ class DataAPIHandler(BaseHTTPRequestHandler):
         try:
             if path == '/api/sensor':
                 print("[HTTP API] Handling /api/sensor request")
-                data = self.data_handler.get_sensor_data()
-                print(f"[HTTP API] Sensor data retrieved: {data}")
-                self._send_json_response(data)
+                self._send_cached_state("sensor")
+            
+            elif path == '/api/matrix' and 'since_version' in query_params:
+                delta = self.data_handler.get_matrix_delta(int(query_params['since_version'][0]))
+                self._send_json_response(delta)
             
             elif path == '/api/matrix':
                 print("[HTTP API] Handling /api/matrix request")
-                data = self.data_handler.get_matrix_data()
-                print(f"[HTTP API] Matrix data retrieved: {data}")
-                self._send_json_response(data)
+                self._send_cached_state("matrix")
             
-            elif path == '/api/sensor/history':
-                hours = int(query_params.get('hours', [24])[0])
-                data = self.data_handler.get_sensor_history(hours)
-                self._send_json_response(data)
+            elif path == '/api/matrix/packed':
+                blob = self.data_handler.get_matrix_packed()
+                if blob is None:
+                    self._send_error_response(404, "Data not found")
+                else:
+                    self.send_response(200)
+                    self.send_header('Content-type', 'application/octet-stream')
+                    self.send_header('Content-Length', str(len(blob)))
+                    self._send_cors_headers()
+                    self.end_headers()
+                    self.wfile.write(blob)
+            
+            elif path in ('/api/sensor/history', '/api/matrix/history'):
+                self._handle_history(path.split('/')[2], query_params)
+            
+            elif path == '/api/sensor/stats':
+                hours = float(query_params.get('hours', [1])[0])
+                since = float(query_params.get('since', [time.time() - hours * 3600])[0])
+                until = query_params.get('until', [None])[0]
+                percentiles = [float(p) for p in query_params.get('percentiles', ['50,90,99'])[0].split(',')]
+                stats = self.data_handler.get_sensor_stats(since, float(until) if until else None, percentiles)
+                self._send_json_response(stats)
             
             elif path == '/api/status':
                 status = {
@@ -42,25 +180,262 @@ class DataAPIHandler(BaseHTTPRequestHandler):
                     "files_exist": {
                         "sensor": self.data_handler.sensor_file.exists(),
                         "matrix": self.data_handler.matrix_file.exists()
-                    }
+                    },
+                    "conditional_get": {
+                        "hits": self.server.conditional_hits,
+                        "misses": self.server.conditional_misses
+                    },
+                    "retention": self.data_handler.retention.status()
                 }
                 self._send_json_response(status)
             
+            elif path == '/metrics':
+                self._send_metrics()
+            
             else:
                 self._send_error_response(404, "Endpoint not found")
         
+        except ValueError as e:
+            print(f"[HTTP API] Bad request parameters: {e}")
+            self._send_error_response(400, f"Bad request: {str(e)}")
         except Exception as e:
             print(f"[HTTP API] Error handling request: {e}")
             self._send_error_response(500, f"Server error: {str(e)}")
     
+    def _handle_post(self):
+        """Handle POST requests for data ingestion"""
+        print(f"[HTTP API] POST request: {self.path}")
+        path = urlparse(self.path).path
+        
+        try:
+            if path == '/api/ingest/batch':
+                payload = self._read_json_body()
+                if payload is None:
+                    return
+                accepted = self.data_handler.ingest_batch(
+                    payload.get('data_type'),
+                    payload.get('readings'),
+                    payload.get('sent_at'),
+                    payload.get('time_unit', 's')
+                )
+                self._send_json_response({"accepted": accepted, "batch_id": payload.get('batch_id')})
+            
+            else:
+                self.close_connection = True
+                self._send_error_response(404, "Endpoint not found")
+        
+        except ValueError as e:
+            print(f"[HTTP API] Rejected batch: {e}")
+            self._send_error_response(400, f"Bad request: {str(e)}")
+        except Exception as e:
+            print(f"[HTTP API] Error handling request: {e}")
+            self._send_error_response(500, f"Server error: {str(e)}")
+    
+    def _read_json_body(self):
+        """Read and decode a JSON object body; sends the error response and returns None on failure"""
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self.close_connection = True
+            self._send_error_response(411, "Content-Length required")
+            return None
+        # Every path that leaves the body unread closes, or it would be parsed as the next request
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self._send_error_response(400, "Invalid Content-Length")
+            return None
+        if length > self.max_body_bytes:
+            self.close_connection = True
+            self._send_error_response(413, f"Body larger than {self.max_body_bytes} bytes")
+            return None
+        
+        payload = json.loads(self.rfile.read(length))
+        if not isinstance(payload, dict):
+            raise ValueError("body must be a JSON object")
+        return payload
+    
+    def _handle_history(self, data_type, query_params):
+        """Stream history newest first with since/until/limit/cursor pagination"""
+        param = lambda name, default=None: query_params.get(name, [default])[0]
+        now = time.time()
+        hours = float(param('hours', 24))
+        since = float(param('since', now - hours * 3600))
+        until = float(param('until', now))
+        cursor = param('cursor')
+        before, at, skip = self._parse_cursor(cursor) if cursor else (None, None, 0)
+        limit = param('limit')
+        limit = max(1, min(int(limit), self.max_page_size)) if limit else None
+        
+        if param('tier') == 'compacted':
+            # 10-minute buckets of data older than the raw retention window
+            entries = (e for e in self.data_handler.retention.iter_compacted(data_type, since, until)
+                       if before is None or e['timestamp'] < before)
+        else:
+            entries = self.data_handler.query_history(
+                data_type, since, until, before,
+                resolution=param('resolution'),
+                max_points=int(param('points', 300))
+            )
+        
+        if skip:
+            entries = self._skip_emitted(entries, at, skip)
+        
+        # Paginated requests get an envelope with the next cursor; plain ones keep the bare list
+        paginate = limit is not None or cursor is not None
+        self._send_json_stream(entries, limit, paginate, (at, skip))
+    
+    def _parse_cursor(self, cursor):
+        """
+        "timestamp:emitted" -> (before, at, skip): resume at timestamp inclusive,
+        skipping the entries already emitted there. A bare timestamp is an
+        exclusive bound, as issued before compound cursors.
+        """
+        if ':' not in cursor:
+            return float(cursor), None, 0
+        at, skip = cursor.rsplit(':', 1)
+        at, skip = float(at), int(skip)
+        if skip < 0:
+            raise ValueError("cursor skip must not be negative")
+        return math.nextafter(at, math.inf), at, skip
+    
+    def _skip_emitted(self, entries, at, skip):
+        """Drop the first skip entries stamped at (newest first, so they lead the stream)"""
+        for entry in entries:
+            if skip and entry.get('timestamp') == at:
+                skip -= 1
+                continue
+            yield entry
+    
+    def _send_json_stream(self, entries, limit=None, paginate=False, resumed=(None, 0)):
+        """Serialize entries incrementally into a chunked (gzipped if accepted) JSON body"""
+        compress = 'gzip' in self.headers.get('Accept-Encoding', '')
+        chunked = self.protocol_version >= "HTTP/1.1" and self.request_version >= "HTTP/1.1"
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True   # No length known up front, so the body ends at EOF
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self._send_cors_headers()
+        self.end_headers()
+        
+        writer = ChunkedResponseWriter(self.wfile, compress, chunked)
+        writer.write(b'{"items": [' if paginate else b'[')
+        count = 0
+        last_timestamp = None
+        run = 0                  # Entries emitted at last_timestamp
+        has_more = False
+        try:
+            for entry in entries:
+                if limit is not None and count >= limit:
+                    has_more = True
+                    break
+                writer.write((b', ' if count else b'') + json.dumps(entry).encode())
+                timestamp = entry.get('timestamp')
+                run = run + 1 if count and timestamp == last_timestamp else 1
+                last_timestamp = timestamp
+                count += 1
+        except Exception as e:
+            # Headers are already out; drop the connection so the client sees a truncated body
+            print(f"[HTTP API] Error while streaming history: {e}")
+            self.close_connection = True
+            return
+        
+        if paginate:
+            # Timestamps can repeat, so the cursor also counts the entries already sent at the last one
+            next_cursor = None
+            if has_more:
+                if run == count and resumed[0] == last_timestamp:
+                    run += resumed[1]
+                next_cursor = f"{last_timestamp!r}:{run}"
+            writer.write(b'], "count": %d, "next_cursor": %s}' % (count, json.dumps(next_cursor).encode()))
+        else:
+            writer.write(b']')
+        writer.close()
+        print(f"[HTTP API] Streamed {count} history entries{' (gzip)' if compress else ''}")
+    
+    def _handle_stream(self):
+        """Push sensor/matrix updates as Server-Sent Events"""
+        query_params = parse_qs(urlparse(self.path).query)
+        topics = set(query_params.get('topics', ['sensor,matrix'])[0].split(','))
+        last_event_id = self.headers.get('Last-Event-ID') or query_params.get('last_event_id', [None])[0]
+        
+        if not self.server.stream_slots.acquire(blocking=False):
+            self._send_error_response(503, "Too many event streams")
+            return
+        
+        broker = self.data_handler.events
+        print(f"[HTTP API] Event stream opened: topics={sorted(topics)}, last_event_id={last_event_id}")
+        self.server.open_streams.inc()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self._send_cors_headers()
+            self.end_headers()
+            self.close_connection = True
+            self.wfile.write(b"retry: 3000\n\n")
+            
+            last_id = broker.parse_id(last_event_id)
+            if last_id is None:
+                # New client or unknown id: start from a snapshot of the current state
+                last_id = broker.last_id
+                self._send_snapshot(topics, last_id)
+            
+            while True:
+                events, newest_id, gap = broker.wait_for_events(last_id, topics, self.stream_heartbeat)
+                if gap:
+                    # Missed events fell out of the backlog; the snapshot supersedes them
+                    self._send_snapshot(topics, newest_id)
+                else:
+                    for event_id, topic, payload in events:
+                        self._send_event(event_id, topic, payload)
+                if newest_id == last_id:
+                    self.wfile.write(b": keep-alive\n\n")
+                last_id = newest_id
+                self.wfile.flush()
+        
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            self.server.stream_slots.release()
+            self.server.open_streams.dec()
+            print("[HTTP API] Event stream closed")
+    
+    def _send_snapshot(self, topics, event_id):
+        """Send the current state of each topic as one event"""
+        for topic in sorted(topics):
+            cached = self.data_handler.get_current_response(topic)
+            if cached is not None:
+                self._send_event(event_id, topic, cached[0])
+        self.wfile.flush()
+    
+    def _send_event(self, event_id, topic, payload):
+        event_id = self.data_handler.events.format_id(event_id)
+        self.wfile.write(f"id: {event_id}\nevent: {topic}\ndata: ".encode() + payload + b"\n\n")
+    
     def do_OPTIONS(self):
         """Handle CORS preflight requests"""
         print("[HTTP API] CORS preflight request")
         self.send_response(200)
+        self._send_cors_headers()
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def _send_cors_headers(self):
+        """Add CORS headers to the current response"""
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match, If-Modified-Since')
+        self.send_header('Access-Control-Expose-Headers', 'ETag, Last-Modified')
     
     def _send_json_response(self, data):
         """Send JSON response"""
@@ -69,34 +444,93 @@ class DataAPIHandler(BaseHTTPRequestHandler):
             self._send_error_response(404, "Data not found")
             return
         
-        print(f"[HTTP API] Sending JSON response: {data}")
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')  # Add CORS header
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-        
         try:
-            json_str = json.dumps(data)
-            self.wfile.write(json_str.encode())
-            print(f"[HTTP API] Successfully sent response")
+            body = json.dumps(data).encode()
         except Exception as e:
             print(f"[HTTP API] Error encoding JSON: {e}")
             self._send_error_response(500, f"JSON encoding error: {str(e)}")
+            return
+        
+        self._send_json_bytes(body)
+        print(f"[HTTP API] Successfully sent response")
     
-    def _send_error_response(self, code, message):
-        """Send error response"""
-        print(f"[HTTP API] Sending error response: {code} - {message}")
+    def _send_cached_state(self, key):
+        """Send current state, or 304 if the client already has this version"""
+        cached = self.data_handler.get_current_response(key)
+        if cached is None:
+            self._send_error_response(404, "Data not found")
+            return
+        
+        body, etag, modified = cached
+        last_modified = formatdate(modified, usegmt=True)
+        validators = {
+            'ETag': etag,
+            'Last-Modified': last_modified,
+            'Cache-Control': 'no-cache'
+        }
+        
+        if self._is_not_modified(etag, modified):
+            self.server.count_conditional(hit=True)
+            self.send_response(304)
+            for name, value in validators.items():
+                self.send_header(name, value)
+            self._send_cors_headers()
+            self.end_headers()
+            return
+        
+        self.server.count_conditional(hit=False)
+        self._send_json_bytes(body, headers=validators)
+    
+    def _is_not_modified(self, etag, modified):
+        """Evaluate If-None-Match / If-Modified-Since against the current version"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            # If-None-Match takes precedence; compare weakly
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags
+        
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(modified) <= since
+        
+        return False
+    
+    def _send_metrics(self):
+        """Send the metrics registry in Prometheus text format"""
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self._send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_json_bytes(self, body, code=200, headers=None):
+        """Send an already serialized JSON body"""
+        if body is None:
+            print("[HTTP API] Data is None, sending 404")
+            self._send_error_response(404, "Data not found")
+            return
+        
         self.send_response(code)
         self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')  # Add CORS header
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self._send_cors_headers()
         self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_error_response(self, code, message):
+        """Send error response"""
+        print(f"[HTTP API] Sending error response: {code} - {message}")
         error_data = {"error": message, "code": code}
         try:
-            self.wfile.write(json.dumps(error_data).encode())
+            self._send_json_bytes(json.dumps(error_data).encode(), code)
         except Exception as e:
             print(f"[HTTP API] Error sending error response: {e}")
 
@@ -105,10 +539,12 @@ class DataAPIHandler(BaseHTTPRequestHandler):
         return  # Comment this out if you want to see all HTTP logs
 
 class HTTPAPIServer:
-    def __init__(self, data_handler, host='0.0.0.0', port=8080):
+    def __init__(self, data_handler, host='0.0.0.0', port=8080, max_concurrent=16, metrics=None):
         self.data_handler = data_handler
+        self.metrics = metrics or data_handler.metrics
         self.host = host
         self.port = port
+        self.max_concurrent = max_concurrent
         self.server = None
         self.server_thread = None
     
@@ -117,13 +553,20 @@ class HTTPAPIServer:
         def run_server():
             try:
                 handler = lambda *args, **kwargs: DataAPIHandler(self.data_handler, *args, **kwargs)
-                self.server = HTTPServer((self.host, self.port), handler)
-                print(f"[HTTP API] ✅ Server started on http://{self.host}:{self.port}")
+                self.server = APIHTTPServer((self.host, self.port), handler, self.max_concurrent, metrics=self.metrics)
+                print(f"[HTTP API] ✅ Server started on http://{self.host}:{self.port} (max {self.max_concurrent} concurrent requests)")
                 print(f"[HTTP API] Available endpoints:")
                 print(f"  - GET /api/sensor - Current sensor data")
-                print(f"  - GET /api/matrix - Current matrix data") 
-                print(f"  - GET /api/sensor/history?hours=24 - Sensor history")
+                print(f"  - GET /api/matrix - Current matrix data (?since_version=N for changed cells only)")
+                print(f"  - GET /api/matrix/packed - Current matrix as a packed binary snapshot")
+                print(f"  - GET /api/sensor/history?hours=24&resolution=auto - Sensor history (raw|auto|1m|10m|1h)")
+                print(f"  - GET /api/matrix/history?hours=24 - Matrix history")
+                print(f"  - GET /api/sensor/stats?hours=1&percentiles=50,90,99 - Sensor aggregates")
+                print(f"    (history also takes since, until, limit and cursor for paging, tier=compacted for old data)")
+                print(f"  - GET /api/stream?topics=sensor,matrix - Server-Sent Events push stream")
+                print(f"  - POST /api/ingest/batch - Batch upload of buffered readings")
                 print(f"  - GET /api/status - Server status")
+                print(f"  - GET /metrics - Prometheus metrics")
                 self.server.serve_forever()
             except Exception as e:
                 print(f"[HTTP API] ❌ Server failed to start: {e}")
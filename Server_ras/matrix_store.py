@@ -0,0 +1,111 @@
+import struct
+import threading
+from collections import deque
+
+import numpy as np
+
+# Packed snapshot header: magic, format version, cell encoding, rows, cols, data version, timestamp
+HEADER = struct.Struct(">2sBBHHId")
+MAGIC = b"MX"
+FORMAT_VERSION = 1
+
+# Cell encodings, tried in order: 1 bit per cell for 0/1 grids, then bytes, ints, floats
+ENCODING_BITS = 0
+ENCODING_UINT8 = 1
+ENCODING_INT32 = 2
+ENCODING_FLOAT64 = 3
+DTYPES = {
+    ENCODING_UINT8: np.dtype(">u1"),
+    ENCODING_INT32: np.dtype(">i4"),
+    ENCODING_FLOAT64: np.dtype(">f8")
+}
+
+def _to_array(matrix):
+    cells = np.asarray(matrix)
+    if cells.ndim != 2:
+        raise ValueError("matrix must be a rectangular list of rows")
+    return cells
+
+def _encoding_for(cells):
+    if cells.size and not np.issubdtype(cells.dtype, np.integer):
+        if not np.all(np.mod(cells, 1) == 0):
+            return ENCODING_FLOAT64
+    low, high = (cells.min(), cells.max()) if cells.size else (0, 0)
+    if low >= 0 and high <= 1:
+        return ENCODING_BITS
+    if low >= 0 and high <= 255:
+        return ENCODING_UINT8
+    if low >= -2**31 and high < 2**31:
+        return ENCODING_INT32
+    return ENCODING_FLOAT64
+
+def pack_matrix(matrix, version=0, timestamp=0.0):
+    """Encode a matrix as a shape/version header followed by bit- or byte-packed cells"""
+    cells = _to_array(matrix)
+    encoding = _encoding_for(cells)
+    rows, cols = cells.shape
+    if encoding == ENCODING_BITS:
+        payload = np.packbits(cells.astype(np.uint8).ravel()).tobytes()
+    else:
+        payload = cells.astype(DTYPES[encoding]).tobytes()
+    return HEADER.pack(MAGIC, FORMAT_VERSION, encoding, rows, cols, version, timestamp) + payload
+
+def unpack_matrix(blob):
+    """Decode a packed snapshot; returns (cells array, version, timestamp)"""
+    magic, fmt, encoding, rows, cols, version, timestamp = HEADER.unpack_from(blob)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise ValueError("not a packed matrix snapshot")
+    payload = memoryview(blob)[HEADER.size:]
+    if encoding == ENCODING_BITS:
+        cells = np.unpackbits(np.frombuffer(payload, dtype=np.uint8), count=rows * cols).astype(np.int64)
+    else:
+        cells = np.frombuffer(payload, dtype=DTYPES[encoding], count=rows * cols)
+    return cells.reshape(rows, cols), version, timestamp
+
+def to_list(cells):
+    """Plain nested lists (ints when the cells are whole numbers) for JSON consumers"""
+    if np.issubdtype(cells.dtype, np.floating) and np.all(np.mod(cells, 1) == 0):
+        cells = cells.astype(np.int64)
+    return cells.tolist()
+
+class MatrixStore:
+    """Current matrix with a version counter and recent snapshots for computing deltas"""
+
+    def __init__(self, keep_versions=64):
+        self.version = 0
+        self.cells = None
+        self.snapshots = deque(maxlen=keep_versions)   # (version, cells)
+        self.lock = threading.Lock()
+
+    def update(self, matrix, version=None):
+        """Record a new matrix; returns its version"""
+        cells = _to_array(matrix)
+        with self.lock:
+            self.version = self.version + 1 if version is None else version
+            self.cells = cells
+            self.snapshots.append((self.version, cells))
+            return self.version
+
+    def delta_since(self, version):
+        """
+        Changes needed to go from `version` to the current matrix.
+        Returns a message dict: a 'matrix_delta' with [row, col, value]
+        changes, or a full 'matrix' snapshot when the base version is
+        unknown, too old or of a different shape.
+        """
+        with self.lock:
+            current, cells = self.version, self.cells
+            base = next((c for v, c in self.snapshots if v == version), None)
+
+        if cells is None:
+            return None
+        if base is None or base.shape != cells.shape:
+            return {"type": "matrix", "version": current, "matrix": to_list(cells)}
+
+        changed = np.argwhere(base != cells)
+        return {
+            "type": "matrix_delta",
+            "base_version": version,
+            "version": current,
+            "changes": [[int(r), int(c), cells[r, c].item()] for r, c in changed]
+        }
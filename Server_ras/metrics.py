@@ -0,0 +1,217 @@
+import time
+import bisect
+import threading
+
+# Latency buckets in seconds, from sub-millisecond packet handling up to slow disk flushes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class CounterValue:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class GaugeValue:
+    def __init__(self, function=None):
+        self.value = 0
+        self.function = function      # Sampled at scrape time instead of being pushed
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return float("nan")
+        return self.value
+
+class HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # Last slot is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the elapsed wall time of its block"""
+        return _Timer(self)
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class Metric:
+    """A named metric family; unlabeled metrics forward to their single child"""
+    kind = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            self.children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Get (or create) the child for one combination of label values"""
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self):
+        """Yield (suffix, label text, value) for the text exposition"""
+        for key, child in list(self.children.items()):
+            yield from self._child_samples(key, child)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+    def _child_samples(self, key, child):
+        yield "", _format_labels(self.label_names, key), child.value
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, label_names=(), function=None):
+        self.function = function
+        super().__init__(name, help_text, label_names)
+
+    def _new_child(self):
+        return GaugeValue(self.function)
+
+    def set(self, value):
+        self.children[()].set(value)
+
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+    def dec(self, amount=1):
+        self.children[()].dec(amount)
+
+    def _child_samples(self, key, child):
+        yield "", _format_labels(self.label_names, key), child.get()
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, label_names)
+
+    def _new_child(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def time(self):
+        return self.children[()].time()
+
+    def _child_samples(self, key, child):
+        with child.lock:
+            counts = list(child.counts)
+            total = child.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            yield "_bucket", _format_labels(self.label_names, key, ("le", _format_value(float(bound)))), cumulative
+        yield "_sum", _format_labels(self.label_names, key), total
+        yield "_count", _format_labels(self.label_names, key), cumulative
+
+class MetricsRegistry:
+    """Counters, gauges and histograms shared by all server components"""
+
+    def __init__(self, prefix="robotarm_"):
+        self.prefix = prefix
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, **kwargs):
+        # Registering the same name twice returns the existing metric, so components can share it
+        name = self.prefix + name
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, name, help_text, label_names=labels)
+
+    def gauge(self, name, help_text, labels=(), function=None):
+        return self._register(Gauge, name, help_text, label_names=labels, function=function)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, label_names=labels, buckets=buckets)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,266 @@
+import json
+import gzip
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+from rollups import RESOLUTIONS
+
+COMPACT_WIDTH = RESOLUTIONS["10m"]
+
+class IOBudget:
+    """Caps the files touched and bytes read by one retention pass"""
+
+    def __init__(self, max_files, max_bytes):
+        self.files_left = max_files
+        self.bytes_left = max_bytes
+
+    def available(self):
+        return self.files_left > 0 and self.bytes_left > 0
+
+    def spend(self, files=1, size=0):
+        self.files_left -= files
+        self.bytes_left -= size
+
+class RetentionManager:
+    """
+    Tiered history retention.
+
+    raw hourly files (raw_days) -> 10-minute compacted day files (compacted_days)
+    -> gzip archives kept indefinitely.
+
+    Each tier keeps a cursor (the oldest hour/day not yet moved on), persisted
+    in retention_state.json, so a pass only looks at the files that just aged
+    out instead of listing the whole history. Every pass stops once its I/O
+    budget is spent and pauses between files so it never crowds out ingest.
+    """
+
+    def __init__(self, data_handler, data_types=("sensor", "matrix"), raw_days=7, compacted_days=90,
+                 interval=60, max_files_per_pass=48, max_bytes_per_pass=8 * 1024 * 1024, pause=0.05):
+        self.data_handler = data_handler
+        self.data_types = data_types
+        self.raw_days = raw_days
+        self.compacted_days = compacted_days
+        self.interval = interval
+        self.max_files_per_pass = max_files_per_pass
+        self.max_bytes_per_pass = max_bytes_per_pass
+        self.pause = pause
+
+        data_dir = data_handler.data_dir
+        self.history_dir = data_handler.history_dir
+        self.compacted_dir = data_dir / "compacted"
+        self.archive_dir = data_dir / "archive"
+        self.compacted_dir.mkdir(exist_ok=True)
+        self.archive_dir.mkdir(exist_ok=True)
+        self.state_file = data_dir / "retention_state.json"
+
+        self.raw_cursor = {}        # {data_type: datetime of the oldest raw hour not yet compacted}
+        self.compacted_cursor = {}  # {data_type: datetime of the oldest compacted day not yet archived}
+        self.archived = {}          # {data_type: "YYYYMMDD" of the last day appended to an archive}
+        self.last_pass = {}
+        self.stop_event = data_handler.stop_event
+
+        metrics = data_handler.metrics
+        self.files_processed = metrics.counter("retention_files_total", "Files moved to the next retention tier", labels=("stage",))
+        self.bytes_processed = metrics.counter("retention_bytes_total", "Bytes read by retention passes", labels=("stage",))
+        self.pass_time = metrics.histogram("retention_pass_seconds", "Duration of retention passes")
+
+        self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            self.raw_cursor = {k: datetime.strptime(v, "%Y%m%d_%H") for k, v in state["raw"].items()}
+            self.compacted_cursor = {k: datetime.strptime(v, "%Y%m%d") for k, v in state["compacted"].items()}
+            self.archived = state.get("archived", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[Retention] ❌ Error reading state, rescanning: {e}")
+
+        # First run (or a new data type): one scan to find where each tier starts
+        for data_type in self.data_types:
+            if data_type not in self.raw_cursor:
+                self.raw_cursor[data_type] = self._oldest(self.history_dir, data_type, "%Y%m%d_%H", self._raw_cutoff())
+            if data_type not in self.compacted_cursor:
+                self.compacted_cursor[data_type] = self._oldest(self.compacted_dir, data_type, "%Y%m%d", self._compacted_cutoff())
+
+    def _oldest(self, directory, data_type, pattern, default):
+        oldest = default
+        for path in directory.glob(f"{data_type}_*.json"):
+            try:
+                oldest = min(oldest, datetime.strptime(path.stem[len(data_type) + 1:], pattern))
+            except ValueError:
+                continue
+        return oldest
+
+    def _save_state(self):
+        state = {
+            "raw": {k: v.strftime("%Y%m%d_%H") for k, v in self.raw_cursor.items()},
+            "compacted": {k: v.strftime("%Y%m%d") for k, v in self.compacted_cursor.items()},
+            "archived": self.archived
+        }
+        self.data_handler._write_json_file(self.state_file, state)
+
+    def _raw_cutoff(self):
+        return (datetime.now() - timedelta(days=self.raw_days)).replace(minute=0, second=0, microsecond=0)
+
+    def _compacted_cutoff(self):
+        return (datetime.now() - timedelta(days=self.compacted_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def start(self):
+        """Run retention passes in a background thread"""
+        def retention_loop():
+            while not self.stop_event.wait(self.interval):
+                try:
+                    self.run_pass()
+                except Exception as e:
+                    print(f"[Retention] ❌ Pass error: {e}")
+
+        threading.Thread(target=retention_loop, daemon=True).start()
+
+    def run_pass(self):
+        """Advance every tier as far as this pass's I/O budget allows"""
+        started = time.perf_counter()
+        budget = IOBudget(self.max_files_per_pass, self.max_bytes_per_pass)
+        moved = {"compacted": 0, "archived": 0}
+        for data_type in self.data_types:
+            moved["compacted"] += self._compact_raw(data_type, budget)
+            moved["archived"] += self._archive_compacted(data_type, budget)
+        self._save_state()
+
+        elapsed = time.perf_counter() - started
+        self.pass_time.observe(elapsed)
+        self.last_pass = dict(moved, finished=time.time(), seconds=round(elapsed, 3),
+                              budget_exhausted=not budget.available())
+        if moved["compacted"] or moved["archived"]:
+            print(f"[Retention] 🗜️ Compacted {moved['compacted']} hour files, archived {moved['archived']} day files")
+        return moved
+
+    def _compact_raw(self, data_type, budget):
+        """Fold raw hour files older than raw_days into 10-minute buckets"""
+        cutoff = self._raw_cutoff()
+        hour = self.raw_cursor[data_type]
+        moved = 0
+        while hour < cutoff and budget.available():
+            raw_file = self.history_dir / f"{data_type}_{hour.strftime('%Y%m%d_%H')}.json"
+            size = raw_file.stat().st_size if raw_file.exists() else 0
+            budget.spend(1, size)
+            if size:
+                records = self.data_handler.read_history_records(raw_file)
+                self._merge_into_day(data_type, hour, records)
+                with self.data_handler.lock:
+                    raw_file.unlink()
+                self.files_processed.labels("compact").inc()
+                self.bytes_processed.labels("compact").inc(size)
+                moved += 1
+                self.stop_event.wait(self.pause)
+            hour += timedelta(hours=1)
+            self.raw_cursor[data_type] = hour
+        return moved
+
+    def _merge_into_day(self, data_type, hour, records):
+        day_file = self.compacted_dir / f"{data_type}_{hour.strftime('%Y%m%d')}.json"
+        day = self.data_handler._read_json_file(day_file) or {"resolution": COMPACT_WIDTH, "buckets": {}}
+        buckets = day["buckets"]
+        # Hours already folded in; a crash between the day write and the raw unlink must not count one twice
+        sources = day.setdefault("sources", [])
+        source = hour.strftime("%H")
+        if source in sources:
+            return
+        sources.append(source)
+
+        previous_state = None
+        for record in sorted(records, key=lambda r: r.get("timestamp", 0)):
+            start = str(int(record["timestamp"] // COMPACT_WIDTH) * COMPACT_WIDTH)
+            if data_type == "sensor":
+                value, state = record["sensor_value"], record.get("state", 0)
+                changed = 1 if previous_state is not None and state != previous_state else 0
+                previous_state = state
+                bucket = buckets.get(start)
+                if bucket is None:
+                    buckets[start] = [1, value, value, value, changed]
+                else:
+                    bucket[0] += 1
+                    bucket[1] = min(bucket[1], value)
+                    bucket[2] = max(bucket[2], value)
+                    bucket[3] += value
+                    bucket[4] += changed
+            else:
+                # Matrix buckets keep the update count and the last snapshot
+                bucket = buckets.setdefault(start, {"count": 0})
+                bucket["count"] += 1
+                bucket["last"] = record
+
+        self.data_handler._write_json_file(day_file, day)
+
+    def _archive_compacted(self, data_type, budget):
+        """Append compacted days older than compacted_days to monthly gzip archives"""
+        cutoff = self._compacted_cutoff()
+        day = self.compacted_cursor[data_type]
+        moved = 0
+        while day < cutoff and budget.available():
+            day_file = self.compacted_dir / f"{data_type}_{day.strftime('%Y%m%d')}.json"
+            size = day_file.stat().st_size if day_file.exists() else 0
+            budget.spend(1, size)
+            if size:
+                stamp = day.strftime("%Y%m%d")
+                if self.archived.get(data_type, "") < stamp:
+                    content = self.data_handler._read_json_file(day_file)
+                    line = json.dumps({"day": stamp, **(content or {})}) + "\n"
+                    archive_file = self.archive_dir / f"{data_type}_{day.strftime('%Y%m')}.jsonl.gz"
+                    # Each day is its own gzip member; concatenated members read back as one stream
+                    with self.data_handler.lock:
+                        with gzip.open(archive_file, "ab") as f:
+                            f.write(line.encode())
+                            f.flush()
+                            os.fsync(f.fileno())
+                    # Persisted before the unlink, so a crash in between cannot archive the day twice
+                    self.archived[data_type] = stamp
+                    self._save_state()
+                with self.data_handler.lock:
+                    day_file.unlink()
+                self.files_processed.labels("archive").inc()
+                self.bytes_processed.labels("archive").inc(size)
+                moved += 1
+                self.stop_event.wait(self.pause)
+            day += timedelta(days=1)
+            self.compacted_cursor[data_type] = day
+        return moved
+
+    def iter_compacted(self, data_type, since, until=None):
+        """Yield compacted 10-minute buckets newest first"""
+        until = time.time() if until is None else until
+        day = datetime.fromtimestamp(until).replace(hour=0, minute=0, second=0, microsecond=0)
+        first_day = datetime.fromtimestamp(max(since, 0)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        while day >= first_day:
+            day_file = self.compacted_dir / f"{data_type}_{day.strftime('%Y%m%d')}.json"
+            day -= timedelta(days=1)
+            if not day_file.exists():
+                continue
+            buckets = (self.data_handler._read_json_file(day_file) or {}).get("buckets", {})
+            for start in sorted((int(s) for s in buckets), reverse=True):
+                if start > until or start + COMPACT_WIDTH <= since:
+                    continue
+                yield self._bucket_entry(data_type, start, buckets[str(start)])
+
+    def _bucket_entry(self, data_type, start, bucket):
+        if data_type == "sensor":
+            count, low, high, total, changes = bucket
+            return {"timestamp": start, "resolution": COMPACT_WIDTH, "count": count,
+                    "min": low, "max": high, "mean": total / count, "state_changes": changes}
+        entry = self.data_handler._history_entry(bucket["last"])
+        entry.update({"timestamp": start, "resolution": COMPACT_WIDTH, "count": bucket["count"]})
+        return entry
+
+    def status(self):
+        return {
+            "raw_days": self.raw_days,
+            "compacted_days": self.compacted_days,
+            "raw_cursor": {k: v.strftime("%Y-%m-%d %H:00") for k, v in self.raw_cursor.items()},
+            "compacted_cursor": {k: v.strftime("%Y-%m-%d") for k, v in self.compacted_cursor.items()},
+            "last_pass": self.last_pass
+        }
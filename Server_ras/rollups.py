@@ -0,0 +1,145 @@
+import threading
+
+# Rollup resolutions: label -> bucket width in seconds
+RESOLUTIONS = {
+    "1m": 60,
+    "10m": 600,
+    "1h": 3600
+}
+
+# How long each resolution is kept in memory (seconds)
+RETENTION = {
+    60: 24 * 3600,
+    600: 7 * 24 * 3600,
+    3600: 30 * 24 * 3600
+}
+
+class SensorRollups:
+    """Incremental min/max/mean/count rollups of sensor samples"""
+
+    def __init__(self):
+        # {width: {bucket_start: [count, min, max, sum, state_changes]}}
+        self.levels = {width: {} for width in RESOLUTIONS.values()}
+        self.last_state = None
+        self.last_timestamp = None          # Newest sample folded in; state changes chain from it
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def add(self, timestamp, value, state):
+        """Fold one sample into every resolution"""
+        with self.lock:
+            changed = 1 if self.last_state is not None and state != self.last_state else 0
+            self.last_state = state
+            self.last_timestamp = timestamp if self.last_timestamp is None else max(self.last_timestamp, timestamp)
+            self._fold(timestamp, value, changed)
+            self.dirty = True
+
+    def add_batch(self, timestamps, values, states):
+        """
+        Fold time-sorted samples, e.g. a backfilled upload. State changes are
+        counted within the batch; it only chains onto the live state when it
+        starts after the newest sample, and only moves it forward.
+        """
+        with self.lock:
+            newer = self.last_timestamp is None or timestamps[0] >= self.last_timestamp
+            previous = self.last_state if newer else None
+            for timestamp, value, state in zip(timestamps, values, states):
+                changed = 1 if previous is not None and state != previous else 0
+                previous = state
+                self._fold(timestamp, value, changed)
+            if self.last_timestamp is None or timestamps[-1] >= self.last_timestamp:
+                self.last_state = states[-1]
+                self.last_timestamp = timestamps[-1]
+            self.dirty = True
+
+    def _fold(self, timestamp, value, changed):
+        """Add one sample to every resolution; caller holds the lock"""
+        for width, buckets in self.levels.items():
+            start = int(timestamp // width) * width
+            bucket = buckets.get(start)
+            if bucket is None:
+                buckets[start] = [1, value, value, value, changed]
+                self._prune(width, start)
+            else:
+                bucket[0] += 1
+                bucket[1] = min(bucket[1], value)
+                bucket[2] = max(bucket[2], value)
+                bucket[3] += value
+                bucket[4] += changed
+
+    def _prune(self, width, newest_start):
+        """Drop buckets that fell out of the retention window"""
+        cutoff = newest_start - RETENTION[width]
+        buckets = self.levels[width]
+        for start in [s for s in buckets if s < cutoff]:
+            del buckets[start]
+
+    def query(self, width, since, until=None):
+        """Get buckets of one resolution in [since, until], newest first"""
+        with self.lock:
+            buckets = self.levels[width]
+            starts = sorted(
+                (s for s in buckets if s + width > since and (until is None or s <= until)),
+                reverse=True
+            )
+            return [self._to_entry(width, s, buckets[s]) for s in starts]
+
+    def _to_entry(self, width, start, bucket):
+        count, low, high, total, changes = bucket
+        return {
+            "timestamp": start,
+            "resolution": width,
+            "count": count,
+            "min": low,
+            "max": high,
+            "mean": total / count,
+            "state_changes": changes
+        }
+
+    def snapshot(self):
+        """Serializable copy of all levels; clears the dirty flag"""
+        with self.lock:
+            self.dirty = False
+            return {
+                "last_state": self.last_state,
+                "last_timestamp": self.last_timestamp,
+                "levels": {
+                    str(width): {str(start): list(bucket) for start, bucket in buckets.items()}
+                    for width, buckets in self.levels.items()
+                }
+            }
+
+    def restore(self, data):
+        """Load levels from a snapshot"""
+        with self.lock:
+            self.last_state = data.get("last_state")
+            self.last_timestamp = data.get("last_timestamp")
+            for width, buckets in data.get("levels", {}).items():
+                width = int(width)
+                if width in self.levels:
+                    self.levels[width] = {int(start): bucket for start, bucket in buckets.items()}
+
+def pick_resolution(hours, resolution=None, max_points=300):
+    """
+    Pick the cheapest rollup width that satisfies the request.
+    Returns None when raw samples are needed.
+
+    resolution may be 'raw', a label ('1m', '10m', '1h'), a number of
+    seconds between points, or 'auto' to stay within max_points.
+    """
+    if resolution is None or resolution == "raw":
+        return None
+
+    if resolution in RESOLUTIONS:
+        return RESOLUTIONS[resolution]
+
+    widths = sorted(RESOLUTIONS.values())
+    if resolution == "auto":
+        # Finest level that stays within max_points
+        wanted = hours * 3600 / max(1, max_points)
+        candidates = [w for w in widths if w >= wanted]
+        return candidates[0] if candidates else widths[-1]
+
+    # Coarsest level that is still at least as fine as requested
+    candidates = [w for w in widths if w <= float(resolution)]
+    return candidates[-1] if candidates else None
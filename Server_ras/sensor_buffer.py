@@ -0,0 +1,131 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+
+class SensorRingBuffer:
+    """
+    Fixed-size in-memory store of recent sensor samples.
+
+    Every column is allocated twice its capacity and each sample is written
+    to both halves, so the live window is always the contiguous slice
+    [start, start + size): appends are O(1) and range lookups are a
+    binary search on a plain sorted view, without copying or unrolling.
+    """
+
+    def __init__(self, capacity=131072, covered_since=0.0):
+        self.capacity = capacity
+        self.timestamps = np.zeros(2 * capacity, dtype=np.float64)
+        self.values = np.zeros(2 * capacity, dtype=np.float64)
+        self.thresholds = np.zeros(2 * capacity, dtype=np.float64)
+        self.states = np.zeros(2 * capacity, dtype=np.int8)
+        self.start = 0
+        self.size = 0
+        # Earliest time from which the buffer holds every sample
+        self.covered_since = covered_since
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, value, threshold, state):
+        """Add one sample, overwriting the oldest once full"""
+        with self.lock:
+            if self.size:
+                # Keep the column sorted for searchsorted even if the wall clock steps back
+                timestamp = max(timestamp, self.timestamps[self.start + self.size - 1])
+
+            slot = (self.start + self.size) % self.capacity
+            for column, item in ((self.timestamps, timestamp), (self.values, value),
+                                 (self.thresholds, threshold), (self.states, state)):
+                column[slot] = item
+                column[slot + self.capacity] = item
+
+            if self.size < self.capacity:
+                self.size += 1
+            else:
+                self.start = (self.start + 1) % self.capacity
+                self.covered_since = self.timestamps[self.start]
+
+    def extend(self, timestamps, values, thresholds, states):
+        """Add many samples; out-of-order (backfilled) ones are merged into place"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        with self.lock:
+            newest = self.timestamps[self.start + self.size - 1] if self.size else -np.inf
+            in_order = timestamps.size == 0 or (timestamps[0] >= newest and np.all(np.diff(timestamps) >= 0))
+        if in_order:
+            for row in zip(timestamps, values, thresholds, states):
+                self.append(*row)
+            return
+
+        with self.lock:
+            end = self.start + self.size
+            merged = [np.concatenate((column[self.start:end], np.asarray(new, dtype=column.dtype)))
+                      for column, new in ((self.timestamps, timestamps), (self.values, values),
+                                          (self.thresholds, thresholds), (self.states, states))]
+            order = np.argsort(merged[0], kind="stable")[-self.capacity:]
+            if len(merged[0]) > self.capacity:
+                self.covered_since = max(self.covered_since, merged[0][order[0]])
+            for column, data in zip((self.timestamps, self.values, self.thresholds, self.states), merged):
+                column[:len(order)] = data[order]
+                column[self.capacity:self.capacity + len(order)] = data[order]
+            self.start = 0
+            self.size = len(order)
+
+    def covers(self, since):
+        """True when no sample at or after `since` has been evicted"""
+        return since >= self.covered_since
+
+    def window(self, since, until=None):
+        """Copy of (timestamps, values, thresholds, states) with since <= timestamp <= until"""
+        with self.lock:
+            end = self.start + self.size
+            times = self.timestamps[self.start:end]
+            low = self.start + np.searchsorted(times, since, side="left")
+            high = end if until is None else self.start + np.searchsorted(times, until, side="right")
+            return (self.timestamps[low:high].copy(), self.values[low:high].copy(),
+                    self.thresholds[low:high].copy(), self.states[low:high].copy())
+
+    def entries(self, since, until=None, before=None):
+        """Yield samples newest first as history entry dicts"""
+        if before is not None:
+            until = before if until is None else min(until, before)
+        timestamps, values, thresholds, states = self.window(since, until)
+
+        for i in range(len(timestamps) - 1, -1, -1):
+            timestamp = float(timestamps[i])
+            if before is not None and timestamp >= before:
+                continue
+            value = float(values[i])
+            threshold = float(thresholds[i])
+            yield {
+                "sensor_value": int(value) if value.is_integer() else value,
+                "threshold": int(threshold) if threshold.is_integer() else threshold,
+                "state": int(states[i]),
+                "timestamp": timestamp,
+                "last_update": datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+            }
+
+    def stats(self, since, until=None, percentiles=(50, 90, 99)):
+        """Vectorized aggregates over a time range"""
+        timestamps, values, thresholds, states = self.window(since, until)
+        return summarize(timestamps, values, thresholds, percentiles)
+
+def summarize(timestamps, values, thresholds, percentiles=(50, 90, 99)):
+    """Count, mean, min/max, percentiles and threshold crossings of sample arrays"""
+    if len(values) == 0:
+        return {"count": 0}
+
+    above = (values > thresholds).astype(np.int8)
+    steps = np.diff(above)
+    points = np.percentile(values, percentiles)
+    return {
+        "count": int(len(values)),
+        "from": float(timestamps[0]),
+        "to": float(timestamps[-1]),
+        "mean": float(values.mean()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "std": float(values.std()),
+        "percentiles": {f"{p:g}": float(v) for p, v in zip(percentiles, points)},
+        "fraction_above_threshold": float(above.mean()),
+        "crossings_up": int(np.count_nonzero(steps == 1)),
+        "crossings_down": int(np.count_nonzero(steps == -1))
+    }
@@ -8,6 +8,7 @@ from udp_handler import UDPHandler
 from status_router import MessageRouter  # ✅ Import the router
 from data_handler import DataHandler
 from http_api import HTTPAPIServer
+from metrics import MetricsRegistry
 
 class MultiProtocolServer:
     def __init__(self, tcp_host='0.0.0.0', tcp_port=5555, 
@@ -35,6 +36,19 @@ class MultiProtocolServer:
         self.frames_sent = 0
         self.frames_processed = 0
 
+        # Metrics shared by every component, scraped from GET /metrics
+        self.metrics = MetricsRegistry()
+        self.metrics.gauge("frame_queue_size", "Decoded frames waiting for broadcast",
+                           function=lambda: self.frame_queue.qsize())
+        self.metrics.gauge("udp_partial_frames", "Frames still being reassembled",
+                           function=lambda: len(self.buffer_dict))
+        self.metrics.gauge("tcp_clients", "Connected TCP clients",
+                           function=lambda: len(self.tcp_clients))
+        ws_clients = self.metrics.gauge("ws_clients", "Connected WebSocket clients", labels=("server",))
+        ws_clients.labels("chat").set_function(lambda: len(self.ws_clients))
+        ws_clients.labels("video").set_function(lambda: len(self.video_ws_clients))
+        self.video_fps = self.metrics.gauge("video_fps", "Broadcast frame rate over the last stats interval")
+
         # Locks for thread safety
         self.tcp_lock = threading.Lock()
         self.ws_lock = threading.Lock()
@@ -51,8 +65,9 @@ class MultiProtocolServer:
         self.loop = None
         
         #added data handler and HTTP API
-        self.data_handler = DataHandler()
-        self.http_api = HTTPAPIServer (self.data_handler, http_host, http_port)
+        self.data_handler = DataHandler(metrics=self.metrics)
+        self.http_api = HTTPAPIServer (self.data_handler, http_host, http_port, metrics=self.metrics)
+        self.data_handler.add_listener(self.router.on_data_update)
 
     def start(self):
         """Start all servers"""
@@ -96,6 +111,7 @@ class MultiProtocolServer:
             elapsed = now - self.last_frame_time
             fps = self.frame_count / elapsed if elapsed > 0 else 0
             queue_size = self.frame_queue.qsize()
+            self.video_fps.set(fps)
 
             print(
                 f"[Stats] FPS: {fps:.2f}, Queue: {queue_size}, "
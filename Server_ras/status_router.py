@@ -4,6 +4,16 @@ import asyncio
 class MessageRouter:
     def __init__(self, server):
         self.server = server
+
+        metrics = server.metrics
+        self.routed = metrics.counter("router_messages_total", "Messages routed, by sender", labels=("sender",))
+        self.unroutable = metrics.counter("router_unroutable_total", "Messages dropped for lack of a routing target")
+        self.sends = metrics.counter("router_sends_total", "Messages forwarded, by transport", labels=("transport",))
+        self.send_failures = metrics.counter("router_send_failures_total", "Forwarding failures, by transport", labels=("transport",))
+        self.matrix_bytes = metrics.counter("router_matrix_bytes_total", "Matrix update bytes sent to Web clients", labels=("kind",))
+
+        # Matrix version each Web client has seen, so updates only carry changed cells
+        self.matrix_versions = {}   # {websocket: version}
         # ✅ Define routing rules by client name
         self.routing_table = {
             "ESP_Matrix": ["Web"],
@@ -22,8 +32,10 @@ class MessageRouter:
         print(f"[Router] Routing from '{sender_name}' → {targets}")
         
         if not targets:
+            self.unroutable.inc()
             print(f"[Router] ❌ No routing targets for sender: {sender_name}")
             return
+        self.routed.labels(sender_name).inc()
 
         for target in targets:
             if target == "Web":
@@ -39,6 +51,7 @@ class MessageRouter:
                 loop
             )
         except Exception as e:
+            self.send_failures.labels("ws").inc()
             print(f"[Router] ❌ Failed to forward to Web clients: {e}")
 
     async def _send_to_web(self, message_obj):  # Fixed method name
@@ -46,8 +59,10 @@ class MessageRouter:
             for ws, name in list(self.server.ws_clients.items()):
                 try:
                     await ws.send(json.dumps(message_obj))
+                    self.sends.labels("ws").inc()
                     print(f"[Router] ✅ Sent to Web client: {name}")
                 except Exception as e:
+                    self.send_failures.labels("ws").inc()
                     print(f"[Router] ❌ WebSocket send failed for {name}: {e}")
                     self.server.ws_clients.pop(ws, None)
                     try:
@@ -61,11 +76,51 @@ class MessageRouter:
                 if name == target_name:
                     try:
                         sock.send(json.dumps(message_obj).encode('utf-8'))
+                        self.sends.labels("tcp").inc()
                         print(f"[Router] ✅ Sent to TCP client: {name}")
                     except Exception as e:
+                        self.send_failures.labels("tcp").inc()
                         print(f"[Router] ❌ TCP send failed for {name}: {e}")
                         self.server.tcp_clients.pop(sock, None)
                         try:
                             sock.close()
                         except:
                             pass
+
+    def on_data_update(self, key, data):
+        """DataHandler listener: push matrix changes to Web clients"""
+        if key != "matrix" or self.server.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._send_matrix_updates(), self.server.loop)
+
+    async def _send_matrix_updates(self):
+        with self.server.ws_lock:
+            clients = dict(self.server.ws_clients)
+        for ws in [ws for ws in self.matrix_versions if ws not in clients]:
+            del self.matrix_versions[ws]
+
+        targets = self.routing_table.get("ESP_Matrix", [])
+        messages = {}   # One delta per base version, shared by clients at that version
+        for ws, name in clients.items():
+            if name in targets:
+                await self.send_matrix_update(ws, self.matrix_versions.get(ws), messages)
+
+    async def send_matrix_update(self, ws, base_version, messages=None):
+        """Send a Web client what changed since base_version (full matrix if unknown)"""
+        messages = {} if messages is None else messages
+        if base_version not in messages:
+            message = self.server.data_handler.get_matrix_delta(base_version)
+            messages[base_version] = (message, json.dumps(message) if message else None)
+        message, payload = messages[base_version]
+        if message is None:
+            return
+
+        try:
+            await ws.send(payload)
+            self.matrix_versions[ws] = message["version"]
+            self.sends.labels("ws").inc()
+            self.matrix_bytes.labels(message["type"]).inc(len(payload))
+        except Exception as e:
+            print(f"[Router] ❌ Matrix update failed: {e}")
+            self.send_failures.labels("ws").inc()
+            self.matrix_versions.pop(ws, None)
@@ -2,12 +2,29 @@ import socket
 import threading
 import json
 import sys
+import time
+import codecs
 from data_handler import DataHandler
 
 class TCPHandler:
     def __init__(self, server):
         self.server = server
         
+        metrics = server.metrics
+        self.connections = metrics.counter("tcp_connections_total", "Accepted TCP client connections")
+        self.bytes_received = metrics.counter("tcp_bytes_received_total", "Bytes received from TCP clients")
+        self.messages_received = metrics.counter("tcp_messages_total", "TCP messages processed", labels=("type",))
+        self.invalid_messages = metrics.counter("tcp_invalid_messages_total", "TCP payloads that failed to decode")
+        self.message_time = metrics.histogram("tcp_message_process_seconds", "Time to handle one TCP message")
+        
+        # Batch uploads can span many recv() calls; cap what we hold for one unfinished message
+        self.max_pending_chars = 1024 * 1024
+        # Data type implied by the sender when a batch does not name one
+        self.batch_sources = {
+            "ESP32_Sensor": "sensor",
+            "ESP_Matrix": "matrix"
+        }
+        
         # Handle different Python versions for JSON exception
         if sys.version_info >= (3, 5):
             self.json_decode_error = json.JSONDecodeError
@@ -31,27 +48,40 @@ class TCPHandler:
                 ).start()
     
     def parse_multiple_json(self, data_str):
-        """Parse multiple JSON objects from a single string"""
+        """
+        Parse consecutive JSON objects from a stream buffer.
+        Returns (messages, remainder) where remainder is an unfinished object
+        to be completed by the next recv(). A malformed line is skipped; without
+        a newline, parsing resumes at the next '{' after the malformed object.
+        """
         messages = []
         decoder = json.JSONDecoder()
         idx = 0
         
-        while idx < len(data_str):
-            data_str = data_str[idx:].lstrip()  # Remove leading whitespace
-            if not data_str:
-                break
+        while True:
+            while idx < len(data_str) and data_str[idx].isspace():
+                idx += 1
+            if idx >= len(data_str):
+                return messages, ""
                 
             try:
-                message_obj, end_idx = decoder.raw_decode(data_str)
+                message_obj, idx = decoder.raw_decode(data_str, idx)
                 messages.append(message_obj)
-                idx += end_idx
             except self.json_decode_error as e:
-                # If we can't parse more JSON, break
-                if not messages:  # If no messages parsed yet, it's a real error
-                    raise e
-                break
-                
-        return messages
+                line_end = data_str.find("\n", idx)
+                if line_end == -1:
+                    pos = getattr(e, "pos", None)
+                    if (pos is None or e.msg.startswith("Unterminated string")
+                            or not data_str[pos:].strip("-+.0123456789eEtruefalsn")):
+                        # Ran out of data (possibly mid-string, number or literal): the rest comes with the next recv()
+                        return messages, data_str[idx:]
+                    # Malformed, and senders without newlines give nothing to skip to: resync at the next object
+                    line_end = data_str.find("{", idx + 1) - 1
+                    if line_end < 0:
+                        line_end = len(data_str)
+                self.invalid_messages.inc()
+                print(f"[TCP] ❌ Skipping invalid JSON: {e}")
+                idx = line_end + 1
     
     def handle_tcp_client(self, client_socket, client_address):
         """Handle individual TCP client connections"""
@@ -65,34 +95,38 @@ class TCPHandler:
                 
             with self.server.tcp_lock:
                 self.server.tcp_clients[client_socket] = name
+            self.connections.inc()
             print(f"[TCP] ✅ {name} connected from {client_address}")
             
-            # Listen for messages
+            # Listen for messages; a message may arrive split across several reads
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            pending = ""
             while True:
                 data = client_socket.recv(4096)
                 if not data:
                     print(f"[TCP] ❌ No data from {name}, disconnecting.")
                     break
+                self.bytes_received.inc(len(data))
                 
                 try:
-                    data_str = data.decode('utf-8').strip()
-                    print(f"[TCP] Raw data from {name}: {data_str}")
+                    data_str = decoder.decode(data)
+                    print(f"[TCP] Raw data from {name}: {data_str.strip()}")
                     
                     # Handle multiple JSON objects in one message
-                    try:
-                        messages = self.parse_multiple_json(data_str)
-                        for message_obj in messages:
-                            self.process_message(message_obj, name)
-                    except:
-                        # Fallback to single JSON parsing
-                        message_obj = json.loads(data_str)
-                        self.process_message(message_obj, name)
+                    messages, pending = self.parse_multiple_json(pending + data_str)
+                    for message_obj in messages:
+                        self.process_message(message_obj, name, client_socket)
                         
-                except self.json_decode_error as e:
-                    print(f"[TCP] ❌ Invalid JSON from {name}: {e}")
-                    print(f"[TCP] Raw data was: {data}")
+                    if len(pending) > self.max_pending_chars:
+                        self.invalid_messages.inc()
+                        print(f"[TCP] ❌ Unterminated message from {name} exceeds {self.max_pending_chars} chars, dropping it")
+                        pending = ""
+                
                 except UnicodeDecodeError as e:
+                    self.invalid_messages.inc()
                     print(f"[TCP] ❌ Unicode decode error from {name}: {e}")
+                    decoder.reset()
+                    pending = ""
                 except Exception as e:
                     print(f"[TCP] ❌ Unexpected error processing data from {name}: {e}")
                     
@@ -107,12 +141,25 @@ class TCPHandler:
                 pass
             print(f"[TCP] {name or client_address} disconnected")
     
-    def process_message(self, message_obj, name):
+    def process_message(self, message_obj, name, client_socket=None):
         """Process individual message objects"""
+        started = time.perf_counter()
+        try:
+            self._process_message(message_obj, name, client_socket)
+        finally:
+            self.message_time.observe(time.perf_counter() - started)
+            message_type = message_obj.get("type", "unknown") if isinstance(message_obj, dict) else "invalid"
+            self.messages_received.labels(message_type).inc()
+    
+    def _process_message(self, message_obj, name, client_socket):
         print(f"[TCP] Message from {name}: {message_obj}")
         
+        # Buffered readings uploaded in one message
+        if message_obj.get("type") == "batch":
+            self.handle_batch(message_obj, name, client_socket)
+        
         # Handle ESP32 sensor data
-        if name == "ESP32_Sensor" and message_obj.get("type") == "sensor_data":
+        elif name == "ESP32_Sensor" and message_obj.get("type") == "sensor_data":
             sensor_value = message_obj.get("sensor_value", 0)
             threshold = message_obj.get("threshold", 500)
             success = self.server.data_handler.save_sensor_data(sensor_value, threshold)
@@ -138,3 +185,26 @@ class TCPHandler:
         # Route other messages
         else:
             self.server.router.route(message_obj, name, sender_type="tcp")
+
+    def handle_batch(self, message_obj, name, client_socket=None):
+        """Store a batch of buffered readings and acknowledge it to the sender"""
+        data_type = message_obj.get("data_type") or self.batch_sources.get(name)
+        batch_id = message_obj.get("batch_id")
+        try:
+            accepted = self.server.data_handler.ingest_batch(
+                data_type,
+                message_obj.get("readings"),
+                message_obj.get("sent_at"),
+                message_obj.get("time_unit", "s")
+            )
+            reply = {"type": "batch_ack", "batch_id": batch_id, "accepted": accepted}
+            print(f"[TCP] ✅ Batch {batch_id} from {name}: {accepted} readings")
+        except ValueError as e:
+            reply = {"type": "batch_error", "batch_id": batch_id, "error": str(e)}
+            print(f"[TCP] ❌ Rejected batch {batch_id} from {name}: {e}")
+        
+        if client_socket is not None:
+            try:
+                client_socket.sendall((json.dumps(reply) + "\n").encode('utf-8'))
+            except OSError as e:
+                print(f"[TCP] ❌ Could not acknowledge batch to {name}: {e}")
@@ -8,10 +8,28 @@ import base64
 import time
 import traceback
 
+# v2 chunk header from the Jetson senders: magic, version, flags, frame_num,
+# chunk_idx, total_chunks, width, height. v1 senders send only frame_num, total_chunks.
+FRAME_HEADER_V2 = struct.Struct(">2sBBIHHHH")
+FRAME_MAGIC = b"FR"
+FRAME_VERSION = 2
+FRAME_FLAGS = 0     # Flag bits this server understands (none defined yet)
+
 class UDPHandler:
     def __init__(self, server):
         self.server = server
         self.MAX_DGRAM = 65507
+        
+        metrics = server.metrics
+        self.packets_received = metrics.counter("udp_packets_received_total", "UDP video datagrams received")
+        self.bytes_received = metrics.counter("udp_bytes_received_total", "UDP video datagram bytes received")
+        self.frames_completed = metrics.counter("udp_frames_completed_total", "Frames fully reassembled from UDP chunks")
+        self.frames_dropped = metrics.counter("video_frames_dropped_total", "Video frames dropped", labels=("reason",))
+        self.frame_process_time = metrics.histogram("video_frame_process_seconds", "Time to prepare one reassembled frame for broadcast")
+        self.frames_by_path = metrics.counter("video_frames_processed_total", "Frames prepared for broadcast", labels=("path",))
+        self.frames_delivered = metrics.counter("ws_video_frames_sent_total", "Frames delivered to video WebSocket clients")
+        self.send_failures = metrics.counter("ws_video_send_failures_total", "Failed sends to video WebSocket clients")
+        self.broadcast_time = metrics.histogram("video_broadcast_seconds", "Time to fan one frame out to all video clients")
     
     async def broadcast_frames(self):
         """Broadcast video frames to connected WebSocket clients"""
@@ -25,7 +43,7 @@ class UDPHandler:
 
                 # Get frame from queue with timeout
                 try:
-                    frame_data = await asyncio.wait_for(self.server.frame_queue.get(), timeout=0.5)
+                    frame_data, width, height = await asyncio.wait_for(self.server.frame_queue.get(), timeout=0.5)
                 except asyncio.TimeoutError:
                     await asyncio.sleep(0.1)
                     continue
@@ -37,6 +55,8 @@ class UDPHandler:
                     "type": "video_frame",
                     "data": frame_data,
                     "frame_num": self.server.frame_count,
+                    "width": width,
+                    "height": height,
                     "timestamp": time.time()
                 })
                 
@@ -44,14 +64,17 @@ class UDPHandler:
                 failed_clients = []
                 success_count = 0
                 
-                for client in self.server.video_ws_clients:
-                    try:
-                        await client.send(frame_message)
-                        success_count += 1
-                        self.server.frames_sent += 1
-                    except Exception as e:
-                        print(f"[WS Video] Failed to send to client: {e}")
-                        failed_clients.append(client)
+                with self.broadcast_time.time():
+                    for client in self.server.video_ws_clients:
+                        try:
+                            await client.send(frame_message)
+                            success_count += 1
+                            self.server.frames_sent += 1
+                        except Exception as e:
+                            print(f"[WS Video] Failed to send to client: {e}")
+                            failed_clients.append(client)
+                self.frames_delivered.inc(success_count)
+                self.send_failures.inc(len(failed_clients))
                 
                 # Clean up failed clients
                 for client in failed_clients:
@@ -81,17 +104,33 @@ class UDPHandler:
         while True:
             try:
                 data, addr = await loop.sock_recvfrom(sock, self.MAX_DGRAM)
+                self.packets_received.inc()
+                self.bytes_received.inc(len(data))
                 if len(data) < 8:
+                    self.frames_dropped.labels("short_packet").inc()
                     continue
 
-                frame_num, total_chunks = struct.unpack(">II", data[:8])
-                chunk_data = data[8:]
+                if data[:2] == FRAME_MAGIC and len(data) >= FRAME_HEADER_V2.size:
+                    _, version, flags, frame_num, chunk_idx, total_chunks, width, height = FRAME_HEADER_V2.unpack_from(data)
+                    if version != FRAME_VERSION or flags & ~FRAME_FLAGS:
+                        # A newer sender's layout may differ; never reassemble it as v2
+                        self.frames_dropped.labels("unsupported_header").inc()
+                        continue
+                    chunk_data = data[FRAME_HEADER_V2.size:]
+                    chunk_key = chunk_idx
+                else:
+                    frame_num, total_chunks = struct.unpack(">II", data[:8])
+                    chunk_data = data[8:]
+                    chunk_key = len(chunk_data)
+                    width = height = None
 
                 if frame_num not in self.server.buffer_dict:
-                    self.server.buffer_dict[frame_num] = {'chunks': {}, 'total': total_chunks, 'timestamp': time.time()}
-                self.server.buffer_dict[frame_num]['chunks'][len(chunk_data)] = chunk_data
+                    self.server.buffer_dict[frame_num] = {'chunks': {}, 'total': total_chunks, 'timestamp': time.time(),
+                                                          'width': width, 'height': height}
+                self.server.buffer_dict[frame_num]['chunks'][chunk_key] = chunk_data
 
                 if len(self.server.buffer_dict[frame_num]['chunks']) == total_chunks:
+                    self.frames_completed.inc()
                     now = time.time()
                     if now - last_log_time >= 5.0:
                         print(f"[UDP] Frame {frame_num} complete ({total_chunks} chunks)")
@@ -101,6 +140,7 @@ class UDPHandler:
                         # Process complete frame
                         await self._process_complete_frame(frame_num)
                     except Exception as e:
+                        self.frames_dropped.labels("error").inc()
                         print(f"[UDP] Frame processing error: {e}")
                         traceback.print_exc()
                     finally:
@@ -117,37 +157,54 @@ class UDPHandler:
     async def _process_complete_frame(self, frame_num):
         """Process a complete frame once all chunks are received"""
         frame_info = self.server.buffer_dict[frame_num]
+        started = time.perf_counter()
         full_data = b''.join(frame_info['chunks'][k] for k in sorted(frame_info['chunks'].keys()))
-        img_np = np.frombuffer(full_data, dtype=np.uint8)
-        frame = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
         
-        if frame is not None:
+        if frame_info['width']:
+            # v2 senders encode at native size and tell us the dimensions: forward the JPEG as is,
+            # the browser scales it when drawing
+            b64_data = base64.b64encode(full_data).decode('utf-8')
+            width, height = frame_info['width'], frame_info['height']
+            path = "passthrough"
+        else:
+            img_np = np.frombuffer(full_data, dtype=np.uint8)
+            frame = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
+            if frame is None:
+                self.frames_dropped.labels("decode").inc()
+                return
             frame = cv2.resize(frame, (640, 480))
             # Add frame number as text overlay
             cv2.putText(frame, f"Frame: {frame_num}", (20, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
             
             _, jpeg = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
             b64_data = base64.b64encode(jpeg.tobytes()).decode('utf-8')
+            width, height = 640, 480
+            path = "reencode"
             
-            self.server.frames_processed += 1
+        self.frame_process_time.observe(time.perf_counter() - started)
+        self.frames_by_path.labels(path).inc()
+        self.server.frames_processed += 1
+        
+        # Add to queue with timeout to avoid blocking
+        try:
+            if self.server.frame_queue.full():
+                # If queue is full, get an item first
+                try:
+                    self.server.frame_queue.get_nowait()
+                    self.frames_dropped.labels("queue_full").inc()
+                except:
+                    pass
             
-            # Add to queue with timeout to avoid blocking
-            try:
-                if self.server.frame_queue.full():
-                    # If queue is full, get an item first
-                    try:
-                        self.server.frame_queue.get_nowait()
-                    except:
-                        pass
-                
-                # Now put the new frame
-                await asyncio.wait_for(self.server.frame_queue.put(b64_data), timeout=0.1)
-                if self.server.frames_processed % 100 == 0:
-                    print(f"[UDP] Frame {frame_num} queued for broadcast (processed {self.server.frames_processed} total)")
-            except asyncio.QueueFull:
-                print("[UDP] Frame queue full - dropping frame")
-            except asyncio.TimeoutError:
-                print("[UDP] Timeout adding frame to queue")
+            # Now put the new frame
+            await asyncio.wait_for(self.server.frame_queue.put((b64_data, width, height)), timeout=0.1)
+            if self.server.frames_processed % 100 == 0:
+                print(f"[UDP] Frame {frame_num} queued for broadcast (processed {self.server.frames_processed} total)")
+        except asyncio.QueueFull:
+            self.frames_dropped.labels("queue_full").inc()
+            print("[UDP] Frame queue full - dropping frame")
+        except asyncio.TimeoutError:
+            self.frames_dropped.labels("queue_timeout").inc()
+            print("[UDP] Timeout adding frame to queue")
     
     def _clean_stale_frames(self):
         """Clean up stale incomplete frames from buffer"""
@@ -159,3 +216,5 @@ class UDPHandler:
         
         for f in stale_frames:
             del self.server.buffer_dict[f]
+        if stale_frames:
+            self.frames_dropped.labels("incomplete").inc(len(stale_frames))
@@ -10,6 +10,11 @@ class WebSocketHandler:
     def __init__(self, server):
         self.server = server
 
+        metrics = server.metrics
+        self.connections = metrics.counter("ws_connections_total", "Accepted WebSocket connections", labels=("server",))
+        self.messages_received = metrics.counter("ws_messages_total", "Messages received from chat WebSocket clients")
+        self.message_errors = metrics.counter("ws_message_errors_total", "Chat WebSocket messages that failed to process")
+
     def create_chat_server(self):
         return websockets.serve(
             self.handle_websocket_client,
@@ -35,6 +40,7 @@ class WebSocketHandler:
 
             with self.server.ws_lock:
                 self.server.ws_clients[websocket] = name
+            self.connections.labels("chat").inc()
             print(f"[WS] {name} connected")
 
             # Confirm connection
@@ -47,9 +53,15 @@ class WebSocketHandler:
             # Main receive loop
             async for message in websocket:
                 print(f"[WS DEBUG] Raw message from {name}: {message}")
+                self.messages_received.inc()
                 try:
                     message_obj = json.loads(message)
 
+                    # Client lost track of the matrix: resend changes since the version it has
+                    if message_obj.get("type") == "matrix_sync":
+                        await self.server.router.send_matrix_update(websocket, message_obj.get("version"))
+                        continue
+
                     # TEMP: Print ON/OFF commands
                     if message_obj.get("type") == "command":
                         if message_obj.get("value") is True:
@@ -77,6 +89,7 @@ class WebSocketHandler:
                     self.server.router.route(message_obj, name, sender_type="ws")
 
                 except Exception as e:
+                    self.message_errors.inc()
                     print(f"[WS ERROR] Failed to handle message from {name}: {e}")
                     traceback.print_exc()
 
@@ -95,6 +108,7 @@ class WebSocketHandler:
             client_ip = websocket.remote_address[0]
             print(f"[WS Video] Client connected from {client_ip}")
             self.server.video_ws_clients.add(websocket)
+            self.connections.labels("video").inc()
 
             # Send confirmation
             await websocket.send(json.dumps({
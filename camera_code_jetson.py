@@ -2,8 +2,12 @@
 import cv2
 import socket
 import struct
-import time
 import sys
+import os
+
+# Shared helpers live in AI/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "AI"))
+from frame_pacer import FramePacer
 
 # Server configuration
 SERVER_IP = '10.65.102.37'  # Make sure there's no leading space
@@ -22,8 +26,8 @@ if not cap.isOpened():
 
 print("Camera opened successfully")
 frame_num = 0
-last_fps_time = time.time()
-frames_sent = 0
+# Deadline pacing at 30 FPS; a late loop skips the missed slots instead of bursting to catch up
+pacer = FramePacer(30, drop_late=True, name="Camera")
 
 try:
     while True:
@@ -57,18 +61,9 @@ try:
             sock.sendto(header + chunk, (SERVER_IP, SERVER_PORT))
         
         frame_num += 1
-        frames_sent += 1
-        
-        # Calculate and display FPS
-        now = time.time()
-        if now - last_fps_time >= 5.0:
-            fps = frames_sent / (now - last_fps_time)
-            print(f"Sending at {fps:.2f} FPS")
-            frames_sent = 0
-            last_fps_time = now
         
-        # Control frame rate
-        time.sleep(1 / 30)  # Target 30 FPS
+        # Control frame rate (reports achieved FPS and lateness)
+        pacer.wait()
 
 except KeyboardInterrupt:
     print("Stopped by user")
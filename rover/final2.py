@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
-import Jetson.GPIO as GPIO
 import time
 import math
+from pwm_engine import PWMEngine, FakeGPIO
+
+try:
+    import Jetson.GPIO as GPIO
+except (ImportError, RuntimeError) as e:
+    # Off the Jetson: record pin changes instead of driving hardware
+    print(f"[Motor] ⚠️ Jetson.GPIO unavailable ({e}), using FakeGPIO")
+    GPIO = FakeGPIO()
 
 # === Pin Definitions ===
 # Motor A
@@ -35,33 +42,16 @@ for pin in [IN1, IN2, ENA, IN3, IN4, ENB]:
     GPIO.setup(pin, GPIO.OUT)
     GPIO.output(pin, GPIO.LOW)
 
-# === Custom Dual PWM Function ===
-def synchronized_pwm(pin_a, pin_b, duty_a, duty_b, frequency, duration):
-    period = 1.0 / frequency
-    on_time_a = period * duty_a
-    on_time_b = period * duty_b
-    end_time = time.time() + duration
+# === PWM Engine ===
+# ENA (GPIO13) gets hardware PWM; ENB (GPIO18) has no PWM controller and uses the timer thread
+PWM_FREQUENCY = 100
+pwm = PWMEngine(GPIO, (ENA, ENB), frequency=PWM_FREQUENCY)
     
-    while time.time() < end_time:
-        if duty_a > 0:
-            GPIO.output(pin_a, GPIO.HIGH)
-        if duty_b > 0:
-            GPIO.output(pin_b, GPIO.HIGH)
-        
-        time.sleep(min(on_time_a, on_time_b))
-        
-        if on_time_a <= on_time_b:
-            GPIO.output(pin_a, GPIO.LOW)
-            time.sleep(on_time_b - on_time_a)
-            GPIO.output(pin_b, GPIO.LOW)
-        else:
-            GPIO.output(pin_b, GPIO.LOW)
-            time.sleep(on_time_a - on_time_b)
-            GPIO.output(pin_a, GPIO.LOW)
-        
-        off_time = period - max(on_time_a, on_time_b)
-        if off_time > 0:
-            time.sleep(off_time)
+# === Dual PWM ===
+def synchronized_pwm(pin_a, pin_b, duty_a, duty_b, duration):
+    # Duty as a 0-1 fraction; both channels change together at the next period
+    pwm.set_duties({pin_a: duty_a * 100, pin_b: duty_b * 100})
+    time.sleep(duration)
 
 # === Low-level Motor Control ===
 def set_motor_direction_forward():
@@ -93,8 +83,7 @@ def stop_all():
     GPIO.output(IN2, GPIO.LOW)
     GPIO.output(IN3, GPIO.LOW)
     GPIO.output(IN4, GPIO.LOW)
-    GPIO.output(ENA, GPIO.LOW)
-    GPIO.output(ENB, GPIO.LOW)
+    pwm.stop_all()
 
 # === Motion Time Calculations ===
 def calculate_time_for_distance(distance_mm, speed=MOTOR_SPEED_FORWARD):
@@ -113,7 +102,7 @@ def move_forward_mm(distance_mm, speed=MOTOR_SPEED_FORWARD):
     duration = calculate_time_for_distance(distance_mm, speed)
     print(f"Moving forward {distance_mm}mm (estimated {duration:.2f} seconds)...")
     set_motor_direction_forward()
-    synchronized_pwm(ENA, ENB, speed * PWM_LEFT_RATIO, speed * PWM_RIGHT_RATIO, 100, duration)
+    synchronized_pwm(ENA, ENB, speed * PWM_LEFT_RATIO, speed * PWM_RIGHT_RATIO, duration)
     stop_all()
 
 def move_backward_mm(distance_mm, speed=MOTOR_SPEED_FORWARD):
@@ -123,7 +112,7 @@ def move_backward_mm(distance_mm, speed=MOTOR_SPEED_FORWARD):
     duration = calculate_time_for_distance(distance_mm, speed)
     print(f"Moving backward {distance_mm}mm (estimated {duration:.2f} seconds)...")
     set_motor_direction_backward()
-    synchronized_pwm(ENA, ENB, speed * PWM_LEFT_RATIO, speed * PWM_RIGHT_RATIO, 100, duration)
+    synchronized_pwm(ENA, ENB, speed * PWM_LEFT_RATIO, speed * PWM_RIGHT_RATIO, duration)
     stop_all()
 
 def turn_right_degrees(degrees, speed=MOTOR_SPEED_TURN):
@@ -133,7 +122,7 @@ def turn_right_degrees(degrees, speed=MOTOR_SPEED_TURN):
     duration = calculate_time_for_angle(degrees, speed)
     print(f"Turning right {degrees}° (estimated {duration:.2f} seconds)...")
     set_motor_direction_turn_right()
-    synchronized_pwm(ENA, ENB, speed, speed, 100, duration)
+    synchronized_pwm(ENA, ENB, speed, speed, duration)
     stop_all()
 
 def turn_left_degrees(degrees, speed=MOTOR_SPEED_TURN):
@@ -143,7 +132,7 @@ def turn_left_degrees(degrees, speed=MOTOR_SPEED_TURN):
     duration = calculate_time_for_angle(degrees, speed)
     print(f"Turning left {degrees}° (estimated {duration:.2f} seconds)...")
     set_motor_direction_turn_left()
-    synchronized_pwm(ENA, ENB, speed, speed, 100, duration)
+    synchronized_pwm(ENA, ENB, speed, speed, duration)
     stop_all()
 
 # === Calibration ===
@@ -202,6 +191,7 @@ if __name__ == "__main__":
         print(f"  Distance: {MM_PER_SECOND_CALIBRATION} mm/sec")
         print(f"  Rotation: {DEGREES_PER_SECOND_CALIBRATION} deg/sec")
         print(f"  PWM Balance: Left={PWM_LEFT_RATIO}, Right={PWM_RIGHT_RATIO}")
+        print(f"  PWM Modes: {pwm.modes()}")
         print("=" * 50)
 
         calibrate_distance()
@@ -213,5 +203,7 @@ if __name__ == "__main__":
         print("\nProgram interrupted by user")
     finally:
         stop_all()
+        print(f"PWM stats: {pwm.stats()}")
+        pwm.close()
         GPIO.cleanup()
         print("GPIO cleanup complete.")
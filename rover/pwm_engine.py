@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+PWM engine for the motor enable pins.
+
+Pins wired to a hardware PWM controller are driven by GPIO.PWM, so the duty
+cycle is exact and costs no CPU. Any other pin is driven by one timer
+thread that schedules every edge against absolute deadlines
+(sleep, then a short spin on perf_counter for the last fraction of a
+millisecond), so timing error does not accumulate and left/right stay in
+ratio. Duty cycles can be changed at any time without restarting, and the
+thread measures what it actually produced: duty error and start jitter.
+
+FakeGPIO stands in for Jetson.GPIO off-device and records every edge.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+# BCM pins with a hardware PWM controller on the Jetson Nano (board pins 32 and 33).
+# Jetson-IO must have enabled pwm0/pwm2 in the pinmux for these to drive the pin.
+HARDWARE_PWM_PINS = (12, 13)
+
+class FakeGPIO:
+    """Off-device stand-in for the parts of Jetson.GPIO the rover code uses"""
+    BCM = "BCM"
+    BOARD = "BOARD"
+    OUT = "OUT"
+    IN = "IN"
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self, history=20000):
+        self.levels = defaultdict(int)
+        self.edges = defaultdict(lambda: deque(maxlen=history))   # pin -> (time, level)
+        self.mode = None
+
+    def _pins(self, channels):
+        return channels if isinstance(channels, (list, tuple)) else [channels]
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channels, direction, initial=None):
+        for pin in self._pins(channels):
+            if initial is not None:
+                self.output(pin, initial)
+
+    def output(self, channels, value):
+        now = time.perf_counter()
+        for pin in self._pins(channels):
+            if self.levels[pin] != value:
+                self.edges[pin].append((now, value))
+            self.levels[pin] = value
+
+    def input(self, channel):
+        return self.levels[channel]
+
+    def cleanup(self, channels=None):
+        self.levels.clear()
+
+    def measured_duty(self, pin, since, until=None):
+        """Percentage of [since, until] the recorded pin was high"""
+        until = time.perf_counter() if until is None else until
+        level, last, high = 0, since, 0.0
+        for t, value in self.edges[pin]:
+            if t <= since:
+                level = value
+                continue
+            if t >= until:
+                break
+            if level:
+                high += t - last
+            level, last = value, t
+        if level:
+            high += until - last
+        return 100.0 * high / (until - since)
+
+    class PWM:
+        def __init__(self, channel, frequency_hz):
+            self.channel = channel
+            self.frequency = frequency_hz
+            self.duty = 0.0
+
+        def start(self, duty_cycle_percent):
+            self.duty = duty_cycle_percent
+
+        def ChangeDutyCycle(self, duty_cycle_percent):
+            self.duty = duty_cycle_percent
+
+        def ChangeFrequency(self, frequency_hz):
+            self.frequency = frequency_hz
+
+        def stop(self):
+            self.duty = 0.0
+
+class PWMEngine:
+    """Hardware PWM where the pin allows, a deadline-scheduled timer thread otherwise"""
+
+    def __init__(self, gpio, pins, frequency=100, hardware_pins=HARDWARE_PWM_PINS, spin=0.0005):
+        self.gpio = gpio
+        self.frequency = frequency
+        self.period = 1.0 / frequency
+        self.spin = spin
+        self.hardware = {}
+        self.duties = {}
+        for pin in pins:
+            if pin in (hardware_pins or ()) and hasattr(gpio, "PWM"):
+                try:
+                    channel = gpio.PWM(pin, frequency)
+                    channel.start(0)
+                    self.hardware[pin] = channel
+                    continue
+                except Exception as e:
+                    print(f"[PWM] ⚠️ Hardware PWM unavailable on GPIO{pin}, using timer thread: {e}")
+            self.duties[pin] = 0.0
+        self.targets = {pin: 0.0 for pin in pins}
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self._reset_stats()
+        self.thread = None
+        if self.duties:
+            self.thread = threading.Thread(target=self._run, name="pwm-engine", daemon=True)
+            self.thread.start()
+
+    def modes(self):
+        return {pin: "hardware" if pin in self.hardware else "software" for pin in self.targets}
+
+    def set_duty(self, pin, duty):
+        """Duty cycle in percent; takes effect from the next period"""
+        duty = min(max(float(duty), 0.0), 100.0)
+        self.targets[pin] = duty
+        if pin in self.hardware:
+            self.hardware[pin].ChangeDutyCycle(duty)
+        else:
+            self.duties[pin] = duty
+            if duty > 0:
+                self.wake.set()
+
+    def set_duties(self, duties):
+        for pin, duty in duties.items():
+            self.set_duty(pin, duty)
+
+    def stop_all(self):
+        self.set_duties({pin: 0.0 for pin in self.targets})
+
+    def close(self):
+        self.stop_all()
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(1.0)
+        for channel in self.hardware.values():
+            channel.stop()
+        for pin in self.duties:
+            self.gpio.output(pin, self.gpio.LOW)
+
+    def _wait_until(self, deadline):
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while time.perf_counter() < deadline:
+            pass
+
+    def _run(self):
+        gpio = self.gpio
+        high_pins = set()
+        next_start = time.perf_counter()
+        while not self.stop_event.is_set():
+            duties = dict(self.duties)
+            if not any(duties.values()):
+                # Idle: park the pins low and sleep until someone sets a duty
+                for pin in high_pins:
+                    gpio.output(pin, gpio.LOW)
+                high_pins.clear()
+                self.wake.wait(0.1)
+                self.wake.clear()
+                next_start = time.perf_counter()
+                continue
+
+            self._wait_until(next_start)
+            rising = time.perf_counter()
+            for pin, duty in duties.items():
+                if duty > 0:
+                    gpio.output(pin, gpio.HIGH)
+                    high_pins.add(pin)
+                elif pin in high_pins:
+                    gpio.output(pin, gpio.LOW)
+                    high_pins.discard(pin)
+
+            high_times = {pin: self.period for pin, duty in duties.items() if duty >= 100}
+            for deadline, pin in sorted((next_start + self.period * duty / 100.0, pin)
+                                        for pin, duty in duties.items() if 0 < duty < 100):
+                self._wait_until(deadline)
+                gpio.output(pin, gpio.LOW)
+                high_pins.discard(pin)
+                high_times[pin] = time.perf_counter() - rising
+
+            self._record(rising - next_start, duties, high_times)
+            next_start += self.period
+            if time.perf_counter() - next_start > self.period:
+                # Fell more than a period behind (e.g. preempted): resync instead of bursting
+                self.overruns += 1
+                next_start = time.perf_counter()
+
+    def _reset_stats(self):
+        self.periods = 0
+        self.overruns = 0
+        self.late_sum = 0.0
+        self.late_sq = 0.0
+        self.late_max = 0.0
+        self.error_sum = defaultdict(float)
+        self.measured_sum = defaultdict(float)
+
+    def _record(self, lateness, duties, high_times):
+        with self.lock:
+            self.periods += 1
+            self.late_sum += lateness
+            self.late_sq += lateness * lateness
+            self.late_max = max(self.late_max, lateness)
+            for pin, duty in duties.items():
+                measured = 100.0 * high_times.get(pin, 0.0) / self.period
+                self.measured_sum[pin] += measured
+                self.error_sum[pin] += abs(measured - duty)
+
+    def stats(self, reset=True):
+        """Per-pin target/measured duty and error, plus timer-thread jitter, since the last reset"""
+        with self.lock:
+            periods = max(self.periods, 1)
+            report = {
+                "periods": self.periods,
+                "overruns": self.overruns,
+                "jitter_us": 1e6 * (self.late_sq / periods) ** 0.5,
+                "max_late_us": 1e6 * self.late_max,
+                "pins": {}
+            }
+            for pin, target in self.targets.items():
+                if pin in self.hardware:
+                    report["pins"][pin] = {"mode": "hardware", "duty": target}
+                else:
+                    report["pins"][pin] = {
+                        "mode": "software",
+                        "duty": target,
+                        "measured_duty": self.measured_sum[pin] / periods,
+                        "duty_error": self.error_sum[pin] / periods
+                    }
+            if reset:
+                self._reset_stats()
+        return report
+
+if __name__ == "__main__":
+    # Off-device check: run two software channels on FakeGPIO and compare
+    # the engine's own measurements with the recorded edges
+    gpio = FakeGPIO()
+    engine = PWMEngine(gpio, (13, 18), frequency=100, hardware_pins=())
+    for duties in ({13: 45, 18: 100}, {13: 30, 18: 60}, {13: 70, 18: 35}):
+        engine.set_duties(duties)
+        time.sleep(0.05)
+        engine.stats()
+        since = time.perf_counter()
+        time.sleep(1.0)
+        until = time.perf_counter()
+        report = engine.stats()
+        print(f"periods {report['periods']}, jitter {report['jitter_us']:.0f} us rms, "
+              f"max late {report['max_late_us']:.0f} us, overruns {report['overruns']}")
+        for pin, s in report["pins"].items():
+            print(f"  GPIO{pin}: target {s['duty']:.0f}%  engine {s['measured_duty']:.2f}% "
+                  f"(err {s['duty_error']:.2f})  edges {gpio.measured_duty(pin, since, until):.2f}%")
+    engine.close()
+
+    # The time.sleep loop it replaces, on the same fake pins
+    def legacy_pwm(pin_a, duty_a, pin_b, duty_b, frequency, duration):
+        period = 1.0 / frequency
+        on_time_a = period * (duty_a / 100.0)
+        on_time_b = period * (duty_b / 100.0)
+        off_time = period - max(on_time_a, on_time_b)
+        end_time = time.time() + duration
+        while time.time() < end_time:
+            gpio.output(pin_a, gpio.HIGH)
+            gpio.output(pin_b, gpio.HIGH)
+            time.sleep(min(on_time_a, on_time_b))
+            gpio.output(pin_a, gpio.LOW)
+            time.sleep(on_time_b - on_time_a)
+            gpio.output(pin_b, gpio.LOW)
+            if off_time > 0:
+                time.sleep(off_time)
+
+    since = time.perf_counter()
+    legacy_pwm(13, 30, 18, 60, 100, 1.0)
+    until = time.perf_counter()
+    print(f"legacy sleep loop: GPIO13 target 30% -> {gpio.measured_duty(13, since, until):.2f}%, "
+          f"GPIO18 target 60% -> {gpio.measured_duty(18, since, until):.2f}%")